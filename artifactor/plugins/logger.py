@@ -14,7 +14,7 @@ artifactor:
 import os
 from logging import makeLogRecord
 from artifactor import ArtifactorBasePlugin
-from utils.log import make_file_handler
+from utils.log import ArtifactorHandler, make_file_handler
 
 
 class Logger(ArtifactorBasePlugin):
@@ -66,14 +66,33 @@ class Logger(ArtifactorBasePlugin):
         self.store[slaveid].in_progress = False
 
     @ArtifactorBasePlugin.check_configured
-    def log_message(self, log_record, slaveid):
-        # json transport fallout: args must be a dict or a tuple, json makes a tuple into a list
-        args = log_record['args']
-        log_record['args'] = tuple(args) if isinstance(args, list) else args
-        record = makeLogRecord(log_record)
+    def log_message(self, slaveid, log_record=None, log_records=()):
+        """Write log records to the log file of the test running on ``slaveid``
+
+        ``log_records`` is a batch of :py:meth:`utils.log.ArtifactorHandler.compact` tuples, which
+        is written out at once. A single ``log_record`` dict is still accepted too.
+        """
         if not slaveid:
             slaveid = "Master"
-        if slaveid in self.store:
-            handler = self.store[slaveid].handler
-            if handler and record.levelno >= handler.level:
-                handler.handle(record)
+        if slaveid not in self.store:
+            return
+        handler = self.store[slaveid].handler
+        if not handler:
+            return
+        records = map(ArtifactorHandler.expand, log_records)
+        if log_record is not None:
+            # json transport fallout: args must be a dict or a tuple, json makes a tuple into a list
+            args = log_record['args']
+            log_record['args'] = tuple(args) if isinstance(args, list) else args
+            records.append(makeLogRecord(log_record))
+        lines = [handler.format(record) for record in records if record.levelno >= handler.level]
+        if not lines:
+            return
+        # json makes every string unicode, the log file is utf-8
+        data = u'\n'.join(lines).encode('utf-8') + '\n'
+        handler.acquire()
+        try:
+            handler.stream.write(data)
+            handler.flush()
+        finally:
+            handler.release()
@@ -11,6 +11,11 @@ artifactor:
             enabled: True
             plugin: reporter
             only_failed: False #Only show faled tests in the report
+            build_interval: 10 #Minimum seconds between report builds during the run
+
+While tests run, the report is rebuilt on ``build_report`` at most every ``build_interval``
+seconds, reusing the processed data and rendered panel of every test that did not change since
+the previous build. The whole report is processed and rendered from scratch on ``finish_session``.
 """
 import csv
 import datetime
@@ -72,6 +77,7 @@ class ReporterBase(object):
             template_data['tests'] = [x for x in template_data['tests']
                                   if x['outcomes']['overall'] not in ['passed']]
 
+        template_data['fragments'] = self.render_tests(template_data['tests'])
         self.render_report(template_data, 'report', artifact_dir, 'test_report.html')
 
     def _run_provider_report(self, old_artifacts, artifact_dir, version=None):
@@ -82,11 +88,21 @@ class ReporterBase(object):
             self.render_report(template_data, "report_{}".format(mgmt), artifact_dir,
                 'test_report_provider.html')
 
+    def template_env(self):
+        # The environment keeps the templates it compiled, so keep the environment
+        if getattr(self, '_template_env', None) is None:
+            self._template_env = Environment(
+                loader=FileSystemLoader(template_path.strpath)
+            )
+        return self._template_env
+
+    def clear_cache(self):
+        """Forget processed and rendered tests, so the next report is built from scratch"""
+        self._test_cache = {}
+        self._fragment_cache = {}
+
     def render_report(self, report, filename, log_dir, template):
-        template_env = Environment(
-            loader=FileSystemLoader(template_path.strpath)
-        )
-        data = template_env.get_template(template).render(**report)
+        data = self.template_env().get_template(template).render(**report)
 
         with open(os.path.join(log_dir, '{}.html'.format(filename)), "w") as f:
             f.write(data)
@@ -95,6 +111,20 @@ class ReporterBase(object):
         except OSError:
             pass
 
+    def render_tests(self, tests):
+        """Render the panel of every test, reusing the panels of tests that did not change"""
+        if getattr(self, '_fragment_cache', None) is None:
+            self._fragment_cache = {}
+        template = self.template_env().get_template('test_report_test.html')
+        fragments = []
+        for test in tests:
+            key = (test['signature'], test.get('duration'), test.get('in_progress'))
+            cached = self._fragment_cache.get(test['name'])
+            if cached is None or cached[0] != key:
+                cached = self._fragment_cache[test['name']] = (key, template.render(test=test))
+            fragments.append(cached[1])
+        return fragments
+
     def process_data(self, artifacts, log_dir, version, name_filter=None):
         tb_errors = []
         blocker_skip_count = 0
@@ -123,6 +153,8 @@ class ReporterBase(object):
             'xpassed': 'danger',
             'xfailed': 'success',
             'skipped': 'info'}
+        if getattr(self, '_test_cache', None) is None:
+            self._test_cache = {}
         # Iterate through the tests and process the counts and durations
         for test_name, test in artifacts.iteritems():
             if not test.get('statuses', None):
@@ -131,30 +163,26 @@ class ReporterBase(object):
             counts[overall_status] += 1
             if not test.get('old', False):
                 current_counts[overall_status] += 1
-            color = colors[overall_status]
             # This was removed previously but is needed as the overall is not generated
             # until the test finishes. So this is here as a shim.
             test['statuses']['overall'] = overall_status
-            test_data = {'name': test_name, 'outcomes': test['statuses'],
-                         'slaveid': test.get('slaveid', "Unknown"), 'color': color}
-            if 'composite' in test:
-                test_data['composite'] = test['composite']
-
-            if 'skipped' in test:
-                if test['skipped'].get('type', None) == 'provider':
-                    provider_skip_count += 1
-                    test_data['skip_provider'] = test['skipped'].get('reason', None)
-                if test['skipped'].get('type', None) == 'blocker':
-                    blocker_skip_count += 1
-                    test_data['skip_blocker'] = test['skipped'].get('reason', None)
 
+            # Tests only need to be processed again if something other than the time changed
+            signature = self.test_signature(test)
+            cached = self._test_cache.get(test_name)
+            if cached is None or cached['signature'] != signature:
+                cached = self._test_cache[test_name] = self.process_test(
+                    test_name, test, log_dir, colors[overall_status])
+                cached['signature'] = signature
+            test_data = dict(cached)
+
+            if 'skip_provider' in test_data:
+                provider_skip_count += 1
             if 'skip_blocker' in test_data:
-                # Fix the inconveniently long list of repeated blockers until we sort out sets
-                # in riggerlib somehow.
-                test_data['skip_blocker'] = sorted(set(test_data['skip_blocker']))
-
-            if test.get('old', False):
-                test_data['old'] = True
+                blocker_skip_count += 1
+            for qacontact in test_data['qa_contact']:
+                if qacontact[0] not in template_data['qa']:
+                    template_data['qa'].append(qacontact[0])
 
             if test.get('start_time', None):
                 if test.get('finish_time', None):
@@ -164,49 +192,6 @@ class ReporterBase(object):
                     test_data['duration'] = time.time() - test['start_time']
                     test_data['in_progress'] = True
 
-            # Set up destinations for the files
-            test_data["file_groups"] = []
-            test_data['qa_contact'] = []
-            processed_groups = {}
-            order = 0
-            for file_dict in test.get('files', []):
-                group = file_dict["group_id"]
-                if group not in processed_groups:
-                    processed_groups[group] = (order, [])
-                    order += 1
-                processed_groups[group][-1].append(file_dict)
-            # Current structure:
-            # {groupid: (group_order, [{filedict1}, {filedict2}])}
-            # Sorting by group_order
-            processed_groups = sorted(processed_groups.iteritems(), key=lambda kv: kv[1][0])
-            # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
-            processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
-            for group_name, file_dicts in processed_groups:
-                group_file_list = []
-                for file_dict in file_dicts:
-                    if file_dict["file_type"] == "qa_contact":
-                        with open(file_dict["os_filename"], 'rb') as qafile:
-                            qareader = csv.reader(qafile, delimiter=',', quotechar='"')
-                            for qacontact in qareader:
-                                test_data['qa_contact'].append(qacontact)
-                                if qacontact[0] not in template_data['qa']:
-                                    template_data['qa'].append(qacontact[0])
-                        continue  # Do not store, handled a different way :)
-                    elif file_dict["file_type"] == "short_tb":
-                        with open(file_dict["os_filename"], 'r') as short_tb:
-                            test_data["short_tb"] = short_tb.read()
-                        continue
-                    file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
-                    group_file_list.append(file_dict)
-
-                test_data["file_groups"].append((group_name, group_file_list))
-            # Snd remove groups that are left empty because of eg. traceback or qa contact
-            test_data["file_groups"] = filter(
-                lambda group: len(group[1]) > 0, test_data["file_groups"])
-            if "short_tb" in test_data and test_data["short_tb"]:
-                urls = [url for url in URL.findall(test_data["short_tb"])]
-                if urls:
-                    test_data["urls"] = urls
             template_data['tests'].append(test_data)
         template_data['top10'] = self.top10(tb_errors)
         template_data['counts'] = counts
@@ -235,6 +220,75 @@ class ReporterBase(object):
 
         return template_data
 
+    def test_signature(self, test):
+        """Everything the processed data of a test depends on, except for its duration"""
+        return repr((sorted(test['statuses'].items()), test.get('slaveid'), test.get('composite'),
+            test.get('skipped'), test.get('old'), len(test.get('files', []))))
+
+    def process_test(self, test_name, test, log_dir, color):
+        """Build the template data of a test, reading its traceback and qa contacts from disk"""
+        test_data = {'name': test_name, 'outcomes': test['statuses'],
+                     'slaveid': test.get('slaveid', "Unknown"), 'color': color}
+        if 'composite' in test:
+            test_data['composite'] = test['composite']
+
+        if 'skipped' in test:
+            if test['skipped'].get('type', None) == 'provider':
+                test_data['skip_provider'] = test['skipped'].get('reason', None)
+            if test['skipped'].get('type', None) == 'blocker':
+                test_data['skip_blocker'] = test['skipped'].get('reason', None)
+
+        if 'skip_blocker' in test_data:
+            # Fix the inconveniently long list of repeated blockers until we sort out sets
+            # in riggerlib somehow.
+            test_data['skip_blocker'] = sorted(set(test_data['skip_blocker']))
+
+        if test.get('old', False):
+            test_data['old'] = True
+
+        # Set up destinations for the files
+        test_data["file_groups"] = []
+        test_data['qa_contact'] = []
+        processed_groups = {}
+        order = 0
+        for file_dict in test.get('files', []):
+            group = file_dict["group_id"]
+            if group not in processed_groups:
+                processed_groups[group] = (order, [])
+                order += 1
+            processed_groups[group][-1].append(file_dict)
+        # Current structure:
+        # {groupid: (group_order, [{filedict1}, {filedict2}])}
+        # Sorting by group_order
+        processed_groups = sorted(processed_groups.iteritems(), key=lambda kv: kv[1][0])
+        # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
+        processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
+        for group_name, file_dicts in processed_groups:
+            group_file_list = []
+            for file_dict in file_dicts:
+                if file_dict["file_type"] == "qa_contact":
+                    with open(file_dict["os_filename"], 'rb') as qafile:
+                        qareader = csv.reader(qafile, delimiter=',', quotechar='"')
+                        for qacontact in qareader:
+                            test_data['qa_contact'].append(qacontact)
+                    continue  # Do not store, handled a different way :)
+                elif file_dict["file_type"] == "short_tb":
+                    with open(file_dict["os_filename"], 'r') as short_tb:
+                        test_data["short_tb"] = short_tb.read()
+                    continue
+                file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
+                group_file_list.append(file_dict)
+
+            test_data["file_groups"].append((group_name, group_file_list))
+        # Snd remove groups that are left empty because of eg. traceback or qa contact
+        test_data["file_groups"] = filter(
+            lambda group: len(group[1]) > 0, test_data["file_groups"])
+        if "short_tb" in test_data and test_data["short_tb"]:
+            urls = [url for url in URL.findall(test_data["short_tb"])]
+            if urls:
+                test_data["urls"] = urls
+        return test_data
+
     def top10(self, tb_errors):
         sets = []
         for entry in tb_errors:
@@ -341,7 +395,7 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
         self.register_plugin_hook('report_test', self.report_test)
         self.register_plugin_hook('finish_session', self.run_report)
         self.register_plugin_hook('finish_session', self.run_provider_report)
-        self.register_plugin_hook('build_report', self.run_report)
+        self.register_plugin_hook('build_report', self.build_report)
         self.register_plugin_hook('start_test', self.start_test)
         self.register_plugin_hook('skip_test', self.skip_test)
         self.register_plugin_hook('finish_test', self.finish_test)
@@ -350,6 +404,8 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
 
     def configure(self):
         self.only_failed = self.data.get('only_failed', False)
+        self.build_interval = self.data.get('build_interval', 10)
+        self.last_build = 0
         self.configured = True
 
     @ArtifactorBasePlugin.check_configured
@@ -390,8 +446,17 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
     def session_info(self, version=None, build=None, stream=None):
         return None, {'build': build, 'stream': stream, 'version': version}
 
+    @ArtifactorBasePlugin.check_configured
+    def build_report(self, old_artifacts, artifact_dir, version=None):
+        # Fired after every test phase, so only build every so often while the tests run
+        if time.time() - self.last_build < self.build_interval:
+            return
+        self._run_report(old_artifacts, artifact_dir, version)
+        self.last_build = time.time()
+
     @ArtifactorBasePlugin.check_configured
     def run_report(self, old_artifacts, artifact_dir, version=None):
+        self.clear_cache()
         self._run_report(old_artifacts, artifact_dir, version)
 
     @ArtifactorBasePlugin.check_configured
@@ -219,6 +219,12 @@ def _d(l, **kwargs):
     return elements(version.pick(l), **kwargs)
 
 
+@elements.method(version.VersionPicker)
+def _vp(l, **kwargs):
+    """Resolve version-specific locators prepared in advance."""
+    return elements(l.pick(), **kwargs)
+
+
 def get_rails_error():
     """Get displayed rails error. If not present, return None"""
     if is_displayed(
@@ -59,6 +59,48 @@ set_angularjs_value_script = """\
 """
 
 
+# Texts of the elements, the same as their .text but read in one call to the browser
+# Expects: arguments[0] = list of elements
+element_texts = jsmin("""
+var result = [];
+for(var i = 0; i < arguments[0].length; i++) {
+    var element = arguments[0][i];
+    // innerText of a hidden element is its whole text, WebElement.text is empty
+    result.push(element.getClientRects().length ? (element.innerText || "") : "");
+}
+return result;
+""")
+
+# Reads the whole table in one call to the browser
+# Expects: arguments[0] = header row or null, arguments[1] = body, arguments[2] = body offset
+read_table = jsmin("""
+function children(element, tags) {
+    var result = [];
+    for(var i = 0; i < element.children.length; i++) {
+        if(tags.indexOf(element.children[i].tagName) >= 0)
+            result.push(element.children[i]);
+    }
+    return result;
+}
+
+function texts(elements) {
+    var result = [];
+    for(var i = 0; i < elements.length; i++) {
+        // innerText of a hidden element is its whole text, WebElement.text is empty
+        var rendered = elements[i].getClientRects().length > 0;
+        result.push(rendered ? (elements[i].innerText || "") : "");
+    }
+    return result;
+}
+
+var header_cells = (arguments[0] === null) ? [] : children(arguments[0], ["TD", "TH"]);
+var rows = [];
+var row_elements = children(arguments[1], ["TR"]);
+for(var i = arguments[2]; i < row_elements.length; i++)
+    rows.push({element: row_elements[i], cells: texts(children(row_elements[i], ["TD"]))});
+return {header_cells: header_cells, headers: texts(header_cells), rows: rows};
+""")
+
 # The functions below do various JS magic to speed up the tree traversings to a maximum possible
 # level.
 
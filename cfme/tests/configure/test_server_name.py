@@ -6,7 +6,6 @@ from cfme.configure.configuration import BasicInformation
 from cfme.fixtures import pytest_selenium as sel
 from fixtures.pytest_store import store
 from cfme.web_ui import flash
-from utils import clear_property_cache
 from utils.appliance import current_appliance
 from utils.appliance.implementations.ui import navigate_to
 
@@ -37,10 +36,10 @@ def test_server_name():
     assert new_server_name == current_server_name, \
         "Server name in About section does not match the new name"
 
-    clear_property_cache(store.current_appliance, 'configuration_details')
+    store.current_appliance.server_details_changed()
 
     settings_pg = BasicInformation(appliance_name=old_server_name)
     settings_pg.update()
     flash.assert_message_contain(flash_msg.format(old_server_name))
 
-    clear_property_cache(store.current_appliance, 'configuration_details')
+    store.current_appliance.server_details_changed()
@@ -155,7 +155,11 @@ class Region(Pretty):
         if hasattr(self, 'locators') and name in self.locators:
             locator = self.locators[name]
             if isinstance(locator, dict):
-                return version.pick(locator)
+                # Every locator is prepared for picking only once
+                pickers = self.__dict__.setdefault('_pickers', {})
+                if name not in pickers:
+                    pickers[name] = version.VersionPicker(locator)
+                return pickers[name].pick()
             else:
                 return locator
         else:
@@ -228,12 +232,29 @@ class CachedTableHeaders(object):
     the header cache element and the list of headers are stored in _headers. The
     attribute header_indexes is then created, before finally creating the items
     attribute.
+
+    The header elements and their texts can be passed in when they were already read, like
+    :py:meth:`Table.read` does.
     """
-    def __init__(self, table):
-        self.headers = sel.elements('td | th', root=table.header_row)
+    def __init__(self, table, headers=None, texts=None):
+        if headers is None:
+            headers = sel.elements('td | th', root=table.header_row)
+            texts = sel.execute_script(js.element_texts, headers)
+        self.headers = headers
         self.indexes = {
-            attributize_string(cell.text): index
-            for index, cell in enumerate(self.headers)}
+            attributize_string(text): index
+            for index, text in enumerate(texts)}
+
+
+def _cell_matches(text, value, partial_check=False):
+    """Compares the text of a cell with a value as :py:meth:`Table.find_rows_by_cells` does"""
+    text = normalize_space(text)
+    if isinstance(value, re._pattern_type):
+        return value.match(text) is not None
+    elif partial_check:
+        return value in text
+    else:
+        return text == value
 
 
 class Table(Pretty):
@@ -316,6 +337,10 @@ class Table(Pretty):
         * :py:meth:`click_rows_by_cells`
         * :py:meth:`click_row_by_cells`
 
+    They search a snapshot of the table taken by :py:meth:`read`, which reads the headers and
+    the texts of all the cells in a single call to the browser. Set :py:attr:`bulk_read` to
+    ``False`` to search the table with XPath instead.
+
     Note:
 
         A table is defined by the containers of the header and data areas, and offsets to them.
@@ -325,6 +350,8 @@ class Table(Pretty):
     """
 
     pretty_attrs = ['_loc']
+    #: Whether the searches read the whole table at once with :py:meth:`read`
+    bulk_read = True
 
     def __init__(self, table_locator, header_offset=0, body_offset=0, hidden_locator=None):
         self._headers = None
@@ -421,6 +448,46 @@ class Table(Pretty):
                 # but no data.
                 return
 
+    def read(self):
+        """Reads the whole table with a single call to the browser
+
+        The headers read along are cached, unless they already were.
+
+        Returns: A list of :py:class:`Table.Row` objects for the body rows, with the texts of
+            their cells in :py:attr:`Table.Row.texts`.
+        """
+        try:
+            try:
+                header_row = self.header_row
+            except NoSuchElementException:
+                header_row = None
+            data = sel.execute_script(js.read_table, header_row, self.body, self.body_offset)
+        except (exceptions.CannotScrollException, NoSuchElementException):
+            # The same as in rows()
+            if self.hidden_locator is None or not sel.is_displayed(self.hidden_locator):
+                raise
+            return []
+        if header_row is not None and '_headers_cache' not in self.__dict__:
+            self._headers_cache = CachedTableHeaders(
+                self, headers=data['header_cells'], texts=data['headers'])
+        rows = []
+        for row_data in data['rows']:
+            row = self.create_row_from_element(row_data['element'])
+            row.texts = row_data['cells']
+            rows.append(row)
+        return rows
+
+    def _column_index(self, column):
+        """Index of a column given by its header name or index"""
+        if isinstance(column, int):
+            return column
+        try:
+            return self.header_indexes[attributize_string(column)]
+        except KeyError:
+            # Suspected shared table use
+            self.verify_headers()
+            raise
+
     def rows_as_list(self):
         """Returns rows as list"""
         return [i for i in self.rows()]
@@ -483,6 +550,18 @@ class Table(Pretty):
         """
         # accept dicts or supertuples
         cells = dict(cells)
+        if not cells:
+            return []
+        if self.bulk_read:
+            rows = self.read()
+            columns = [(self._column_index(heading), value) for heading, value in cells.items()]
+            return [
+                row for row in rows
+                if all(
+                    index < len(row.texts) and
+                    _cell_matches(row.texts[index], value, partial_check=partial_check)
+                    for index, value in columns)]
+
         cell_text_loc = (
             './/td/descendant-or-self::*[contains(normalize-space(text()), "{}")]/ancestor::tr[1]')
         matching_rows_list = list()
@@ -511,13 +590,7 @@ class Table(Pretty):
         matching_rows = list()
 
         def matching_row_filter(heading, value):
-            text = normalize_space(row[heading].text)
-            if isinstance(value, re._pattern_type):
-                return value.match(text) is not None
-            elif partial_check:
-                return value in text
-            else:
-                return text == value
+            return _cell_matches(row[heading].text, value, partial_check=partial_check)
 
         for row in rows:
             if all(matching_row_filter(*cell) for cell in cells.items()):
@@ -660,6 +733,8 @@ class Table(Pretty):
 
         """
         pretty_attrs = ['row_element', 'table']
+        #: Texts of the cells when the row was read by :py:meth:`Table.read`, else ``None``
+        texts = None
 
         def __init__(self, row_element, parent_table):
             self.table = parent_table
@@ -698,6 +773,8 @@ class Table(Pretty):
                 raise
 
         def __str__(self):
+            if self.texts is not None:
+                return ", ".join(["'{}'".format(text) for text in self.texts])
             return ", ".join(["'{}'".format(el.text) for el in self.columns])
 
         def __eq__(self, other):
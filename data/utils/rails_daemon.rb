@@ -0,0 +1,78 @@
+# Keeps the Rails environment booted and evaluates rails runner commands sent to it
+#
+# Started as ``rails runner rails_daemon.rb`` by utils.ssh.RailsDaemon. Reads one JSON request per
+# line from stdin, {"command": "..."}, where command holds the rails runner arguments as they would
+# be written on a shell command line. Answers every request with a line holding the marker and
+# {"rc": ..., "output": ...}. Everything the command writes to stdout or stderr, including the
+# output of the processes it spawns, is collected as its output.
+#
+# Can be run with plain ruby too, without Rails, which is how the protocol is tested locally.
+require 'json'
+require 'shellwords'
+require 'tempfile'
+
+MARKER = 'RAILS_DAEMON '.freeze
+
+# Every command gets a binding of its own, so local variables don't leak between commands
+def fresh_binding
+  binding
+end
+
+def reset_rails_state
+  # Other processes change the settings and the database between commands
+  Settings.reload! if defined?(Settings) && Settings.respond_to?(:reload!)
+  if defined?(ActiveRecord::Base)
+    # The database may have been restarted or restored since the last command, reconnect if the
+    # connection went stale
+    ActiveRecord::Base.clear_active_connections!
+    ActiveRecord::Base.connection.verify!
+    ActiveRecord::Base.connection.clear_query_cache
+  end
+end
+
+def run_command(command)
+  code, *args = Shellwords.split(command)
+  if code.nil?
+    STDERR.puts('No code or file given')
+    return 1
+  end
+  ARGV.replace(args)
+  reset_rails_state
+  if File.exist?(code)
+    $0 = code
+    load(code)
+  else
+    eval(code, fresh_binding, 'rails_runner', 1)
+  end
+  0
+rescue SystemExit => e
+  e.status
+rescue Exception => e
+  STDERR.puts("#{e.message} (#{e.class})")
+  STDERR.puts(e.backtrace)
+  1
+end
+
+protocol = STDOUT.dup
+protocol.sync = true
+original_stderr = STDERR.dup
+protocol.puts(MARKER + JSON.generate('ready' => true, 'pid' => Process.pid))
+
+STDIN.each_line do |line|
+  command = JSON.parse(line)['command']
+  output = Tempfile.new('rails_daemon')
+  begin
+    STDOUT.reopen(output)
+    STDERR.reopen(output)
+    rc = run_command(command)
+    STDOUT.flush
+    STDERR.flush
+  ensure
+    STDOUT.reopen(protocol)
+    STDERR.reopen(original_stderr)
+  end
+  output.rewind
+  text = output.read.force_encoding('UTF-8').scrub
+  output.close!
+  protocol.puts(MARKER + JSON.generate('rc' => rc, 'output' => text))
+end
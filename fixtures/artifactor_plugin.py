@@ -28,6 +28,7 @@ from artifactor import ArtifactorClient
 from fixtures.pytest_store import write_line, store
 from markers.polarion import extract_polarion_ids
 from utils.conf import env, credentials
+from utils.log import artifactor_handler
 from utils.net import random_port, net_check
 from utils.path import project_path
 from utils.wait import wait_for
@@ -124,6 +125,8 @@ def pytest_configure(config):
     elif isinstance(art_client, ArtifactorClient):
         art_client.port = config.option.artifactor_port
         art_client.ready = True
+    if isinstance(art_client, ArtifactorClient):
+        artifactor_handler.start(art_client.address, art_client.port, slaveid=SLAVEID)
     art_client.fire_hook('setup_merkyl', ip=appliance_ip_address)
 
 
@@ -154,6 +157,8 @@ def pytest_runtest_protocol(item):
     # This pre_start_test hook is needed so that filedump is able to make get the test
     # object set up before the logger starts logging. As the logger fires a nested hook
     # to the filedumper, and we can't specify order inriggerlib.
+    # Log records are sent in batches, the ones from before the test belong to the previous test.
+    artifactor_handler.flush()
     art_client.fire_hook('pre_start_test', test_location=location, test_name=name,
                          slaveid=SLAVEID, ip=appliance_ip_address)
     art_client.fire_hook('start_test', test_location=location, test_name=name,
@@ -164,6 +169,7 @@ def pytest_runtest_protocol(item):
 
 def pytest_runtest_teardown(item, nextitem):
     name, location = get_test_idents(item)
+    artifactor_handler.flush()
     art_client.fire_hook('finish_test', test_location=location, test_name=name,
                          slaveid=SLAVEID, ip=appliance_ip_address, grab_result=True)
     art_client.fire_hook('sanitize', test_location=location, test_name=name, words=words)
@@ -197,6 +203,7 @@ def pytest_runtest_logreport(report):
 def pytest_unconfigure():
     global proc
     yield
+    artifactor_handler.close()
     if not SLAVEID:
         write_line('collecting artifacts')
         art_client.fire_hook('finish_session')
@@ -12,6 +12,7 @@ import pytest
 
 from fixtures.pytest_store import store
 from utils.blockers import Blocker, BZ, GH
+from utils.log import logger
 
 
 @pytest.fixture(scope="function")
@@ -61,21 +62,32 @@ def pytest_addoption(parser):
                     help='Specify to list the blockers (takes some time though).')
 
 
+def item_blockers(item):
+    """Returns the blockers specified in the meta marker of the item, ints converted to BZ."""
+    blockers = item._metadata.get("blockers", [])
+    if not isinstance(blockers, (list, tuple, set)):
+        return []
+    return ["BZ#{}".format(b) if isinstance(b, int) else b for b in blockers]
+
+
 @pytest.mark.trylast
 def pytest_collection_modifyitems(session, config, items):
+    disabled_plugins = config.getvalue("disable_metaplugins") or ""
+    if "blockers" not in [name.strip() for name in disabled_plugins.split(",")]:
+        # All the blockers of the session at once instead of one by one for each test
+        blockers = [blocker for item in items for blocker in item_blockers(item)]
+        if blockers:
+            try:
+                Blocker.prefetch(blockers)
+            except Exception as e:
+                logger.warning("Could not prefetch the blockers: %s", e)
     if not config.getvalue("list_blockers"):
         return
     store.terminalreporter.write("Loading blockers ...\n", bold=True)
     blocking = set([])
     for item in items:
-        if "blockers" not in item._metadata:
-            continue
-        for blocker in item._metadata["blockers"]:
-            if isinstance(blocker, int):
-                # TODO: DRY
-                blocker_object = Blocker.parse("BZ#{}".format(blocker))
-            else:
-                blocker_object = Blocker.parse(blocker)
+        for blocker in item_blockers(item):
+            blocker_object = Blocker.parse(blocker)
             if blocker_object.blocks:
                 blocking.add(blocker_object)
     if blocking:
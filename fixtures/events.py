@@ -158,6 +158,7 @@ The types can be retrieved using the :py:class:`utils.events.EventTool` by calli
 :py:meth:`utils.events.EventTool.all_event_types` on it.
 """
 from datetime import datetime
+from time import time
 import logging
 
 import pytest
@@ -166,7 +167,6 @@ from fixtures.artifactor_plugin import art_client, get_test_idents
 from fixtures.pytest_store import store
 from utils.datafile import template_env
 from utils.log import setup_logger
-from utils.wait import wait_for, TimedOutError
 
 # xxx better logger name
 logger = setup_logger(logging.getLogger('events'))
@@ -248,25 +248,32 @@ class EventExpectation(object):
 
 class EventListener(object):
 
-    def __init__(self, appliance=None):
+    def __init__(self, appliance=None, listen=False):
         self.started = False
+        self.listen = listen
         self.expectations = []
-        # last_id is used to "clear" the database
-        # When database is "cleared" the id of the last event is placed here. That is then used
-        # in queries to prevent events of this id and earlier to get in.
-        self.last_id = None
         self.appliance = appliance or store.current_appliance
+        self._watcher = None
+
+    @property
+    def watcher(self):
+        """:py:class:`utils.events.EventWatcher` following the events of the appliance"""
+        if self._watcher is None or self._watcher.event_tool.appliance is not self.appliance:
+            if self._watcher is not None:
+                self._watcher.close()
+            self._watcher = self.appliance.events.watcher(listen=self.listen)
+        return self._watcher
 
     def delete_database(self):
-        try:
-            last_record = self.appliance.events.query_miq_events()[-1]
-            self.last_id = last_record['id']
-        except IndexError:
-            # No events yet, so do nothing
-            pass
+        # The database is "cleared" by moving the cursor of the watcher to the newest event, the
+        # events up to it won't be received any more
+        self.watcher.reset()
+        for expectation in self.expectations:
+            self.watcher.expect(expectation)
 
     def get_all_received_events(self):
-        return self.appliance.events.query_miq_events(from_id=self.last_id)
+        self.watcher.poll()
+        return self.watcher.events
 
     def check_all_expectations(self):
         """ Check whether all triggered events have been captured.
@@ -277,42 +284,48 @@ class EventListener(object):
             Boolean whether all events have already been captured.
 
         """
-        until = datetime.utcnow()
-        seen_ids = set()
-        for expectation in self.expectations:
-            try:
-                arrived_events = self.appliance.events.query_miq_events(
-                    until=until, from_id=self.last_id, **expectation.query_params)
-            except ValueError:
-                # An object name - not present in the database yet - assuming the event has not come
-                # .... yet
-                continue
-            for event in arrived_events:
-                if event['id'] in seen_ids:
-                    # Already processed
-                    continue
-                seen_ids.add(event['id'])
-                expectation.arrived = event['timestamp']
-                expectation.message = event['message']
-                expectation.id = event['id']
-                expectation.real_target_id = event['target_id']
-                logger.info(
-                    'Detected event {}/{} from {}/{} ({}): {}'.format(
-                        expectation.id,
-                        expectation.event_type,
-                        expectation.target_id,
-                        expectation.real_target_id,
-                        expectation.target_type,
-                        expectation.message))
+        for expectation, event in self.watcher.poll():
+            expectation.arrived = event['timestamp']
+            expectation.message = event['message']
+            expectation.id = event['id']
+            expectation.real_target_id = event['target_id']
+            logger.info(
+                'Detected event {}/{} from {}/{} ({}): {}'.format(
+                    expectation.id,
+                    expectation.event_type,
+                    expectation.target_id,
+                    expectation.real_target_id,
+                    expectation.target_type,
+                    expectation.message))
         return all(exp.arrived is not None for exp in self.expectations)
 
+    def wait_for_expectations(self, timeout=75, delay=5):
+        """ Polls the new events until all the expectations are met or ``timeout`` runs out.
+
+        Returns:
+            Boolean whether all events have been captured.
+        """
+        end = time() + timeout
+        while True:
+            try:
+                if self.check_all_expectations():
+                    return True
+            except Exception as e:
+                logger.warning('Checking the events failed: %s', e)
+            remaining = end - time()
+            if remaining <= 0:
+                return False
+            self.watcher.wait(min(delay, remaining))
+
     @property
     def expectations_count(self):
         return len(self.expectations)
 
     def add_expectation(self, *args):
         # Time added automatically if not given
-        self.expectations.append(EventExpectation(*args))
+        expectation = EventExpectation(*args)
+        self.expectations.append(expectation)
+        self.watcher.expect(expectation)
 
     def __call__(self, target_type, target_id, event_types):
         if not self.started:
@@ -327,6 +340,10 @@ class EventListener(object):
     def start(self):
         self.started = True
 
+    def pytest_unconfigure(self):
+        if self._watcher is not None:
+            self._watcher.close()
+
 
 def pytest_addoption(parser):
     parser.addoption('--event-testing',
@@ -334,6 +351,13 @@ def pytest_addoption(parser):
                      dest='event_testing_enabled',
                      default=False,
                      help='Enable testing of the events. (default: %default)')
+    parser.addoption('--event-listen',
+                     action='store_true',
+                     dest='event_listen',
+                     default=False,
+                     help='Wake up on new events through Postgres LISTEN/NOTIFY instead of only '
+                          'polling them, installs a trigger on the event_streams table for the '
+                          'time of the run. (default: %default)')
 
 
 @pytest.mark.trylast
@@ -343,7 +367,7 @@ def pytest_configure(config):
     Sets up and registers the EventListener plugin for py.test.
     If the testing is enabled, listener is started.
     """
-    plugin = EventListener()
+    plugin = EventListener(listen=config.getoption("event_listen"))
     registration = config.pluginmanager.register(plugin, "event_testing")
     assert registration
     if config.getoption("event_testing_enabled"):
@@ -381,8 +405,8 @@ def register_event(
 
     if self.started:
         logger.info("Clearing the database before testing ...")
-        self.delete_database()
         self.expectations = []
+        self.delete_database()
 
     return self  # Run the test and provide the plugin as a fixture
 
@@ -411,16 +435,11 @@ def pytest_runtest_call(item):
         node_id = item._nodeid
 
         # Event testing is enabled.
-        try:
-            logger.info('Checking the events to come.')
-            wait_for(register_event.check_all_expectations,
-                     delay=5,
-                     num_sec=75,
-                     handle_exception=True)
-        except TimedOutError:
-            logger.warning('Some of the events seem to not have come!')
-        else:
+        logger.info('Checking the events to come.')
+        if register_event.wait_for_expectations(timeout=75, delay=5):
             logger.info('Seems like all events have arrived!')
+        else:
+            logger.warning('Some of the events seem to not have come!')
 
         name, location = get_test_idents(item)
 
@@ -437,12 +456,12 @@ def pytest_runtest_call(item):
             group_id="misc-artifacts",
             slaveid=SLAVEID
         )
-        logger.info("Clearing the database after testing ...")
-        register_event.delete_database()
         soft_assert = item.funcargs["soft_assert"]
         for expectation in register_event.expectations:
             soft_assert(
                 expectation.arrived,
                 "Event {} for {} {} did not come!".format(
                     expectation.event_type, expectation.target_type, expectation.target_id))
+        logger.info("Clearing the database after testing ...")
         register_event.expectations = []
+        register_event.delete_database()
@@ -14,16 +14,24 @@ The Workflow
 - Master runs collection, blocks until slaves report their collections
 - Slaves each run collection and submit them to the master, then block inside their runtest loop,
   waiting for tests to run
-- Master diffs slave collections against its own; the test ids are verified to match
-  across all nodes
+- Master compares digests of slave collections against its own, and diffs only the chunks of
+  test ids that don't match; the test ids are verified to match across all nodes
 - Master enters main runtest loop, uses a generator to build lists of test groups which are then
   sent to slaves, one group at a time
+
+  - Groups are handed out longest first, based on test durations recorded in previous runs
+    (see :py:mod:`fixtures.parallelizer.durations`)
 - For each phase of each test, the slave serializes test reports, which are then unserialized on
   the master and handed to the normal pytest reporting hooks, which is able to deal with test
   reports arriving out of order
+
+  - Reports don't need an answer, so the slave sends them without waiting, batched per test;
+    the master acknowledges each batch by its sequence number once it has been processed
 - Before running the last test in a group, the slave will request more tests from the master
 
   - If more tests are received, they are run
+  - If no tests are left to send, the master reclaims tests the most backlogged slave hasn't
+    started yet and sends those instead, keeping provider affinity
   - If no tests are received, the slave will shut down after running its final test
 
 - After all slaves are shut down, the master will do its end-of-session reporting as usual, and
@@ -31,9 +39,7 @@ The Workflow
 
 """
 
-import collections
 import difflib
-import json
 import os
 import signal
 import subprocess
@@ -51,12 +57,14 @@ from functools32 import wraps
 
 from fixtures import terminalreporter
 from fixtures.parallelizer import remote
+from fixtures.parallelizer.durations import DurationStore, lpt_groups, lpt_makespan
+from fixtures.parallelizer.scheduler import ProviderScheduler
 from fixtures.pytest_store import store
 from utils import at_exit, conf
 from utils.appliance import IPAppliance
 from utils.log import create_sublogger
 from utils.net import random_port
-from utils.path import conf_path
+from utils.path import conf_path, log_path
 
 # Initialize slaveid to None, indicating this as the master process
 # slaves will set this to a unique string when they're initialized
@@ -77,6 +85,13 @@ def pytest_addhooks(pluginmanager):
     pluginmanager.add_hookspecs(hooks)
 
 
+def pytest_addoption(parser):
+    group = parser.getgroup("cfme")
+    group._addoption('--test-durations', dest='test_durations',
+        default=log_path.join('test_durations.json').strpath,
+        help="JSON file with test durations from previous runs, used to balance parallel runs")
+
+
 @pytest.mark.trylast
 def pytest_configure(config):
     # configures the parallel session, then fires pytest_parallel_configured
@@ -146,6 +161,9 @@ class ParallelSession(object):
         self.session_finished = False
         self.countfailures = 0
         self.collection = OrderedDict()
+        self.collection_digest = None
+        # slaveid -> master node ids to diff against the slave's mismatching collection chunks
+        self.collection_diffs = {}
         self.sent_tests = 0
         self.log = create_sublogger('master')
         self.maxfail = config.getvalue("maxfail")
@@ -155,15 +173,18 @@ class ParallelSession(object):
         self.slaves = SlaveDict()
         self.slave_urls = SlaveDict()
         self.slave_tests = defaultdict(set)
+        # tests sent to each slave that it hasn't reported starting yet, in order
+        self.slave_unstarted = defaultdict(OrderedDict)
+        # victim slaveid -> (thief slaveid, seq of the thief's need_tests) for pending steals
+        self.steals = {}
         self.test_groups = self._test_item_generator()
+        self.durations = DurationStore(config.getoption('test_durations'))
+        self.predicted_makespan = None
+        self.runtest_start = None
 
-        self._pool = []
         self.pool_lock = Lock()
         from utils.conf import cfme_data
-        self.provs = sorted(set(cfme_data['management_systems'].keys()),
-                            key=len, reverse=True)
-        self.slave_allocation = collections.defaultdict(list)
-        self.used_prov = set()
+        self.scheduler = ProviderScheduler(cfme_data['management_systems'].keys())
 
         self.failed_slave_test_groups = deque()
         self.slave_spawn_count = 0
@@ -218,6 +239,7 @@ class ParallelSession(object):
                 else:
                     msg = '{} terminated unexpectedly with status {}, respawning'.format(
                         slaveid, returncode)
+                self.slave_unstarted.pop(slaveid, None)
                 if self.slave_tests[slaveid]:
                     num_failed_tests = len(self.slave_tests[slaveid])
                     self.sent_tests -= num_failed_tests
@@ -225,6 +247,10 @@ class ParallelSession(object):
                     with SlaveDict.lock:
                         self.failed_slave_test_groups.append(self.slave_tests.pop(slaveid))
                 self.print_message(msg, purple=True)
+                if slaveid in self.steals:
+                    # a slave was waiting for tests from this one, it can have them now
+                    thief, seq = self.steals.pop(slaveid)
+                    self.send_tests(thief, seq)
 
         # Make sure we have a slave for every slave_url
         for slaveid in list(self.slave_urls):
@@ -259,20 +285,25 @@ class ParallelSession(object):
     def send(self, slaveid, event_data):
         """Send data to slave.
 
-        ``event_data`` will be serialized as JSON, and so must be JSON serializable
+        ``event_data`` will be serialized with msgpack, and so must be msgpack serializable
 
         """
-        event_json = json.dumps(event_data)
+        payload = remote.pack(event_data)
         with zmq_lock:
-            self.sock.send_multipart([slaveid, '', event_json])
+            self.sock.send_multipart([slaveid, '', payload])
 
     def recv(self):
-        """Return any unproccesed events from the recv queue"""
+        """Return any unproccesed events from the recv queue
+
+        Events are ``(slaveid, event_data, event_name, seq)`` tuples, where ``seq`` is the
+        sequence number of the slave message to reply to, if the event expects a reply.
+
+        """
         try:
             with recv_lock:
                 return self._recv_queue.popleft()
         except IndexError:
-            return None, None, None
+            return None, None, None, None
 
     def print_message(self, message, prefix='master', **markup):
         """Print a message from a node to the py.test console
@@ -292,9 +323,9 @@ class ParallelSession(object):
         stamp = datetime.now().strftime("%Y%m%d %H:%M:%S")
         self.terminal.write_ensure_prefix('({})[{}] '.format(prefix, stamp), message, **markup)
 
-    def ack(self, slaveid, event_name):
-        """Acknowledge a slave's message"""
-        self.send(slaveid, 'ack {}'.format(event_name))
+    def ack(self, slaveid, seq, reply=None):
+        """Acknowledge a slave's message by its sequence number, optionally with a reply"""
+        self.send(slaveid, {'seq': seq, 'reply': reply})
 
     def monitor_shutdown(self, slaveid, respawn=False):
         # non-daemon so slaves get every opportunity to shut down cleanly
@@ -366,8 +397,8 @@ class ParallelSession(object):
             slave.kill()
             self.monitor_shutdown(slaveid, **kwargs)
 
-    def send_tests(self, slaveid):
-        """Send a slave a group of tests"""
+    def send_tests(self, slaveid, seq):
+        """Send a slave a group of tests, in reply to its message ``seq``"""
         try:
             with SlaveDict.lock:
                 tests = list(self.failed_slave_test_groups.popleft())
@@ -378,13 +409,19 @@ class ParallelSession(object):
                 # and replace it with the line below.
                 # tests = self.test_groups.next()
             except StopIteration:
+                if self.steal_tests(slaveid, seq):
+                    # the reply is sent once the victim confirms, see finish_steal
+                    return []
                 tests = []
 
-        self.send(slaveid, tests)
+        self.ack(slaveid, seq, tests)
         self.slave_tests[slaveid] |= set(tests)
+        self.slave_unstarted[slaveid].update((test, None) for test in tests)
         collect_len = len(self.collection)
         tests_len = len(tests)
         self.sent_tests += tests_len
+        if tests and self.runtest_start is None:
+            self.runtest_start = time()
         if tests:
             self.print_message('sent {} tests to {} ({}/{}, {:.1f}%)'.format(
                 tests_len, slaveid, self.sent_tests, collect_len,
@@ -392,6 +429,76 @@ class ParallelSession(object):
             ))
         return tests
 
+    def steal_tests(self, slaveid, seq):
+        """Reclaim the unstarted tail of the most backlogged compatible slave for ``slaveid``
+
+        Only the trailing tests sharing a provider are taken, and only from a slave whose
+        providers ``slaveid`` can take on without being cleansed. The victim is asked to give
+        the tests back, and ``slaveid`` gets a reply to its message ``seq`` in
+        :py:meth:`finish_steal`, once the victim has confirmed which ones it hadn't started.
+
+        Returns:
+            ``True`` if a victim was found, ``False`` if there's nothing to steal
+
+        """
+        busy = set(self.steals) | set(thief for thief, _ in self.steals.values())
+        best = None
+        for victim, unstarted in self.slave_unstarted.items():
+            if (victim == slaveid or victim in busy or victim not in self.slaves or
+                    len(unstarted) < 2):
+                continue
+            unstarted = list(unstarted)
+            # leave the victim the head of its backlog, and keep provider affinity
+            tail = unstarted[len(unstarted) // 2:]
+            provider = self.scheduler.provider_for(tail[-1:])
+            for i in range(len(tail) - 1, -1, -1):
+                if self.scheduler.provider_for(tail[i:i + 1]) != provider:
+                    tail = tail[i + 1:]
+                    break
+            if not self.scheduler.accepts(slaveid, provider):
+                continue
+            backlog = self.durations.predict_group(unstarted)
+            if best is None or backlog > best[0]:
+                best = backlog, victim, tail
+
+        if best is None:
+            return False
+        backlog, victim, tail = best
+        self.steals[victim] = slaveid, seq
+        self.log.info('reclaiming up to {} unstarted tests from {} for {}'.format(
+            len(tail), victim, slaveid))
+        self.send(victim, {'revoke': tail})
+        return True
+
+    def finish_steal(self, victim, node_ids):
+        """Hand the tests a victim gave back to the slave that was waiting for them"""
+        try:
+            slaveid, seq = self.steals.pop(victim)
+        except KeyError:
+            # victim died and its tests were already redistributed
+            return
+        for test in node_ids:
+            self.slave_tests[victim].discard(test)
+            self.slave_unstarted[victim].pop(test, None)
+
+        if slaveid not in self.slaves:
+            if node_ids:
+                self.sent_tests -= len(node_ids)
+                with SlaveDict.lock:
+                    self.failed_slave_test_groups.append(node_ids)
+            return
+        if not node_ids:
+            # the victim started them all in the meantime, look somewhere else
+            self.send_tests(slaveid, seq)
+            return
+
+        self.ack(slaveid, seq, node_ids)
+        self.scheduler.allocate(slaveid, self.scheduler.provider_for(node_ids))
+        self.slave_tests[slaveid] |= set(node_ids)
+        self.slave_unstarted[slaveid].update((test, None) for test in node_ids)
+        self.print_message('moved {} unstarted tests from {} to {}'.format(
+            len(node_ids), victim, slaveid))
+
     def pytest_sessionstart(self, session):
         """pytest sessionstart hook
 
@@ -423,6 +530,7 @@ class ParallelSession(object):
         # Build master collection for slave diffing and distribution
         for item in self.session.items:
             self.collection[item.nodeid] = item
+        self.collection_digest = remote.CollectionDigest(self.collection)
 
         # Fire up the workers after master collection is complete
         # master and the first slave share an appliance, this is a workaround to prevent a slave
@@ -448,13 +556,24 @@ class ParallelSession(object):
                 if self.session_finished:
                     break
 
-                slaveid, event_data, event_name = self.recv()
+                slaveid, event_data, event_name, seq = self.recv()
                 if event_name == 'collectionfinish':
-                    slave_collection = event_data['node_ids']
                     # compare slave collection to the master, all test ids must be the same
+                    if event_data['digest'] == self.collection_digest.root:
+                        self.ack(slaveid, seq)
+                    else:
+                        # ask the slave for the chunks the master doesn't have, and keep the
+                        # master's chunks the slave doesn't have to diff against them
+                        master_digests = self.collection_digest.chunk_digests
+                        slave_digests = event_data['chunk_digests']
+                        self.collection_diffs[slaveid] = self.collection_digest.node_ids(
+                            remote.mismatched_chunks(master_digests, slave_digests))
+                        self.ack(slaveid, seq,
+                            {'chunks': remote.mismatched_chunks(slave_digests, master_digests)})
+                elif event_name == 'collection_chunks':
                     self.log.debug('diffing {} collection'.format(slaveid))
-                    diff_err = report_collection_diff(slaveid, self.collection.keys(),
-                        slave_collection)
+                    diff_err = report_collection_diff(slaveid,
+                        self.collection_diffs.pop(slaveid, []), event_data['node_ids'])
                     if diff_err:
                         self.print_message('collection differs, respawning', slaveid,
                             purple=True)
@@ -463,29 +582,34 @@ class ParallelSession(object):
                         self.kill(slaveid)
                         self._start_slave(slaveid)
                     else:
-                        self.ack(slaveid, event_name)
+                        self.ack(slaveid, seq)
                 elif event_name == 'need_tests':
-                    self.send_tests(slaveid)
+                    self.send_tests(slaveid, seq)
                     self.log.info('starting master test distribution')
+                elif event_name == 'batch_processed':
+                    # all async events in a slave batch have been handled
+                    self.ack(slaveid, seq)
+                elif event_name == 'tests_revoked':
+                    self.finish_steal(slaveid, event_data['node_ids'])
                 elif event_name == 'runtest_logstart':
-                    self.ack(slaveid, event_name)
+                    self.slave_unstarted[slaveid].pop(event_data['nodeid'], None)
                     self.trdist.runtest_logstart(slaveid,
                         event_data['nodeid'], event_data['location'])
                 elif event_name == 'runtest_logreport':
-                    self.ack(slaveid, event_name)
                     report = unserialize_report(event_data['report'])
+                    self.durations.record(report.nodeid, report.duration)
                     if report.when in ('call', 'teardown'):
                         self.slave_tests[slaveid].discard(report.nodeid)
                     self.trdist.runtest_logreport(slaveid, report)
                 elif event_name == 'internalerror':
-                    self.ack(slaveid, event_name)
+                    self.ack(slaveid, seq)
                     self.print_message(event_data['message'], slaveid, purple=True)
                     with SlaveDict.lock:
                         if slaveid in self.slaves:
                             # If this slave hasn't already quit, kill it with fire (signal 9)
                             self.slaves[slaveid].send_signal(9)
                 elif event_name == 'shutdown':
-                    self.ack(slaveid, event_name)
+                    self.ack(slaveid, seq)
                     self.monitor_shutdown(slaveid)
 
                 # total slave spawn count * 3, to allow for each slave's initial spawn
@@ -500,14 +624,49 @@ class ParallelSession(object):
             raise
         finally:
             terminalreporter.enable()
+            self._report_makespan()
 
         # Suppress other runtestloop calls
         return True
 
+    def _report_makespan(self):
+        # Compare the predicted makespan to the real one, and keep durations for the next run
+        if self.runtest_start is not None:
+            actual = time() - self.runtest_start
+            if self.predicted_makespan is not None:
+                predicted = '{:.0f}s'.format(self.predicted_makespan)
+            else:
+                predicted = 'unknown'
+            self.print_message('makespan: predicted {}, actual {:.0f}s'.format(predicted, actual))
+        try:
+            self.durations.save()
+        except (IOError, OSError) as ex:
+            self.log.warning('Unable to save test durations: {}'.format(ex))
+
     def _test_item_generator(self):
-        for tests in self._modscope_item_generator():
+        num_slaves = len(self.appliances)
+        weighted_groups = lpt_groups(self._modscope_item_generator(), self.durations, num_slaves,
+            splittable=self._splittable)
+        if self.durations.history:
+            self.predicted_makespan = lpt_makespan(
+                [duration for duration, tests in weighted_groups], num_slaves)
+            self.print_message('predicted makespan {:.0f}s across {} slaves'.format(
+                self.predicted_makespan, num_slaves))
+        for duration, tests in weighted_groups:
             yield tests
 
+    def _splittable(self, test_group):
+        # a group can only be spread across slaves when its tests share no module or class scoped
+        # fixtures, including module scoped parametrization; those would be set up on each slave
+        for nodeid in test_group:
+            fixtureinfo = getattr(self.collection[nodeid], '_fixtureinfo', None)
+            if fixtureinfo is None:
+                return False
+            for fixturedefs in fixtureinfo.name2fixturedefs.values():
+                if any(fixturedef.scope in ('module', 'class') for fixturedef in fixturedefs):
+                    return False
+        return True
+
     def _modscope_item_generator(self):
         # breaks out tests by module, can work just about any way we want
         # as long as it yields lists of tests id from the master collection
@@ -567,110 +726,28 @@ class ParallelSession(object):
 
     def get(self, slave):
         with self.pool_lock:
-            if not self._pool:
+            if not self.scheduler:
+                # the group generator is exhausted after the first pass, so this only
+                # indexes the collection once
                 for test_group in self.test_groups:
-                    self._pool.append(test_group)
-                    for test in test_group:
-                        if '[' in test:
-                            found_prov = []
-                            for pv in self.provs:
-                                if pv in test:
-                                    found_prov.append(pv)
-                                    break
-                            provs = list(set(found_prov).intersection(self.provs))
-                            if provs:
-                                self.used_prov = self.used_prov.union(set(provs))
-                if self.used_prov:
-                    self.ratio = float(len(self.slaves)) / float(len(self.used_prov))
-                else:
-                    self.ratio = 0.0
-            if not self._pool:
+                    self.scheduler.add(test_group)
+            try:
+                test_group, prov, cost = self.scheduler.pop(slave)
+            except IndexError:
                 raise StopIteration
-            current_allocate = self.slave_allocation.get(slave, None)
-            # num_provs_list = [len(v) for k, v in self.slave_allocation.iteritems()]
-            # average_num_provs = sum(num_provs_list) / float(len(self.slaves))
-            appliance_num_limit = 1
-            for test_group in self._pool:
-                for test in test_group:
-                    # If the test is parametrized...
-                    if '[' in test:
-                        found_prov = []
-                        for pv in self.provs:
-                            if pv in test:
-                                found_prov.append(pv)
-                                break
-                        # The line below can probably be removed now, since we compare
-                        # providers in the loop above with self.provs, which is a list
-                        # of all providers.
-                        provs = list(set(found_prov).intersection(self.provs))
-                        # If the parametrization contains a provider...
-                        if provs:
-                            prov = provs[0]
-                            # num_slave_with_prov = len([sl for sl, provs_list
-                            #    in self.slave_allocation.iteritems()
-                            #    if prov in provs_list])
-                            # If this slave/appliance already has providers then...
-                            if current_allocate:
-                                # If the slave has _our_ provider
-                                if prov in current_allocate:
-                                    # provider is already with the slave, so just return the tests
-                                    self._pool.remove(test_group)
-                                    return test_group
-                                # If the slave doesn't have _our_ provider
-                                else:
-                                    # Check to see how many slaves there are with this provider
-                                    if len(self.slave_allocation[slave]) >= appliance_num_limit:
-                                        continue
-                                    else:
-                                        # Adding provider to slave since there are not too many
-                                        self.slave_allocation[slave].append(prov)
-                                        self._pool.remove(test_group)
-                                        return test_group
-                            # If this slave doesn't have any providers...
-                            else:
-                                # Adding provider to slave
-                                self.slave_allocation[slave].append(prov)
-                                self._pool.remove(test_group)
-                                return test_group
-                        else:
-                            # No providers - ie, not a provider parametrized test
-                            self._pool.remove(test_group)
-                            return test_group
-                    else:
-                        # No params, so no need to think about providers
-                        self._pool.remove(test_group)
-                        return test_group
-                # Here means no tests were able to be sent
-            for test_group in self._pool:
-                for test in test_group:
-                    # If the test is parametrized...
-                    if '[' in test:
-                        found_prov = []
-                        for pv in self.provs:
-                            if pv in test:
-                                found_prov.append(pv)
-                                break
-                        # The line below can probably be removed now, since we compare
-                        # providers in the loop above with self.provs, which is a list
-                        # of all providers.
-                        provs = list(set(found_prov).intersection(self.provs))
-                        # If the parametrization contains a provider...
-                        if provs:
-                            # Already too many slaves with provider
-                            app_url = self.slave_urls[slave]
-                            app_ip = urlparse(app_url).netloc
-                            app = IPAppliance(app_ip)
-                            self.print_message('cleansing appliance', slave,
-                                purple=True)
-                            try:
-                                app.delete_all_providers()
-                            except:
-                                self.print_message('cloud not cleanse', slave,
-                                red=True)
-                            self.slave_allocation[slave] = [prov]
-                            self._pool.remove(test_group)
-                            return test_group
-            return []
+            if cost:
+                # Slave has different providers than this group needs
+                app_url = self.slave_urls[slave]
+                app_ip = urlparse(app_url).netloc
+                app = IPAppliance(app_ip)
+                self.print_message('cleansing appliance for {}'.format(prov), slave,
+                    purple=True)
+                try:
+                    app.delete_all_providers()
+                except:
+                    self.print_message('cloud not cleanse', slave,
+                    red=True)
+            return test_group
 
 
 def report_collection_diff(slaveid, from_collection, to_collection):
@@ -706,20 +783,29 @@ def _recv_queue(session):
     while not session.session_finished:
         try:
             with zmq_lock:
-                slaveid, empty, event_json = session.sock.recv_multipart(flags=zmq.NOBLOCK)
+                slaveid, empty, payload = session.sock.recv_multipart(flags=zmq.NOBLOCK)
         except zmq.Again:
             continue
-        event_data = json.loads(event_json)
-        event_name = event_data.pop('_event_name')
+        message = remote.unpack(payload)
+        seq = message['seq']
+
+        if not message['sync']:
+            # a batch of async events, acked as a whole once they're all processed
+            with recv_lock:
+                for event_name, event_data in message['events']:
+                    session._recv_queue.append((slaveid, event_data, event_name, None))
+                session._recv_queue.append((slaveid, None, 'batch_processed', seq))
+            continue
 
+        [(event_name, event_data)] = message['events']
         if event_name == 'message':
             message = event_data.pop('message')
             # messages are special, handle them immediately
             session.print_message(message, slaveid, **event_data)
-            session.ack(slaveid, event_name)
+            session.ack(slaveid, seq)
         else:
             with recv_lock:
-                session._recv_queue.append((slaveid, event_data, event_name))
+                session._recv_queue.append((slaveid, event_data, event_name, seq))
 
 
 class TerminalDistReporter(object):
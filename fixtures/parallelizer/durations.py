@@ -0,0 +1,124 @@
+"""parallelizer durations
+
+Historical test durations, used to balance test groups across slaves
+
+Durations of every test run by the parallelizer are stored in a JSON file, by default
+``log/test_durations.json``. On the next run, the master uses them to predict how long each
+test group will take and hands out the longest groups first (longest processing time first,
+or LPT), so that no slave is left with a long module at the end of a run while the others idle.
+
+Tests that have never been run are predicted to take the median of the known durations.
+
+"""
+import heapq
+import json
+import os
+from collections import defaultdict
+
+#: Predicted duration of any test when there is no history at all
+DEFAULT_DURATION = 1.0
+
+
+class DurationStore(object):
+    """Store of per-test durations, in seconds, keyed by test node id
+
+    Args:
+        path: Path of the JSON file the durations are loaded from and saved to
+
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        self.history = {}
+        self._current = defaultdict(float)
+        try:
+            with open(self.path) as f:
+                self.history = json.load(f)
+        except (IOError, ValueError):
+            # no history yet, or it's unreadable; everything gets the default prediction
+            pass
+        durations = sorted(self.history.values())
+        if durations:
+            self.default = durations[len(durations) // 2]
+        else:
+            self.default = DEFAULT_DURATION
+
+    def __contains__(self, nodeid):
+        return nodeid in self.history
+
+    def predict(self, nodeid):
+        """Predicted duration of a single test"""
+        return self.history.get(nodeid, self.default)
+
+    def predict_group(self, test_group):
+        """Predicted duration of a group of tests"""
+        return sum(self.predict(nodeid) for nodeid in test_group)
+
+    def record(self, nodeid, duration):
+        """Add the duration of one phase (setup, call, teardown) of a test run to its total"""
+        self._current[nodeid] += duration
+
+    def save(self):
+        """Merge durations recorded in this run into the history, and write it out"""
+        if not self._current:
+            return
+        self.history.update(self._current)
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump(self.history, f, indent=0, sort_keys=True)
+        os.rename(tmp_path, self.path)
+
+
+def lpt_groups(test_groups, durations, num_slaves, splittable=None):
+    """Build the longest-processing-time-first list of test groups
+
+    Groups predicted to take longer than an even share of the whole run are split into
+    consecutive chunks no longer than that share, then all groups are sorted longest first.
+    Without any history there is nothing to go on, so the groups are left as they are.
+
+    A group exists so its tests share the module and class scoped fixtures on one slave; a
+    chunk sent to another slave sets all of them up again there. Only the groups ``splittable``
+    accepts are split, the others are kept whole even when that makes the run longer.
+
+    Args:
+        test_groups: Iterable of lists of test ids
+        durations: :py:class:`DurationStore` instance used for predictions
+        num_slaves: How many slaves the groups will be spread across
+        splittable: Callable taking a group and returning whether its tests may run on
+            different slaves, all groups may be split when not given
+
+    Returns:
+        A list of ``(predicted_duration, test_group)`` tuples
+
+    """
+    test_groups = list(test_groups)
+    if not durations.history:
+        return [(durations.predict_group(group), group) for group in test_groups]
+
+    total = sum(durations.predict_group(group) for group in test_groups)
+    share = total / max(num_slaves, 1)
+
+    weighted = []
+    for test_group in test_groups:
+        if splittable is not None and not splittable(test_group):
+            weighted.append((durations.predict_group(test_group), test_group))
+            continue
+        chunk, chunk_duration = [], 0.
+        for nodeid in test_group:
+            duration = durations.predict(nodeid)
+            if chunk and chunk_duration + duration > share:
+                weighted.append((chunk_duration, chunk))
+                chunk, chunk_duration = [], 0.
+            chunk.append(nodeid)
+            chunk_duration += duration
+        if chunk:
+            weighted.append((chunk_duration, chunk))
+    weighted.sort(key=lambda item: item[0], reverse=True)
+    return weighted
+
+
+def lpt_makespan(group_durations, num_slaves):
+    """Predicted makespan of handing out groups in order to the first idle slave"""
+    slaves = [0.] * max(num_slaves, 1)
+    for duration in group_durations:
+        heapq.heapreplace(slaves, slaves[0] + duration)
+    return max(slaves)
@@ -5,11 +5,21 @@ Useful to make sure tests are being parallelized properly, and then reported cor
 This file is named specially to prevent being picked up by py.test's default collector, and should
 not be run during a normal test run.
 
+Running it as a script benchmarks the slave to master report transport instead, comparing the
+events/sec of the old one-JSON-event-per-REQ/REP-round-trip protocol with the current batched
+msgpack one. The current protocol is driven by :py:class:`fixtures.parallelizer.remote.SlaveManager`
+itself, running fake tests that only report their results::
+
+    python fixtures/parallelizer/parallelizer_tester.py
+
 """
+import json
 import random
-from time import sleep
+from threading import Thread
+from time import sleep, time
 
 import pytest
+import zmq
 
 # uncommment this to slow things down, if desired
 # pytestmark= pytest.mark.usefixtures("wait")
@@ -72,3 +82,128 @@ def test_fails_teardown(teardown_fail):
 @pytest.mark.skipif('True')
 def test_skipped():
     pass
+
+
+# The benchmark runs num_bench_tests fake tests through a slave,
+# four events each (logstart plus setup, call and teardown reports)
+num_bench_tests = 5000
+# tests handed to the slave per need_tests request
+bench_chunk_size = 100
+
+
+def _bench_report(nodeid, when):
+    # roughly the size and shape of a real serialized report
+    return {
+        'nodeid': nodeid, 'location': ['test_module.py', 10, 'test_name'],
+        'keywords': {'test_name': 1, 'test_module.py': 1, 'cfme_tests': 1},
+        'outcome': 'passed', 'longrepr': None, 'when': when, 'sections': [],
+        'duration': random.random(),
+    }
+
+
+def _bench_nodeid(i):
+    return 'test_module.py::test_name[{}]'.format(i)
+
+
+def _bench_old_master(sock, num_events):
+    for i in xrange(num_events):
+        slaveid, empty, event_json = sock.recv_multipart()
+        json.loads(event_json)
+        sock.send_multipart([slaveid, '', json.dumps('ack')])
+
+
+def _bench_old_slave(endpoint):
+    sock = zmq.Context.instance().socket(zmq.REQ)
+    sock.connect(endpoint)
+    for i in xrange(num_bench_tests):
+        nodeid = _bench_nodeid(i)
+        events = [('runtest_logstart',
+            {'nodeid': nodeid, 'location': ['test_module.py', 10, 'test_name']})]
+        events.extend(('runtest_logreport', {'report': _bench_report(nodeid, when)})
+            for when in ('setup', 'call', 'teardown'))
+        for name, event in events:
+            event['_event_name'] = name
+            sock.send_json(event)
+            sock.recv_json()
+    sock.close()
+
+
+def _bench_new_master(sock, num_events):
+    """Acknowledge the batches and hand out the tests in chunks, like the master does"""
+    from fixtures.parallelizer import remote
+    node_ids = [_bench_nodeid(i) for i in xrange(num_bench_tests)]
+    while True:
+        slaveid, empty, payload = sock.recv_multipart()
+        message = remote.unpack(payload)
+        reply = None
+        if message['sync'] and message['events'][0][0] == 'need_tests':
+            reply, node_ids = node_ids[:bench_chunk_size], node_ids[bench_chunk_size:]
+        sock.send_multipart([slaveid, '', remote.pack({'seq': message['seq'], 'reply': reply})])
+        if reply == []:
+            return
+
+
+class _BenchItem(object):
+    def __init__(self, nodeid):
+        self.nodeid = nodeid
+        self.location = ('test_module.py', 10, 'test_name')
+
+
+class _BenchReport(object):
+    def __init__(self, nodeid, when):
+        self.__dict__.update(_bench_report(nodeid, when))
+
+
+class _BenchRunner(object):
+    """Stands in for pytest in the slave, running a test only reports it"""
+    def __init__(self):
+        self.option = type('Options', (object,), {'collectonly': False})()
+        self.hook = self
+        self.slave_manager = None
+
+    def pytest_runtest_protocol(self, item, nextitem):
+        self.slave_manager.pytest_runtest_logstart(item.nodeid, item.location)
+        for when in ('setup', 'call', 'teardown'):
+            self.slave_manager.pytest_runtest_logreport(_BenchReport(item.nodeid, when))
+
+
+def _bench_new_slave(endpoint):
+    # what running remote.py as a script sets up before creating the SlaveManager
+    import utils.log
+    from fixtures.parallelizer import remote
+    from utils import conf
+    remote.utils, remote.conf = utils, conf
+
+    runner = _BenchRunner()
+    slave_manager = runner.slave_manager = remote.SlaveManager(
+        runner, 'bench', 'https://127.0.0.1', endpoint)
+    slave_manager.collection = {
+        _bench_nodeid(i): _BenchItem(_bench_nodeid(i)) for i in xrange(num_bench_tests)}
+    slave_manager.pytest_runtestloop(None)
+    slave_manager.sock.close()
+
+
+def benchmark_transport(master, slave):
+    """Return the events/sec pushed through a slave/master transport"""
+    ctx = zmq.Context.instance()
+    master_sock = ctx.socket(zmq.ROUTER)
+    port = master_sock.bind_to_random_port('tcp://127.0.0.1')
+
+    num_events = num_bench_tests * 4
+    master_thread = Thread(target=master, args=(master_sock, num_events))
+    master_thread.start()
+    start = time()
+    slave('tcp://127.0.0.1:{}'.format(port))
+    master_thread.join()
+    elapsed = time() - start
+
+    master_sock.close()
+    return num_events / elapsed
+
+
+if __name__ == '__main__':
+    old = benchmark_transport(_bench_old_master, _bench_old_slave)
+    print('REQ/REP, JSON, one event per round-trip: {:.0f} events/sec'.format(old))
+    new = benchmark_transport(_bench_new_master, _bench_new_slave)
+    print('DEALER/ROUTER, msgpack, batched per test: {:.0f} events/sec'.format(new))
+    print('speedup: {:.1f}x'.format(new / old))
@@ -1,11 +1,79 @@
 import signal
+import zlib
+from collections import deque
+from hashlib import sha1
+from itertools import count
 from urlparse import urlparse
 
+import msgpack
 import zmq
 from py.path import local
 
 SLAVEID = None
 
+#: Maximum number of batches sent to the master that it hasn't acknowledged yet
+ACK_WINDOW = 64
+
+#: Average number of node ids in each chunk of a :py:class:`CollectionDigest`
+DIGEST_CHUNK_SIZE = 64
+
+
+def pack(data):
+    """Encode a message sent between the master and the slaves"""
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def unpack(payload):
+    """Decode a message sent between the master and the slaves"""
+    return msgpack.unpackb(payload, raw=False)
+
+
+def _encode(nodeid):
+    if isinstance(nodeid, unicode):
+        return nodeid.encode('utf-8')
+    return nodeid
+
+
+class CollectionDigest(object):
+    """Merkle-style digest of a test collection, used to compare collections cheaply
+
+    Sorted node ids are split into chunks, each ending after a node id whose CRC32 is a multiple
+    of :py:data:`DIGEST_CHUNK_SIZE`. Chunk boundaries only depend on the node ids around them,
+    so a missing or extra test changes the digest of its own chunk, and no other.
+
+    Args:
+        node_ids: Iterable of collected test node ids
+
+    Attributes:
+        chunks: Lists of node ids, in order
+        chunk_digests: SHA1 hex digest of each chunk
+        root: SHA1 hex digest of all the chunk digests, which is equal for equal collections
+
+    """
+    def __init__(self, node_ids):
+        self.chunks = []
+        chunk = []
+        for nodeid in sorted(node_ids):
+            chunk.append(nodeid)
+            if zlib.crc32(_encode(nodeid)) % DIGEST_CHUNK_SIZE == 0:
+                self.chunks.append(chunk)
+                chunk = []
+        if chunk:
+            self.chunks.append(chunk)
+        self.chunk_digests = [sha1('\n'.join(map(_encode, chunk))).hexdigest()
+            for chunk in self.chunks]
+        self.root = sha1(''.join(self.chunk_digests)).hexdigest()
+
+    def node_ids(self, chunk_indices):
+        """Node ids in the chunks at ``chunk_indices``"""
+        return [nodeid for i in chunk_indices for nodeid in self.chunks[i]]
+
+
+def mismatched_chunks(chunk_digests, other_chunk_digests):
+    """Indices of the chunks in ``chunk_digests`` missing from ``other_chunk_digests``"""
+    other_chunk_digests = set(other_chunk_digests)
+    return [i for i, digest in enumerate(chunk_digests) if digest not in other_chunk_digests]
+
 
 class SlaveManager(object):
     """SlaveManager which coordinates with the master process for parallel testing"""
@@ -20,27 +88,87 @@ class SlaveManager(object):
         # Override the logger in utils.log
 
         ctx = zmq.Context.instance()
-        self.sock = ctx.socket(zmq.REQ)
-        self.sock.set_hwm(1)
+        self.sock = ctx.socket(zmq.DEALER)
         self.sock.setsockopt_string(zmq.IDENTITY, u'{}'.format(self.slaveid))
         self.sock.connect(zmq_endpoint)
 
         self.messages = {}
+        # every message sent to the master gets a sequence number, which it acks
+        self._seq = count(1)
+        self._unacked = set()
+        # async events waiting to be sent in the next batch
+        self._batch = []
+        # tests received from the master that haven't been started yet
+        self._pending_nodes = deque()
 
         self.quit_signaled = False
 
-    def send_event(self, name, **kwargs):
-        kwargs['_event_name'] = name
-        self.log.trace("sending {} {!r}".format(name, kwargs))
-        self.sock.send_json(kwargs)
-        recv = self.sock.recv_json()
-        if recv == 'die':
+    def _send(self, events, sync):
+        seq = next(self._seq)
+        self.sock.send_multipart(['', pack({'seq': seq, 'sync': sync, 'events': events})])
+        self._unacked.add(seq)
+        return seq
+
+    def _recv(self):
+        empty, payload = self.sock.recv_multipart()
+        recv = unpack(payload)
+        if 'revoke' in recv:
+            # not a reply; the master wants some of our tests for another slave
+            self._revoke(recv['revoke'])
+            return None, None
+        self._unacked.discard(recv['seq'])
+        reply = recv.get('reply')
+        if reply == 'die':
             self.log.info('Slave instructed to die by master; shutting down')
             raise SystemExit()
-        else:
-            self.log.trace('received "{!r}" from master'.format(recv))
-            if recv != 'ack':
-                return recv
+        self.log.trace('received "{!r}" from master'.format(recv))
+        return recv['seq'], reply
+
+    def send_event(self, name, **kwargs):
+        """Send an event to the master, and wait for its reply
+
+        Any pending async events are sent first, so the master always sees events in order.
+
+        """
+        self.flush()
+        self.log.trace("sending {} {!r}".format(name, kwargs))
+        seq = self._send([[name, kwargs]], sync=True)
+        while True:
+            ack_seq, reply = self._recv()
+            if ack_seq == seq:
+                return reply
+
+    def post_event(self, name, flush=False, **kwargs):
+        """Queue an event for the master without waiting for a reply
+
+        Queued events are sent as one batch on ``flush``, or before the next
+        :py:meth:`send_event`.
+
+        """
+        self.log.trace("queueing {} {!r}".format(name, kwargs))
+        self._batch.append([name, kwargs])
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Send queued async events, blocking only if too many batches are unacknowledged"""
+        if self._batch:
+            self._send(self._batch, sync=False)
+            self._batch = []
+        while len(self._unacked) > ACK_WINDOW:
+            self._recv()
+
+    def _revoke(self, node_ids):
+        """Give tests back to the master, for the ones among ``node_ids`` that haven't started
+
+        The master only hands out the tests listed in the reply, so no test runs twice.
+
+        """
+        revoked = [nodeid for nodeid in node_ids if nodeid in self._pending_nodes]
+        for nodeid in revoked:
+            self._pending_nodes.remove(nodeid)
+        self.log.info('master reclaimed {} unstarted tests'.format(len(revoked)))
+        self.post_event('tests_revoked', flush=True, node_ids=revoked)
 
     def message(self, message, **kwargs):
         """Send a message to the master, which should get printed to the console"""
@@ -49,14 +177,19 @@ class SlaveManager(object):
     def pytest_collection_finish(self, session):
         """pytest collection hook
 
-        - Sends collected tests to the master for comparison
+        - Sends a digest of collected tests to the master for comparison
+        - Sends the tests in chunks that don't match the master collection, if asked to
 
         """
         self.log.debug('collection finished')
         self.session = session
         self.collection = {item.nodeid: item for item in session.items}
         terminalreporter.disable()
-        self.send_event("collectionfinish", node_ids=self.collection.keys())
+        digest = CollectionDigest(self.collection)
+        reply = self.send_event("collectionfinish",
+            digest=digest.root, chunk_digests=digest.chunk_digests)
+        if reply:
+            self.send_event("collection_chunks", node_ids=digest.node_ids(reply['chunks']))
 
     def pytest_runtest_logstart(self, nodeid, location):
         """pytest runtest logstart hook
@@ -64,15 +197,16 @@ class SlaveManager(object):
         - sends logstart notice to the master
 
         """
-        self.send_event("runtest_logstart", nodeid=nodeid, location=location)
+        self.post_event("runtest_logstart", flush=True, nodeid=nodeid, location=location)
 
     def pytest_runtest_logreport(self, report):
         """pytest runtest logreport hook
 
-        - sends serialized log reports to the master
+        - sends serialized log reports to the master, batched per test
 
         """
-        self.send_event("runtest_logreport", report=serialize_report(report))
+        self.post_event("runtest_logreport", flush=report.when == 'teardown',
+            report=serialize_report(report))
 
     def pytest_internalerror(self, excrepr):
         """pytest internal error hook
@@ -130,9 +264,16 @@ class SlaveManager(object):
             node_ids = self.send_event('need_tests')
             if not node_ids:
                 break
-            for nodeid in node_ids:
+            self._pending_nodes.extend(node_ids)
+            while True:
+                # handle anything the master sent in the meantime, like revoked tests,
+                # before committing to the next test
+                while self.sock.poll(0):
+                    self._recv()
+                if not self._pending_nodes:
+                    break
                 # TODO: take non-unique node ids into account
-                yield self.collection[nodeid]
+                yield self.collection[self._pending_nodes.popleft()]
 
 
 def serialize_report(rep):
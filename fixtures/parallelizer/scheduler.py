@@ -0,0 +1,128 @@
+"""parallelizer scheduler
+
+Hands out test groups to slaves, keeping provider affinity
+
+Every group is parsed for its provider key exactly once, when it is added to the scheduler, and
+stored in a per-provider queue. When a slave asks for work, only the heads of those queues are
+considered, so scheduling cost depends on the number of providers in play, not on the size of
+the collection.
+
+Which group a slave gets is decided by a provider switch cost function; the cheapest group
+wins, and ties are broken by the order in which groups were added. See
+:py:func:`provider_switch_cost` for the default policy.
+
+"""
+from collections import defaultdict, deque
+from itertools import count
+
+
+def provider_switch_cost(slave_providers, provider, limit=1):
+    """Default provider switch cost function
+
+    Args:
+        slave_providers: List of provider keys already set up on the slave's appliance
+        provider: Provider key of the candidate test group, ``None`` if it has no provider
+        limit: Maximum number of providers a slave may hold before it has to be cleansed
+
+    Returns:
+        ``0`` if the group can be run on the slave as-is (adding the provider if needed),
+        a positive number if the slave's appliance has to be cleansed of its providers first.
+
+    Use :py:func:`functools.partial` to change ``limit``.
+
+    """
+    if provider is None or provider in slave_providers or len(slave_providers) < limit:
+        return 0
+    return 1
+
+
+class ProviderScheduler(object):
+    """Provider-affinity scheduler for parallelizer test groups
+
+    Args:
+        providers: Iterable of all known provider keys
+        switch_cost: Callable taking a slave's provider list and a group's provider key,
+            returning the cost of giving that group to that slave;
+            defaults to :py:func:`provider_switch_cost`
+
+    """
+    def __init__(self, providers, switch_cost=provider_switch_cost):
+        # Longest keys first, so the most specific key wins the substring match
+        self.providers = sorted(set(providers), key=len, reverse=True)
+        self.switch_cost = switch_cost
+        # slaveid -> list of provider keys set up on that slave's appliance
+        self.allocation = defaultdict(list)
+        # provider key (None for groups without one) -> deque of (sequence, test group)
+        self._queues = {}
+        self._sequence = count()
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def provider_for(self, test_group):
+        """Return the provider key of a group of test ids, or ``None``
+
+        The first test of the group decides for the whole group, since groups are made of
+        tests sharing the same parametrized id.
+
+        """
+        for test in test_group:
+            if '[' not in test:
+                return None
+            for provider in self.providers:
+                if provider in test:
+                    return provider
+            return None
+        return None
+
+    def add(self, test_group):
+        """Queue a test group, returning its provider key"""
+        provider = self.provider_for(test_group)
+        self._queues.setdefault(provider, deque()).append((next(self._sequence), test_group))
+        self._len += 1
+        return provider
+
+    def pop(self, slaveid):
+        """Take the cheapest test group for a slave
+
+        The slave's provider allocation is updated to reflect the returned group.
+
+        Returns:
+            A ``(test_group, provider, cost)`` tuple; a nonzero ``cost`` means the slave's
+            appliance must be cleansed of its providers before running the group.
+
+        Raises:
+            IndexError: No test groups are left
+
+        """
+        slave_providers = self.allocation[slaveid]
+        best = None
+        for provider, queue in self._queues.items():
+            key = (self.switch_cost(slave_providers, provider), queue[0][0])
+            if best is None or key < best[0]:
+                best = key, provider
+        if best is None:
+            raise IndexError('no test groups left to schedule')
+
+        (cost, _), provider = best
+        queue = self._queues[provider]
+        _, test_group = queue.popleft()
+        if not queue:
+            del self._queues[provider]
+        self._len -= 1
+
+        if cost and provider is not None:
+            self.allocation[slaveid] = [provider]
+        else:
+            self.allocate(slaveid, provider)
+        return test_group, provider, cost
+
+    def accepts(self, slaveid, provider):
+        """Whether a slave can run tests for ``provider`` without being cleansed"""
+        return not self.switch_cost(self.allocation[slaveid], provider)
+
+    def allocate(self, slaveid, provider):
+        """Record that a slave has been given tests for ``provider``"""
+        if provider is not None and provider not in self.allocation[slaveid]:
+            self.allocation[slaveid].append(provider)
@@ -66,7 +66,8 @@ def pytest_sessionfinish(session, exitstatus):
             logger.debug(
                 'Closing ssh connection on %r failed, but ignoring',
                 ssh_client)
-    for session in ssh._client_session:
+    for session in list(ssh._client_session):
         with diaper:
             session.close()
+    ssh.SSHConnectionPool.close_all()
     yield
@@ -0,0 +1,138 @@
+#!/usr/bin/env python2
+
+"""Benchmark evm.log parsing on a synthetic log
+
+Generates an evm.log of the requested size with backend queue messages, worker start and
+termination lines and unrelated noise, then times:
+
+* the previous two pass approach: a ``readline`` loop running the message regexes on every
+  line, followed by a grep of the whole file for worker lines
+* a single pass in a single process
+* a single pass split across all cores
+
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from time import time
+
+from utils.perf_message_stats import (evm_to_messages_and_workers, get_msg_args, get_msg_cmd,
+    get_msg_del, get_msg_deq, get_msg_id, get_msg_timestamp_pid, miqmsg)
+
+stamp = '[----] I, [2016-10-18T{:02d}:{:02d}:{:02d}.{:06d} #{}:b15814]  INFO -- : '
+put = ('MIQ(MiqQueue.put) Message id: [{id}], id: [], Zone: [default], '
+    'Role: [ems_metrics_collector], Server: [], Ident: [ems_metrics_collector], Target id: [], '
+    'Instance id: [{id}], Task id: [], Command: [{cmd}], Timeout: [600], Priority: [100], '
+    'State: [ready], Deliver On: [], Data: [], Args: [{args}]')
+get = ('MIQ(MiqQueue.get_via_drb) Message id: [{id}], MiqWorker id: [21], Zone: [default], '
+    'Role: [ems_metrics_collector], Server: [], Ident: [ems_metrics_collector], Target id: [], '
+    'Instance id: [{id}], Task id: [], Command: [{cmd}], Timeout: [600], Priority: [100], '
+    'State: [dequeue], Deliver On: [], Data: [], Args: [{args}], Dequeued in: [{deq}] seconds')
+delivered = 'MIQ(MiqQueue.delivered) Message id: [{id}], State: [ok], Delivered in [{dlv}] seconds'
+worker = ('MIQ(MiqPriorityWorker) ID [{id}], PID [{pid}], GUID [c6b4], Zone [default], '
+    'Active Roles [], Assigned Roles [], Configuration:')
+worker_stop = 'MIQ(MiqServer#stop_worker) Stopping Worker with ID: [{id}], "evm_worker_stop"'
+noise = [
+    'MIQ(ManageIQ::Providers::Vmware::InfraManager::Vm#perf_capture) [realtime] Capture for '
+    'Vm name: [vm-{id}], id: [{id}]...Complete - Timings: {{:capture_state=>0.05}}',
+    'MIQ(MiqGenericWorker::Runner#get_message_via_drb) Message id: [{id}], MiqWorker id: [21]',
+    'Processing by DashboardController#show as HTML',
+    'MIQ(MiqServer#heartbeat) Heartbeat [2016-10-18 14:00:00 UTC]...Complete',
+    'MIQ(MiqPriorityWorker::Runner#do_work) Worker heartbeat for PID [{pid}]',
+    'Q-task_id([job_dispatcher]) MIQ(JobProxyDispatcher#dispatch) Complete - Timings: {{}}',
+    'Completed 200 OK in 35ms (Views: 20.1ms | ActiveRecord: 4.2ms)',
+]
+commands = ['ManageIQ::Providers::Vmware::InfraManager::Vm.perf_capture_realtime',
+    'Storage.perf_capture_hourly', 'MiqEvent.raise_evm_event', 'EmsRefresh.refresh']
+
+
+def generate_log(path, size):
+    msg_id = 0
+    with open(path, 'w') as log_file:
+        while log_file.tell() < size:
+            lines = []
+            for _ in range(1000):
+                msg_id += 1
+                ts = stamp.format((msg_id // 3600000) % 24, (msg_id // 60000) % 60,
+                    (msg_id // 1000) % 60, msg_id % 1000000, 3450 + msg_id % 10)
+                fmt = dict(id=msg_id, cmd=random.choice(commands), args='[["EmsVmware", 1]]',
+                    deq=random.random() * 10, dlv=random.random() * 10, pid=6000 + msg_id)
+                lines.extend(ts + line.format(**fmt) for line in (put, get, delivered))
+                lines.extend(ts + line.format(**fmt) for line in noise)
+                if msg_id % 500 == 0:
+                    lines.append(ts + worker.format(**fmt))
+                elif msg_id % 500 == 250:
+                    lines.append(ts + worker_stop.format(id=msg_id - 250))
+            log_file.write('\n'.join(lines) + '\n')
+
+
+def two_pass(evm_log):
+    """Scan the log the way perf_process_evm used to
+
+    Only the regex work is timed, no results are built, so this is a lower bound of the old cost.
+    """
+    with open(evm_log) as log_file:
+        for evm_log_line in iter(log_file.readline, ''):
+            evm_log_line = evm_log_line.strip()
+            miqmsg_result = miqmsg.search(evm_log_line)
+            if miqmsg_result and miqmsg_result.group(1).startswith('MiqQueue.'):
+                get_msg_timestamp_pid(evm_log_line)
+                get_msg_id(evm_log_line)
+                if miqmsg_result.group(1) == 'MiqQueue.put':
+                    get_msg_cmd(evm_log_line)
+                    get_msg_args(evm_log_line)
+                elif miqmsg_result.group(1) == 'MiqQueue.get_via_drb':
+                    get_msg_deq(evm_log_line)
+                else:
+                    get_msg_del(evm_log_line)
+    p = subprocess.Popen(['grep', 'Interrupt\\|MIQ([A-Za-z]*) ID\\|"evm_worker_uptime_exceeded\\|'
+        '"evm_worker_memory_exceeded\\|"evm_worker_stop\\|Worker exiting.', evm_log],
+        stdout=subprocess.PIPE)
+    for evm_log_line in p.communicate()[0].strip().split('\n'):
+        get_msg_timestamp_pid(evm_log_line)
+
+
+def timed(label, func, *args, **kwargs):
+    start = time()
+    func(*args, **kwargs)
+    elapsed = time() - start
+    print('{}: {:.1f}s'.format(label, elapsed))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', default=2048, type=int, dest='size_mb',
+        help='Size of the generated evm.log in MiB, default 2048')
+    parser.add_argument('--evm-log', default=None, dest='evm_log',
+        help='Use an existing evm.log instead of generating one')
+    args = parser.parse_args()
+
+    if args.evm_log:
+        evm_log = args.evm_log
+    else:
+        evm_log = os.path.join(tempfile.mkdtemp(), 'evm.log')
+        print('Generating {} MiB synthetic evm.log in {}'.format(args.size_mb, evm_log))
+        generate_log(evm_log, args.size_mb * 1024 * 1024)
+
+    try:
+        two_passes = timed('two passes, 1 process', two_pass, evm_log)
+        one_pass = timed('single pass, 1 process', evm_to_messages_and_workers, evm_log, {},
+            processes=1)
+        cores = multiprocessing.cpu_count()
+        parallel = timed('single pass, {} processes'.format(cores), evm_to_messages_and_workers,
+            evm_log, {}, processes=cores)
+        print('speedup over two passes: {:.1f}x single process, {:.1f}x parallel'.format(
+            two_passes / one_pass, two_passes / parallel))
+    finally:
+        if not args.evm_log:
+            os.remove(evm_log)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python2
+
+"""Benchmark the CPU time spent waiting for long remote commands
+
+Runs two remote commands for the requested time each:
+
+* one printing a line to stdout and stderr every few seconds
+* one with its output redirected to a file, so the channel reaches its end of file right away
+  while the command keeps running
+
+Each of them runs once with the previous output collection of SSHClient.run_command, which polls
+the channel and iterates its line buffered files, and once with the current run_command, which
+sleeps in select until the channel has data and then waits for the exit status. Prints the wall
+clock and the CPU time this process spent on each run.
+"""
+import argparse
+import os
+import sys
+from time import time
+
+from utils.ssh import SSHClient
+
+
+def line_loop(client, command):
+    """Collect the output the way run_command used to"""
+    session = client.open_session()
+    session.exec_command(command)
+    stdout = session.makefile()
+    stderr = session.makefile_stderr()
+    output = []
+    while True:
+        if session.recv_ready:
+            for line in stdout:
+                output.append(line)
+        if session.recv_stderr_ready:
+            for line in stderr:
+                output.append(line)
+        if session.exit_status_ready():
+            break
+    return session.recv_exit_status(), ''.join(output)
+
+
+def timed(label, func, *args, **kwargs):
+    start_cpu = sum(os.times()[:2])
+    start = time()
+    func(*args, **kwargs)
+    elapsed, cpu = time() - start, sum(os.times()[:2]) - start_cpu
+    print('{}: {:.1f}s wall clock, {:.2f}s CPU'.format(label, elapsed, cpu))
+    return cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hostname', default=None,
+        help='Host to run the command on, the current appliance by default')
+    parser.add_argument('--username', default=None, help='SSH user, from credentials by default')
+    parser.add_argument('--password', default=None, help='SSH password')
+    parser.add_argument('--duration', default=600, type=int,
+        help='Seconds the remote command runs for, default 600')
+    parser.add_argument('--interval', default=5, type=int,
+        help='Seconds between the lines the remote command prints, default 5')
+    args = parser.parse_args()
+
+    connect_kwargs = {k: v for k, v in vars(args).items()
+        if k in ('hostname', 'username', 'password') and v is not None}
+    client = SSHClient(**connect_kwargs)
+    commands = [
+        ('printing', 'for i in $(seq {}); do sleep {}; echo "line $i"; echo "err $i" >&2; '
+            'done'.format(max(args.duration // args.interval, 1), args.interval)),
+        ('redirected', 'exec > /tmp/perf_ssh_benchmark.log 2>&1; sleep {}'.format(args.duration)),
+    ]
+    for name, command in commands:
+        polled = timed('{}, line buffered polling'.format(name), line_loop, client, command)
+        selected = timed('{}, select'.format(name), client.run_command, command,
+            ensure_user=True)
+        print('{}, CPU time saved: {:.2f}s'.format(name, polled - selected))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python2
+
+"""Count the WebDriver calls of reading and searching a UI table
+
+Logs in to the current appliance, opens the given page and works with the table there:
+
+* searches it for the rows matching the given cells, once with the snapshot read by a single
+  script (:py:meth:`cfme.web_ui.Table.read`) and once with the XPath search used before
+* reads the texts of all its cells, once with :py:meth:`cfme.web_ui.Table.read` and once
+  through the rows and columns of :py:meth:`cfme.web_ui.Table.rows`
+
+Every run uses a new table object, so reading the headers is counted as well. Prints the number
+of calls sent to the WebDriver and the time each run took.
+
+Example:
+
+    scripts/perf_table_benchmark.py /vm_infra/explorer --cell name=my-vm
+"""
+import argparse
+import sys
+from time import time
+
+from cfme.login import login_admin
+from cfme.web_ui import Table
+from fixtures.pytest_store import store
+from utils.browser import ensure_browser_open
+
+
+class CallCounter(object):
+    """Counts the commands sent to the WebDriver while used as a context manager"""
+    def __init__(self, driver):
+        self.driver = driver
+        self.calls = 0
+
+    def __enter__(self):
+        execute = self.driver.execute
+
+        def counting_execute(*args, **kwargs):
+            self.calls += 1
+            return execute(*args, **kwargs)
+        # WebElements send their commands through the driver too
+        self.driver.execute = counting_execute
+        return self
+
+    def __exit__(self, *exc_info):
+        del self.driver.execute
+
+
+def measure(driver, label, func):
+    start = time()
+    with CallCounter(driver) as counter:
+        result = func()
+    print('{}: {} WebDriver calls, {:.1f}s'.format(label, counter.calls, time() - start))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='Path of the page with the table, e.g. /vm_infra/explorer')
+    parser.add_argument('--table', default='//div[@id="list_grid"]/table',
+        help='Locator of the table, default //div[@id="list_grid"]/table')
+    parser.add_argument('--cell', action='append', default=[], metavar='HEADER=VALUE',
+        help='Cell the searched rows contain, can be repeated')
+    args = parser.parse_args()
+
+    cells = dict(cell.split('=', 1) for cell in args.cell)
+    driver = ensure_browser_open()
+    login_admin()
+    driver.get('{}{}'.format(store.base_url.rstrip('/'), args.path))
+
+    def table(bulk_read):
+        table = Table(args.table)
+        table.bulk_read = bulk_read
+        return table
+
+    if cells:
+        bulk = measure(driver, 'search, one script',
+            lambda: table(True).find_rows_by_cells(cells))
+        xpath = measure(driver, 'search, XPath',
+            lambda: table(False).find_rows_by_cells(cells))
+        print('Found {} rows with one script and {} rows with XPath'.format(len(bulk), len(xpath)))
+
+    rows = measure(driver, 'read, one script', lambda: table(True).read())
+    measure(driver, 'read, row by row',
+        lambda: [[cell.text for cell in row.columns] for row in table(False).rows()])
+    print('The table has {} rows'.format(len(rows)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,24 +6,39 @@ Specifically, it will block until the specified URL returns status code 200.
 
 It will use base_url from conf.env by default.
 
+When more URLs are given, all of the appliances are waited for at the same time, and the time it
+took every one of them to be ready is printed.
+
 """
 import argparse
 import sys
 
 from utils.appliance import IPAppliance
+from utils.appliance.readiness import wait_for_appliances
 
 
 def main():
     parser = argparse.ArgumentParser(epilog=__doc__,
         formatter_class=argparse.RawDescriptionHelpFormatter)
-    parser.add_argument('url', nargs='?', default=None,
+    parser.add_argument('url', nargs='*', default=None,
         help='URL of target appliance, e.g. "https://ip_or_host/"')
     parser.add_argument('--num-sec', default=600, type=int, dest='num_sec',
         help='Maximum number of seconds to wait before giving up, default 600 (10 minutes)')
 
     args = parser.parse_args()
+    if len(args.url) > 1:
+        statuses = wait_for_appliances(
+            [IPAppliance.from_url(url) for url in args.url], checks=['web_ui'],
+            timeout=args.num_sec)
+        for appliance, status in statuses.items():
+            print('{}: {} after {:.0f}s'.format(
+                appliance.address, 'ready' if status.ready else 'not ready', status.elapsed))
+        if not all(status.ready for status in statuses.values()):
+            return 1
+        return
+
     if args.url:
-        ip_a = IPAppliance.from_url(args.url)
+        ip_a = IPAppliance.from_url(args.url[0])
     else:
         ip_a = IPAppliance()
     result = ip_a.wait_for_web_ui(timeout=args.num_sec)
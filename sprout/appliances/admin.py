@@ -171,6 +171,9 @@ class ProviderAdmin(Admin):
         "id", "working", "num_simultaneous_provisioning", "remaining_provisioning_slots",
         "provisioning_load", "show_ip_address", "appliance_load"]
 
+    def get_queryset(self, request):
+        return super(ProviderAdmin, self).get_queryset(request).with_capacity()
+
     def remaining_provisioning_slots(self, instance):
         return str(instance.remaining_provisioning_slots)
 
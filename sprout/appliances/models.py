@@ -115,7 +115,34 @@ class DelayedProvisionTask(MetadataMixin):
             self.provider_to_avoid.id if self.provider_to_avoid is not None else "---")
 
 
+class ProviderQuerySet(models.QuerySet):
+    def with_capacity(self):
+        """Counts what the capacity properties of :py:class:`Provider` need in the same query
+
+        The providers then answer ``num_currently_provisioning``, ``num_templates_preparing``,
+        ``num_currently_managing`` and all the slot and load properties based on them without any
+        further query. The counts are a snapshot taken when the query runs.
+        """
+        appliance = 'provider_templates__appliance'
+        return self.annotate(
+            provisioning_count=models.Count(
+                models.Case(models.When(
+                    then='{}__id'.format(appliance),
+                    **{
+                        '{}__ready'.format(appliance): False,
+                        '{}__marked_for_deletion'.format(appliance): False,
+                        '{}__ip_address__isnull'.format(appliance): True})),
+                distinct=True),
+            preparing_count=models.Count(
+                models.Case(models.When(
+                    provider_templates__ready=False, then='provider_templates__id')),
+                distinct=True),
+            managing_count=models.Count(appliance, distinct=True))
+
+
 class Provider(MetadataMixin):
+    objects = ProviderQuerySet.as_manager()
+
     id = models.CharField(max_length=32, primary_key=True, help_text="Provider's key in YAML.")
     working = models.BooleanField(default=False, help_text="Whether provider is available.")
     num_simultaneous_provisioning = models.IntegerField(default=5,
@@ -174,15 +201,38 @@ class Provider(MetadataMixin):
     def api(self):
         return get_mgmt(self.id)
 
+    @classmethod
+    def attach_capacity(cls, templates):
+        """Loads the providers of the templates with their capacity counted in one query
+
+        Templates on the same provider share one provider object, so a scheduling decision
+        looking at ``template.provider.free`` or ``template.provider.appliance_load`` does not
+        query the database for every template.
+
+        Returns: List of the templates
+        """
+        templates = list(templates)
+        provider_ids = set(template.provider_id for template in templates)
+        providers = {
+            provider.id: provider
+            for provider in cls.objects.filter(id__in=provider_ids).with_capacity()}
+        for template in templates:
+            template.provider = providers[template.provider_id]
+        return templates
+
     @property
     def num_currently_provisioning(self):
-        return len(
-            Appliance.objects.filter(
-                ready=False, marked_for_deletion=False, template__provider=self, ip_address=None))
+        if hasattr(self, 'provisioning_count'):
+            return self.provisioning_count
+        return Appliance.objects.filter(
+            ready=False, marked_for_deletion=False, template__provider=self,
+            ip_address=None).count()
 
     @property
     def num_templates_preparing(self):
-        return len(Template.objects.filter(provider=self, ready=False))
+        if hasattr(self, 'preparing_count'):
+            return self.preparing_count
+        return Template.objects.filter(provider=self, ready=False).count()
 
     @property
     def remaining_configuring_slots(self):
@@ -202,7 +252,9 @@ class Provider(MetadataMixin):
 
     @property
     def num_currently_managing(self):
-        return len(Appliance.objects.filter(template__provider=self))
+        if hasattr(self, 'managing_count'):
+            return self.managing_count
+        return Appliance.objects.filter(template__provider=self).count()
 
     @property
     def currently_managed_appliances(self):
@@ -670,6 +722,10 @@ class Appliance(MetadataMixin):
 
     RESET_SWAP_STATES = {Power.OFF, Power.REBOOTING, Power.ORPHANED}
 
+    # Fields reconcile_with_vms may change
+    RECONCILED_FIELDS = (
+        'name', 'uuid', 'ip_address', 'power_state', 'power_state_changed', 'swap', 'ssh_failed')
+
     template = models.ForeignKey(
         Template, on_delete=models.CASCADE, help_text="Appliance's source template.")
     appliance_pool = models.ForeignKey("AppliancePool", null=True, on_delete=models.CASCADE,
@@ -836,11 +892,11 @@ class Appliance(MetadataMixin):
                 appliance.save()
                 self.logger.info("Status changed: {}".format(status))
 
-    def set_power_state(self, power_state):
+    def set_power_state(self, power_state, now=None):
         if power_state != self.power_state:
             self.logger.info("Changed power state to {}".format(power_state))
             self.power_state = power_state
-            self.power_state_changed = timezone.now()
+            self.power_state_changed = now or timezone.now()
             if power_state in self.RESET_SWAP_STATES:
                 # Reset some values
                 self.swap = 0
@@ -853,6 +909,61 @@ class Appliance(MetadataMixin):
     def unassigned(cls):
         return cls.objects.filter(appliance_pool=None, ready=True)
 
+    @classmethod
+    def reconcile_with_vms(cls, appliances, vms):
+        """Updates the appliances from the VMs the provider reports
+
+        The appliances are matched with the VMs by UUID first, then by name. A matched appliance
+        takes the name or UUID, the IP address and the power state of its VM, the appliances
+        without a VM are orphaned. Only the rows and fields that changed are written, and the
+        rows with the same changes share one UPDATE statement.
+
+        Args:
+            appliances: Appliances of the provider
+            vms: VMs of the provider, with ``name``, ``uuid``, ``ip`` and ``power_state``
+
+        Returns: Number of the appliances that changed
+        """
+        now = timezone.now()
+        vms = list(vms)
+        name_vms = {vm.name: vm for vm in vms}
+        uuid_vms = {vm.uuid: vm for vm in vms if vm.uuid}
+        updates = {}
+        for appliance in appliances:
+            before = [getattr(appliance, field) for field in cls.RECONCILED_FIELDS]
+            if appliance.uuid is not None and appliance.uuid in uuid_vms:
+                vm = uuid_vms[appliance.uuid]
+                # Using the UUID and change the name if it changed
+                appliance.name = vm.name
+            elif appliance.name in name_vms:
+                vm = name_vms[appliance.name]
+                # Using the name, and then retrieve uuid
+                appliance.uuid = vm.uuid
+                if before[1] != vm.uuid:
+                    appliance.logger.info("Retrieved UUID: {}".format(vm.uuid))
+            else:
+                vm = None
+            if vm is None:
+                # Orphaned :(
+                appliance.set_power_state(cls.Power.ORPHANED, now)
+            else:
+                appliance.ip_address = vm.ip
+                appliance.set_power_state(
+                    cls.POWER_STATES_MAPPING.get(vm.power_state, cls.Power.UNKNOWN), now)
+            changes = tuple(
+                (field, getattr(appliance, field))
+                for field, old_value in zip(cls.RECONCILED_FIELDS, before)
+                if getattr(appliance, field) != old_value)
+            if changes:
+                updates.setdefault(changes, []).append(appliance.pk)
+        if updates:
+            with transaction.atomic():
+                for changes, pks in updates.iteritems():
+                    # Keeps the number of the query parameters low, SQLite allows 999
+                    for i in range(0, len(pks), 500):
+                        cls.objects.filter(pk__in=pks[i:i + 500]).update(**dict(changes))
+        return sum(len(pks) for pks in updates.itervalues())
+
     @classmethod
     def give_to_pool(cls, pool, custom_limit=None, cpu=None, ram=None):
         """Give appliances from shepherd to the pool where the maximum count is specified by pool
@@ -1154,15 +1265,16 @@ class AppliancePool(MetadataMixin):
 
     @property
     def possible_provisioning_templates(self):
+        templates = Provider.attach_capacity(self.possible_templates)
         return sorted(
-            filter(lambda tpl: tpl.provider.free, self.possible_templates),
+            filter(lambda tpl: tpl.provider.free, templates),
             # Sort by date and load to pick the best match (least loaded provider)
             key=lambda tpl: (tpl.date, 1.0 - tpl.provider.appliance_load), reverse=True)
 
     @property
     def possible_providers(self):
         """Which providers contain a template that could be used for provisioning?."""
-        return set(tpl.provider for tpl in self.possible_templates)
+        return set(tpl.provider for tpl in Provider.attach_capacity(self.possible_templates))
 
     @property
     def appliances(self):
@@ -1303,7 +1415,7 @@ class AppliancePool(MetadataMixin):
     @property
     def num_possible_appliance_slots(self):
         providers = set([])
-        for template in self.possible_templates:
+        for template in Provider.attach_capacity(self.possible_templates):
             providers.add(template.provider)
         slots = 0
         for provider in providers:
@@ -1039,35 +1039,10 @@ def refresh_appliances_provider(self, provider_id):
         # Ignore this provider
         return
     vms = provider.api.all_vms()
-    dict_vms = {}
-    uuid_vms = {}
-    for vm in vms:
-        dict_vms[vm.name] = vm
-        if vm.uuid:
-            uuid_vms[vm.uuid] = vm
-    for appliance in Appliance.objects.filter(template__provider=provider):
-        if appliance.uuid is not None and appliance.uuid in uuid_vms:
-            vm = uuid_vms[appliance.uuid]
-            # Using the UUID and change the name if it changed
-            appliance.name = vm.name
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.power_state, Appliance.Power.UNKNOWN))
-            appliance.save()
-        elif appliance.name in dict_vms:
-            vm = dict_vms[appliance.name]
-            # Using the name, and then retrieve uuid
-            appliance.uuid = vm.uuid
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.power_state, Appliance.Power.UNKNOWN))
-            appliance.save()
-            self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
-                appliance.id, appliance.name, appliance.uuid))
-        else:
-            # Orphaned :(
-            appliance.set_power_state(Appliance.Power.ORPHANED)
-            appliance.save()
+    appliances = Appliance.objects.filter(template__provider=provider)
+    changed = Appliance.reconcile_with_vms(appliances, vms)
+    self.logger.info("Refreshed appliances in {}: {} of {} changed".format(
+        provider_id, changed, len(appliances)))
 
 
 @singleton_task()
@@ -1199,7 +1174,7 @@ def generic_shepherd(self, preconfigured):
         # Keeping current appliances
         # Retrieve list of all templates for given group
         # I know joins might be a bit better solution but I'll leave that for later.
-        possible_templates = list(
+        possible_templates = Provider.attach_capacity(
             Template.objects.filter(
                 usable=True, ready=True, template_group=gs.template_group,
                 preconfigured=preconfigured, **filter_keep).all())
@@ -1715,8 +1690,10 @@ def synchronize_untracked_vms_in_provider(self, provider_id):
     if not hasattr(provider_api, 'list_vm'):
         # This provider does not have VMs (eg. Hawkular or Openshift)
         return
+    tracked_names = set(
+        Appliance.objects.filter(template__provider=provider).values_list('name', flat=True))
     for vm_name in sorted(map(str, provider_api.list_vm())):
-        if Appliance.objects.filter(name=vm_name, template__provider=provider).count() != 0:
+        if vm_name in tracked_names:
             continue
         # We have an untracked VM. Let's investigate
         try:
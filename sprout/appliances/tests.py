@@ -1,4 +1,122 @@
 # -*- coding: utf-8 -*-
-# from django.test import TestCase
+from datetime import date
 
-# Create your tests here.
+from django.contrib.auth.models import Group as DjangoGroup, User
+from django.test import TestCase
+
+from appliances.models import Appliance, AppliancePool, Group, Provider, Template
+
+
+class ProviderCapacityTestCase(TestCase):
+    def setUp(self):
+        self.user_group = DjangoGroup.objects.create(name='testers')
+        self.owner = User.objects.create(username='tester')
+        self.owner.groups.add(self.user_group)
+        self.group = Group.objects.create(id='downstream-58z')
+        # provider N has N appliances provisioning and N + 1 appliances in total
+        for i in range(4):
+            provider = Provider.objects.create(
+                id='provider{}'.format(i), working=True, num_simultaneous_provisioning=2,
+                appliance_limit=4)
+            provider.user_groups.add(self.user_group)
+            template = self.create_template(provider, ready=True)
+            self.create_template(provider, ready=False)
+            for j in range(i):
+                Appliance.objects.create(
+                    template=template, name='provisioning-{}-{}'.format(i, j))
+            Appliance.objects.create(
+                template=template, name='running-{}'.format(i), ready=True,
+                ip_address='10.0.0.{}'.format(i))
+
+    def create_template(self, provider, ready):
+        return Template.objects.create(
+            provider=provider, template_group=self.group, date=date.today(),
+            original_name='template', name='template-{}'.format(ready), ready=ready,
+            usable=True)
+
+    def test_with_capacity(self):
+        with self.assertNumQueries(1):
+            providers = list(Provider.objects.with_capacity().order_by('id'))
+            capacity = [
+                (p.num_currently_provisioning, p.num_currently_managing,
+                 p.num_templates_preparing, p.remaining_provisioning_slots, p.free,
+                 p.appliance_load)
+                for p in providers]
+        assert capacity == [
+            (0, 1, 1, 2, True, 0.25),
+            (1, 2, 1, 1, True, 0.5),
+            (2, 3, 1, 0, False, 0.75),
+            (3, 4, 1, 0, False, 1.0)]
+        # the same answers without the annotations
+        for provider in Provider.objects.order_by('id'):
+            assert (
+                provider.num_currently_provisioning, provider.num_currently_managing,
+                provider.num_templates_preparing, provider.remaining_provisioning_slots,
+                provider.free, provider.appliance_load) == capacity.pop(0)
+
+    def test_possible_provisioning_templates(self):
+        pool = AppliancePool.objects.create(
+            total_count=1, group=self.group, owner=self.owner, preconfigured=True)
+        with self.assertNumQueries(2):
+            templates = pool.possible_provisioning_templates
+        assert [template.provider.id for template in templates] == ['provider0', 'provider1']
+        with self.assertNumQueries(2):
+            assert pool.num_possible_provisioning_slots == 3
+
+
+class FakeVM(object):
+    def __init__(self, name, uuid, ip, power_state):
+        self.name = name
+        self.uuid = uuid
+        self.ip = ip
+        self.power_state = power_state
+
+
+class ReconcileWithVMsTestCase(TestCase):
+    def setUp(self):
+        provider = Provider.objects.create(id='provider', working=True)
+        group = Group.objects.create(id='downstream-58z')
+        template = Template.objects.create(
+            provider=provider, template_group=group, date=date.today(),
+            original_name='template', name='template', ready=True)
+        for i in range(10):
+            Appliance.objects.create(
+                template=template, name='appliance{}'.format(i), uuid='uuid{}'.format(i),
+                ip_address='10.0.0.{}'.format(i), power_state=Appliance.Power.ON)
+        self.vms = [
+            FakeVM('appliance{}'.format(i), 'uuid{}'.format(i), '10.0.0.{}'.format(i), 'up')
+            for i in range(10)]
+
+    def reconcile(self):
+        return Appliance.reconcile_with_vms(Appliance.objects.order_by('id'), self.vms)
+
+    def test_nothing_changed(self):
+        with self.assertNumQueries(1):
+            assert self.reconcile() == 0
+
+    def test_changes(self):
+        # renamed
+        self.vms[0].name = 'renamed'
+        # matched by name, gets the UUID
+        Appliance.objects.filter(name='appliance1').update(uuid=None)
+        # new IP address
+        self.vms[2].ip = '10.0.1.2'
+        # powered off
+        self.vms[3].power_state = 'down'
+        Appliance.objects.filter(name='appliance3').update(swap=1024)
+        # orphaned
+        del self.vms[4:7]
+        # select, savepoint, renamed, UUID, IP, off, orphaned, release savepoint
+        with self.assertNumQueries(8):
+            assert self.reconcile() == 7
+
+        appliances = list(Appliance.objects.order_by('id'))
+        assert appliances[0].name == 'renamed'
+        assert appliances[1].uuid == 'uuid1'
+        assert appliances[2].ip_address == '10.0.1.2'
+        assert appliances[3].power_state == Appliance.Power.OFF
+        assert appliances[3].swap == 0
+        assert [a.power_state for a in appliances[4:7]] == [Appliance.Power.ORPHANED] * 3
+        assert appliances[4].power_state_changed == appliances[6].power_state_changed
+        with self.assertNumQueries(1):
+            assert self.reconcile() == 0
@@ -84,7 +84,8 @@ def providers(request, provider_id=None):
             return go_home(request)
     else:
         try:
-            provider = Provider.objects.filter(id=provider_id, **user_filter).distinct().first()
+            provider = Provider.objects.filter(
+                id=provider_id, **user_filter).distinct().with_capacity().first()
             if provider is None:
                 messages.error(
                     request,
@@ -313,8 +314,8 @@ def providers_for_date_group_and_version(request):
                 filters["date"] = parser.parse(date)
             providers = Template.objects.filter(
                 container_q, **filters).values("provider").distinct()
-            providers = sorted([p.values()[0] for p in providers])
-            providers = [Provider.objects.get(id=provider) for provider in providers]
+            providers = Provider.objects.filter(
+                id__in=[p.values()[0] for p in providers]).with_capacity().order_by('id')
             for provider in providers:
                 appl_filter = dict(
                     appliance_pool=None, ready=True, template__provider=provider,
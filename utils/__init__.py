@@ -201,11 +201,12 @@ class deferred_verpick(object):
 
     def __init__(self, version_pick):
         self.version_pick = version_pick
+        self._picker = None
 
     def __get__(self, obj, cls):
         # TODO: remove the need to trigger for classes
         #       so we can use the class level for documentation of version picks
-        from utils.version import Version, pick as _version_pick
+        from utils.version import Version, VersionPicker
         if on_rtd:
             if self.version_pick:
                 latest = max(self.version_pick, key=Version)
@@ -213,7 +214,9 @@ class deferred_verpick(object):
             else:
                 raise LookupError("Nothing to pick from")
         else:
-            return _version_pick(self.version_pick)
+            if self._picker is None:
+                self._picker = VersionPicker(self.version_pick)
+            return self._picker.pick()
 
 
 def safe_string(o):
@@ -13,6 +13,7 @@ from urlparse import ParseResult, urlparse
 from tempfile import NamedTemporaryFile
 
 from cached_property import cached_property
+from concurrent import futures
 
 from werkzeug.local import LocalStack, LocalProxy
 
@@ -29,12 +30,15 @@ from utils.datafile import load_data_file
 from utils.events import EventTool
 from utils.log import logger, create_sublogger, logger_wrap
 from utils.net import net_check, resolve_hostname
-from utils.path import data_path, patches_path, scripts_path, conf_path
+from utils.path import data_path, log_path, patches_path, scripts_path, conf_path
+from utils.timeutil import parsetime
 from utils.version import Version, get_stream, pick, LATEST
 from utils.wait import wait_for
 from utils import clear_property_cache
 
+from .cache import PropertyCache, persistent_property
 from .implementations.ui import ViaUI
+from .readiness import wait_for_appliances
 
 
 RUNNING_UNDER_SPROUT = os.environ.get("RUNNING_UNDER_SPROUT", "false") != "false"
@@ -569,7 +573,7 @@ class IPAppliance(object):
             logger=self.rest_logger,
             verify_ssl=False)
 
-    @cached_property
+    @persistent_property
     def miqqe_version(self):
         """Returns version of applied JS patch or None if not present"""
         rc, out = self.ssh_client.run_command('grep "[0-9]\+" /var/www/miq/vmdb/.miqqe_version')
@@ -592,7 +596,7 @@ class IPAppliance(object):
         parsed_url = urlparse(self.url)
         return parsed_url.hostname
 
-    @cached_property
+    @persistent_property
     def product_name(self):
         try:
             # We need to print to a file here because the deprecation warnings make it hard
@@ -627,29 +631,83 @@ class IPAppliance(object):
     def url(self):
         return "{}://{}/".format(self.scheme, self.address)
 
+    # Changes whenever the appliance reboots, is replaced or updated, see utils.appliance.cache
+    _stamp_command = ('cat /proc/sys/kernel/random/boot_id /var/www/miq/vmdb/GUID; '
+                      'stat --printf=%Y /var/www/miq/vmdb/VERSION')
+
+    @cached_property
+    def property_cache(self):
+        """The :py:class:`utils.appliance.cache.PropertyCache` of this appliance
+
+        Stores the :py:class:`utils.appliance.cache.persistent_property` values, so the other
+        processes using the appliance don't have to look them up again.
+        """
+        cache_conf = conf.env.get('appliance_cache', {})
+        directory = cache_conf.get('path', log_path.join('appliance_cache').strpath)
+        path = os.path.join(directory, '{}.pickle'.format(str(self.address).replace(':', '_')))
+
+        def stamp():
+            return self.ssh_client.run_command(self._stamp_command, reraise=True).output
+
+        return PropertyCache(path, stamp, cache_conf.get('ttl', 3600))
+
+    def invalidate_cache(self, *names):
+        """Forgets the cached properties, in this process and in the :py:attr:`property_cache`
+
+        Args:
+            names: Names of the properties to forget, all of the persistent ones by default
+        """
+        if not names:
+            clear_property_cache(self, 'identity', 'build_date')
+            names = set(
+                name for klass in type(self).__mro__ for name, attr in vars(klass).items()
+                if isinstance(attr, persistent_property))
+            self.property_cache.discard()
+        else:
+            self.property_cache.discard(*names)
+        clear_property_cache(self, *names)
+
+    # Cheap commands describing the appliance, see identity
+    _identity_commands = [
+        ('version', 'cat /var/www/miq/vmdb/VERSION'),
+        # Only downstream builds have the BUILD file
+        ('build', 'cat /var/www/miq/vmdb/BUILD'),
+        # Parses the os version out of redhat release file to allow for rhel and centos appliances
+        ('os_version', r"cat /etc/redhat-release | sed 's/.* release \(.*\) (.*/\1/' #)"),
+        ('guid', 'cat /var/www/miq/vmdb/GUID'),
+        ('build_datetime', 'stat --printf=%Y /var/www/miq/vmdb/VERSION'),
+    ]
+
     @cached_property
+    def identity(self):
+        """Results of the commands the identity properties of the appliance are read from
+
+        The properties like :py:attr:`version`, :py:attr:`build` or :py:attr:`guid` are all
+        fetched in one SSH round-trip the first time any of them is needed.
+
+        Returns:
+            A dictionary of :py:class:`utils.ssh.SSHResult` instances, by property name.
+        """
+        names, commands = zip(*self._identity_commands)
+        return dict(zip(names, self.ssh_client.run_commands(commands)))
+
+    @persistent_property
     def version(self):
-        res = self.ssh_client.run_command('cat /var/www/miq/vmdb/VERSION')
+        res = self.identity['version']
         if res.rc != 0:
             raise RuntimeError('Unable to retrieve appliance VMDB version')
         return Version(res.output)
 
-    @cached_property
+    @persistent_property
     def build(self):
-        if self.ssh_client.is_appliance_downstream():
-            res = self.ssh_client.run_command('cat /var/www/miq/vmdb/BUILD')
-            if res.rc != 0:
-                raise RuntimeError('Unable to retrieve appliance VMDB version')
-            return res.output.strip("\n")
+        if self.is_downstream:
+            return self.identity['build'].output.strip("\n")
         else:
             return "master"
 
-    @cached_property
+    @persistent_property
     def os_version(self):
-        # Currently parses the os version out of redhat release file to allow for
-        # rhel and centos appliances
-        res = self.ssh_client.run_command(
-            r"cat /etc/redhat-release | sed 's/.* release \(.*\) (.*/\1/' #)")
+        res = self.identity['os_version']
         if res.rc != 0:
             raise RuntimeError('Unable to retrieve appliance OS version')
         return Version(res.output)
@@ -707,8 +765,8 @@ class IPAppliance(object):
             logger.error('default appliance ssh credentials failed, trying establish ssh connection'
                          ' using ssh private key')
             ssh_client = self.ssh_client_with_privatekey()
-        # FIXME: propperly store ssh clients we made
-        store.ssh_clients_to_close.append(ssh_client)
+        # The connections are shared, closing them at the end of the session is up to
+        # utils.ssh.SSHConnectionPool
         return ssh_client
 
     @property
@@ -851,7 +909,7 @@ class IPAppliance(object):
         self.ssh_client.run_command(
             "echo '{}' > /var/www/miq/vmdb/.miqqe_version".format(current_miqqe_version))
         # Invalidate cached version
-        del self.miqqe_version
+        self.invalidate_cache('miqqe_version')
 
     @logger_wrap("Work around missing Gem file: {}")
     def workaround_missing_gemfile(self, log_callback=None):
@@ -931,6 +989,7 @@ class IPAppliance(object):
                 output)
             log_callback(msg)
             raise ApplianceException(msg)
+        self.invalidate_cache()
 
     @logger_wrap("Setup upstream DB: {}")
     def setup_upstream_db(self, log_callback=None):
@@ -1197,6 +1256,7 @@ class IPAppliance(object):
             msg = 'Appliance {} failed to update RHEL, error in logs'.format(self.address)
             log_callback(msg)
             raise ApplianceException(msg)
+        self.invalidate_cache()
 
         if reboot:
             self.reboot(wait_for_web_ui=False, log_callback=log_callback)
@@ -1267,6 +1327,7 @@ class IPAppliance(object):
         log_callback('Enabling internal DB (region {}) on {}.'.format(region, self.address))
         self.db_address = self.address
         clear_property_cache(self, 'db')
+        self.invalidate_cache()
 
         client = self.ssh_client
 
@@ -1327,6 +1388,7 @@ class IPAppliance(object):
         # reset the db address and clear the cached db object if we have one
         self.db_address = db_address
         clear_property_cache(self, 'db')
+        self.invalidate_cache()
 
         # default
         db_name = db_name or 'vmdb_production'
@@ -1495,6 +1557,7 @@ class IPAppliance(object):
 
         wait_for(lambda: client.uptime() < old_uptime, handle_exception=True,
             num_sec=600, message='appliance to reboot', delay=10)
+        self.invalidate_cache()
 
         if wait_for_web_ui:
             self.wait_for_web_ui()
@@ -1703,7 +1766,7 @@ class IPAppliance(object):
     @cached_property
     def db(self):
         # slightly crappy: anything that changes self.db_address should also del(self.db)
-        return db.Db(self.db_address)
+        return db.Db(self.db_address, appliance=self)
 
     @property
     def is_db_enabled(self):
@@ -1779,29 +1842,26 @@ class IPAppliance(object):
             'fi;'.format(idle_time))
         return True if 'True' in ssh_output else False
 
-    @cached_property
+    @persistent_property
     def build_datetime(self):
-        datetime = self.ssh_client.get_build_datetime()
-        return datetime
+        return parsetime.fromtimestamp(int(self.identity['build_datetime'].output.strip()))
 
     @cached_property
     def build_date(self):
-        date = self.ssh_client.get_build_date()
-        return date
+        return self.build_datetime.date()
 
-    @cached_property
+    @persistent_property
     def is_downstream(self):
-        return self.ssh_client.is_appliance_downstream()
+        return self.identity['build'].rc == 0
 
     def has_netapp(self):
         return self.ssh_client.appliance_has_netapp()
 
-    @cached_property
+    @persistent_property
     def guid(self):
-        result = self.ssh_client.run_command('cat /var/www/miq/vmdb/GUID')
-        return result.output
+        return self.identity['guid'].output
 
-    @cached_property
+    @persistent_property
     def configuration_details(self):
         """Return details that are necessary to navigate through Configuration accordions.
 
@@ -1848,11 +1908,11 @@ class IPAppliance(object):
         return "{} Region: Region {} [{}]".format(
             self.product_name, r, r)
 
-    @cached_property
+    @persistent_property
     def company_name(self):
         return self.get_yaml_config("vmdb")["server"]["company"]
 
-    @cached_property
+    @persistent_property
     def zone_description(self):
         return db_queries.get_zone_description(self.server_zone_id(), db=self.db)
 
@@ -1945,7 +2005,7 @@ class IPAppliance(object):
             ssh_client.run_rake_command("evm:automate:reset")
 
     def server_details_changed(self):
-        clear_property_cache(self, 'configuration_details', 'zone_description')
+        self.invalidate_cache('configuration_details', 'zone_description')
 
     @logger_wrap("Setting dev branch: {}")
     def use_dev_branch(self, repo, branch, log_callback=None):
@@ -1967,6 +2027,7 @@ class IPAppliance(object):
             ssh_client.run_command(
                 'cd /var/www/miq/vmdb; git checkout dev_branch/{}'.format(branch))
             ssh_client.run_command('cd /var/www/miq/vmdb; bin/update')
+            self.invalidate_cache()
             self.start_evm_service()
             self.wait_for_evm_service()
             self.wait_for_web_ui()
@@ -2295,6 +2356,16 @@ class ApplianceSet(object):
         all_appliances.append(self.primary)
         return all_appliances
 
+    def wait_for_ready(self, timeout=900, checks=None):
+        """Waits for all of the appliances in the set at the same time
+
+        See :py:func:`utils.appliance.readiness.wait_for_appliances`.
+
+        Returns: Map of the appliances to their
+            :py:class:`utils.appliance.readiness.Readiness`
+        """
+        return wait_for_appliances(self.all_appliances, checks=checks, timeout=timeout)
+
     def find_by_name(self, appliance_name):
         """Finds appliance of given name
 
@@ -2444,16 +2515,37 @@ def provision_appliance_set(appliance_set_data, vm_name_prefix='cfme'):
     appliance_set = ApplianceSet(provisioned_appliances[0], provisioned_appliances[1:])
     logger.info('Done - provisioning appliances')
 
+    # The appliances boot at the same time, so wait for all of them at once
+    logger.info('Waiting for the appliances to boot')
+    _raise_unless_ready(appliance_set.wait_for_ready(timeout=1200, checks=['ssh']))
+
     logger.info('Configuring appliances')
     appliance_set.primary.configure(name_to_set=primary_data['name'])
-    for i, appliance in enumerate(appliance_set.secondary):
-        appliance.configure(db_address=appliance_set.primary.address,
-                            name_to_set=secondary_data[i]['name'])
+    # The secondaries only need the database of the primary, configure them side by side
+    if appliance_set.secondary:
+        with futures.ThreadPoolExecutor(max_workers=len(appliance_set.secondary)) as executor:
+            configured = [
+                executor.submit(
+                    appliance.configure, db_address=appliance_set.primary.address,
+                    name_to_set=appliance_data['name'])
+                for appliance, appliance_data in zip(appliance_set.secondary, secondary_data)]
+        for future in configured:
+            future.result()
+    _raise_unless_ready(appliance_set.wait_for_ready())
     logger.info('Done - configuring appliances')
 
     return appliance_set
 
 
+def _raise_unless_ready(statuses):
+    not_ready = [
+        '{} ({})'.format(appliance.address, status.failed)
+        for appliance, status in statuses.items() if not status.ready]
+    if not_ready:
+        raise ApplianceException(
+            'Failed to provision appliance set - not ready: {}'.format(', '.join(not_ready)))
+
+
 class ApplianceStack(LocalStack):
 
     def push(self, obj):
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Appliance properties shared by the processes through a file
+
+Every process talking to an appliance used to look up its version, build, GUID, configuration
+details and so on again. The properties decorated with :py:class:`persistent_property` are stored
+in a :py:class:`PropertyCache` (a :py:class:`utils.pickle_file.PickleCache`), one pickle file per
+appliance address, so the parallelizer slaves and the scripts reuse what the first process found
+out.
+
+A stored entry is used only while it is younger than the TTL and the appliance still has the same
+stamp: its boot id, GUID and the time its VERSION file changed. A reboot, an update or a different
+appliance on the same address therefore makes the entry stale. Changes the stamp doesn't see,
+like restoring a database, have to call :py:meth:`utils.appliance.IPAppliance.invalidate_cache`.
+
+The cache is configured in ``env.yaml``:
+
+.. code-block:: yaml
+
+    appliance_cache:
+        ttl: 3600  # seconds, 0 turns the cache off
+        path: /some/directory  # log/appliance_cache by default
+"""
+from cached_property import cached_property
+
+from utils.log import logger
+from utils.pickle_file import PickleCache as PropertyCache  # noqa
+
+
+class persistent_property(cached_property):
+    """A :py:class:`cached_property` also stored in the ``property_cache`` of its object
+
+    The value is looked up in the process first, then in the property cache and computed only
+    when neither has it. A failure to read the stamp of the appliance is not fatal, the value is
+    computed and just not stored.
+    """
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        name = self.func.__name__
+        try:
+            value = obj.property_cache.get(name)
+        except KeyError:
+            value = self.func(obj)
+            try:
+                obj.property_cache.set(name, value)
+            except Exception as e:
+                logger.warning('Could not store %s of %r: %s', name, obj, e)
+        except Exception as e:
+            logger.warning('Could not read the stored %s of %r: %s', name, obj, e)
+            value = self.func(obj)
+        obj.__dict__[name] = value
+        return value
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Waiting for many appliances to become ready at once
+
+:py:meth:`utils.appliance.IPAppliance.wait_for_web_ui` and friends block on one appliance at a
+time, so bringing up a set of twenty appliances waits for each of them in turn.
+:py:func:`wait_for_appliances` probes all of them from one thread pool instead. Every appliance
+goes through the checks in :py:data:`READINESS_CHECKS` in order, a failed check is retried with an
+exponential backoff, and the result is a map of appliances to their :py:class:`Readiness`.
+
+Usage:
+
+    statuses = wait_for_appliances(appliance_set.all_appliances, timeout=1200)
+    for appliance, status in statuses.items():
+        print(appliance.address, status.ready, status.elapsed)
+"""
+import heapq
+import itertools
+from collections import OrderedDict, namedtuple
+from time import sleep, time
+
+from concurrent import futures
+
+from utils.log import logger
+
+
+READINESS_CHECKS = OrderedDict([
+    ('ssh', lambda appliance: appliance.is_ssh_running),
+    ('db', lambda appliance: appliance.is_db_ready),
+    ('evm', lambda appliance: appliance.is_evm_service_running()),
+    ('web_ui', lambda appliance: appliance._check_appliance_ui_wait_fn()),
+])
+
+
+class Readiness(namedtuple('Readiness', ['ready', 'checks', 'elapsed'])):
+    """Readiness of one appliance
+
+    Attributes:
+        ready: ``True`` when all the checks passed
+        checks: Ordered map of the check names to the seconds it took them to pass, ``None`` for
+            the checks that didn't pass before the timeout
+        elapsed: Seconds until the appliance was ready, or until its probing stopped
+    """
+    __slots__ = ()
+
+    @property
+    def failed(self):
+        """Name of the check that didn't pass, ``None`` for a ready appliance"""
+        for name, seconds in self.checks.items():
+            if seconds is None:
+                return name
+
+
+class _Probe(object):
+    """Probing state of one appliance"""
+    def __init__(self, appliance, checks, start, delay, max_delay):
+        self.appliance = appliance
+        self.checks = checks
+        self.start = start
+        self.initial_delay = delay
+        self.delay = delay
+        self.max_delay = max_delay
+        self.passed = OrderedDict((name, None) for name in checks)
+        self.current = 0
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.current >= len(self.checks)
+
+    def check(self):
+        """Runs the current check, any exception means the check did not pass"""
+        name, check = self.checks.items()[self.current]
+        try:
+            return bool(check(self.appliance))
+        except Exception as e:
+            logger.debug('Readiness check %s on %s failed: %s', name, self.appliance, e)
+            return False
+
+    def record(self, passed, now):
+        """Records a check result and returns when to run the next check, ``None`` when done"""
+        if passed:
+            name = self.checks.keys()[self.current]
+            self.passed[name] = now - self.start
+            logger.info('%s: %s ready after %.1fs', self.appliance, name, self.passed[name])
+            self.current += 1
+            self.delay = self.initial_delay
+            if self.done:
+                self.finished = now
+                return None
+            return now
+        next_time = now + self.delay
+        self.delay = min(self.delay * 2, self.max_delay)
+        return next_time
+
+    def readiness(self, now):
+        return Readiness(self.done, self.passed, (self.finished or now) - self.start)
+
+
+def wait_for_appliances(appliances, checks=None, timeout=900, max_workers=10, delay=5,
+                        max_delay=60):
+    """Waits for many appliances to be ready at the same time
+
+    Args:
+        appliances: Appliances to probe
+        checks: Names of the checks from :py:data:`READINESS_CHECKS` to run, or an ordered map of
+            names to functions taking the appliance, all of :py:data:`READINESS_CHECKS` by default
+        timeout: Number of seconds to wait for all of the appliances (default ``900``)
+        max_workers: Number of checks running at the same time (default ``10``)
+        delay: Seconds before retrying a failed check, doubled after every failure up to
+            ``max_delay`` and reset once the check passes (default ``5``)
+        max_delay: Longest wait between the retries of a check (default ``60``)
+
+    Returns: :py:class:`collections.OrderedDict` of the appliances to their :py:class:`Readiness`
+    """
+    if checks is None:
+        checks = READINESS_CHECKS
+    elif not isinstance(checks, dict):
+        checks = OrderedDict((name, READINESS_CHECKS[name]) for name in checks)
+    start = time()
+    deadline = start + timeout
+    probes = [_Probe(appliance, checks, start, delay, max_delay) for appliance in appliances]
+    # (time of the next check, tie breaker, probe)
+    order = itertools.count()
+    scheduled = [(start, next(order), probe) for probe in probes]
+    running = {}
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while scheduled or running:
+            now = time()
+            while scheduled and scheduled[0][0] <= now:
+                probe = heapq.heappop(scheduled)[2]
+                running[executor.submit(probe.check)] = probe
+            wait = max(scheduled[0][0] - now, 0) if scheduled else None
+            if not running:
+                sleep(wait)
+                continue
+            finished, _ = futures.wait(
+                running, timeout=wait, return_when=futures.FIRST_COMPLETED)
+            now = time()
+            for future in finished:
+                probe = running.pop(future)
+                next_time = probe.record(future.result(), now)
+                if next_time is None:
+                    continue
+                if next_time > deadline:
+                    logger.warning('%s: not ready after %ds', probe.appliance, timeout)
+                    continue
+                heapq.heappush(scheduled, (next_time, next(order), probe))
+
+    now = time()
+    statuses = OrderedDict((probe.appliance, probe.readiness(now)) for probe in probes)
+    for appliance, status in statuses.items():
+        if status.ready:
+            logger.info('%s ready in %.1fs', appliance, status.elapsed)
+        else:
+            logger.error('%s not ready in %.1fs, failed check: %s',
+                appliance, status.elapsed, status.failed)
+    return statuses
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Blocker data shared by the processes through files
+
+Resolving a blocker means fetching the bug or the issue and, for Bugzilla, all its copies and
+duplicates. Every parallelizer slave used to do that again for every test. A
+:py:class:`BlockerCache` stores what was fetched in a pickle file, so the data fetched while the
+tests are collected is reused by all the processes. Every entry expires on its own once it is
+older than the TTL.
+
+The caches are configured in ``env.yaml``:
+
+.. code-block:: yaml
+
+    blocker_cache:
+        ttl: 3600  # seconds, 0 turns the caches off
+        path: /some/directory  # log/blocker_cache by default
+"""
+import os
+from time import time
+
+from utils import conf
+from utils.path import log_path
+from utils.pickle_file import PickleCache
+
+
+class BlockerCache(PickleCache):
+    """Values stored in a file, each of them used for ``ttl`` seconds after it was stored
+
+    Unlike the appliance properties, the values don't depend on any appliance, so there is no
+    stamp and every value expires on its own.
+
+    Args:
+        path: File to store the values in
+        ttl: Number of seconds the values are used for, ``0`` to not store anything
+    """
+    def __init__(self, path, ttl):
+        super(BlockerCache, self).__init__(path, lambda: None, ttl)
+
+    @classmethod
+    def from_config(cls, name):
+        """Returns the cache called ``name`` as configured in ``env.yaml``"""
+        config = conf.env.get('blocker_cache', {})
+        directory = config.get('path') or log_path.join('blocker_cache').strpath
+        return cls(os.path.join(directory, '{}.pickle'.format(name)), config.get('ttl', 3600))
+
+    def _fresh(self, entry):
+        return time() - entry[0] <= self.ttl
+
+    def _read(self):
+        """Returns the entries stored in the file which did not expire yet"""
+        entries = super(BlockerCache, self)._read()
+        return {key: entry for key, entry in entries.iteritems() if self._fresh(entry)}
+
+    def get_many(self, keys):
+        """Returns a dictionary of the stored values of those keys which have one
+
+        The file is read again when some of the keys are missing, another process might have
+        stored them in the meantime.
+        """
+        if not self.enabled:
+            return {}
+        keys = list(keys)
+        if self._values is None or not all(key in self._values for key in keys):
+            self._values = self._read()
+        return {
+            key: self._values[key][1] for key in keys
+            if key in self._values and self._fresh(self._values[key])}
+
+    def get(self, key):
+        """Returns the stored value of the key
+
+        Raises:
+            :py:class:`KeyError` when the value is not stored or it expired
+        """
+        return self.get_many([key])[key]
+
+    def update(self, values):
+        """Stores the values, along with the values other processes stored"""
+        stored = time()
+        super(BlockerCache, self).update(
+            {key: (stored, value) for key, value in values.iteritems()})
@@ -3,10 +3,12 @@ import re
 import six
 import xmlrpclib
 from github import Github
+from github.Issue import Issue
 from urlparse import urlparse
 
 from fixtures.pytest_store import store
 from utils import classproperty, conf, version
+from utils.blocker_cache import BlockerCache
 from utils.bz import Bugzilla
 from utils.log import logger
 
@@ -58,6 +60,28 @@ class Blocker(object):
         else:
             raise ValueError("Wrong specification of the blockers!")
 
+    @classmethod
+    def prefetch(cls, blockers):
+        """Fetches the data of many blockers at once and stores it in the blocker caches.
+
+        Bugzilla bugs are fetched in batches, along with their copies and duplicates. GitHub has no
+        such API, so the issues are just fetched once for all the processes.
+        """
+        parsed = []
+        for blocker in blockers:
+            try:
+                parsed.append(cls.parse(blocker))
+            except ValueError:
+                # Reported when the test using it runs
+                continue
+        blockers = parsed
+        bug_ids = set(blocker.bug_id for blocker in blockers if isinstance(blocker, BZ))
+        if bug_ids:
+            BZ.bugzilla.prefetch(bug_ids)
+        for blocker in blockers:
+            if isinstance(blocker, GH):
+                blocker.data
+
 
 class GH(Blocker):
     DEFAULT_REPOSITORY = conf.env.get("github", {}).get("default_repo", None)
@@ -73,6 +97,12 @@ class GH(Blocker):
                 cls._github = Github()  # Without auth max 60 req/hr
         return cls._github
 
+    @classproperty
+    def cache(cls):
+        if not hasattr(cls, "_cache"):
+            cls._cache = BlockerCache.from_config("github")
+        return cls._cache
+
     def __init__(self, description, **kwargs):
         super(GH, self).__init__(**kwargs)
         self._repo = None
@@ -108,7 +138,12 @@ class GH(Blocker):
     def data(self):
         identifier = "{}:{}".format(self.repo, self.issue)
         if identifier not in self._issue_cache:
-            self._issue_cache[identifier] = self.github.get_repo(self.repo).get_issue(self.issue)
+            try:
+                issue = self.github.create_from_raw_data(Issue, self.cache.get(identifier))
+            except KeyError:
+                issue = self.github.get_repo(self.repo).get_issue(self.issue)
+                self.cache.update({identifier: issue.raw_data})
+            self._issue_cache[identifier] = issue
         return self._issue_cache[identifier]
 
     @property
@@ -4,6 +4,7 @@ from bugzilla import Bugzilla as _Bugzilla
 from collections import Sequence
 
 from cached_property import cached_property
+from utils.blocker_cache import BlockerCache
 from utils.conf import cfme_data, credentials
 from utils.log import logger
 from utils.version import (
@@ -46,8 +47,12 @@ class Product(object):
 
 
 class Bugzilla(object):
+    # Number of bugs asked for in one getbugs call
+    BATCH_SIZE = 100
+
     def __init__(self, **kwargs):
         self.__product = kwargs.pop("product", None)
+        self.__cache = kwargs.pop("cache", None) or BlockerCache(None, 0)
         self.__kwargs = kwargs
         self.__bug_cache = {}
         self.__product_cache = {}
@@ -66,7 +71,13 @@ class Bugzilla(object):
 
     def product(self, product):
         if product not in self.__product_cache:
-            self.__product_cache[product] = self.products(product)[0]
+            key = ("product", product)
+            try:
+                data = self.__cache.get(key)
+            except KeyError:
+                data = self.products(product)[0]._data
+                self.__cache.update({key: data})
+            self.__product_cache[product] = Product(data)
         return self.__product_cache[product]
 
     @property
@@ -86,7 +97,7 @@ class Bugzilla(object):
         password = credentials.get(cr_root, {}).get("password", None)
         return cls(
             url=url, user=username, password=password, cookiefile=None,
-            tokenfile=None, product=product)
+            tokenfile=None, product=product, cache=BlockerCache.from_config("bugzilla"))
 
     @cached_property
     def bugzilla(self):
@@ -110,14 +121,64 @@ class Bugzilla(object):
     def get_bug(self, id):
         id = int(id)
         if id not in self.__bug_cache:
-            self.__bug_cache[id] = BugWrapper(self, self.bugzilla.getbug(id))
+            try:
+                bug = self.__cache.get(id)
+            except KeyError:
+                bug = self.bugzilla.getbug(id)
+                self.__cache.update({id: bug})
+            self.__bug_cache[id] = BugWrapper(self, bug)
         return self.__bug_cache[id]
 
+    def get_bugs(self, ids):
+        """Returns a dictionary of the bugs with given ids.
+
+        The bugs which are not known yet are fetched with as few requests as possible. Bugs which
+        do not exist or are not accessible are left out.
+        """
+        ids = set(map(int, ids))
+        for id, bug in self.__cache.get_many(ids - set(self.__bug_cache)).iteritems():
+            self.__bug_cache[id] = BugWrapper(self, bug)
+        missing = sorted(ids - set(self.__bug_cache))
+        for i in range(0, len(missing), self.BATCH_SIZE):
+            fetched = {
+                bug.id: bug
+                for bug in self.bugzilla.getbugs(missing[i:i + self.BATCH_SIZE])
+                if bug is not None}
+            self.__cache.update(fetched)
+            for id, bug in fetched.iteritems():
+                self.__bug_cache[id] = BugWrapper(self, bug)
+        return {id: self.__bug_cache[id] for id in ids if id in self.__bug_cache}
+
+    def prefetch(self, ids):
+        """Fetches the bugs along with all their copies and duplicates.
+
+        The graph is walked level by level, so a level costs two batches of requests, one for
+        the bugs and one for the bugs they block, which is where the copies are.
+        """
+        expanded = set([])
+        to_expand = set(map(int, ids))
+        while to_expand:
+            bugs = self.get_bugs(to_expand)
+            expanded.update(to_expand)
+            blocked = self.get_bugs(
+                set(int(b_id) for bug in bugs.itervalues() for b_id in bug.blocks))
+            to_expand = set([])
+            for bug in bugs.itervalues():
+                if bug.status == "CLOSED" and bug.resolution == "DUPLICATE":
+                    to_expand.add(int(bug.dupe_of))
+                if bug.copy_of:
+                    to_expand.add(bug.copy_of)
+                to_expand.update(
+                    int(b_id) for b_id in bug.blocks
+                    if int(b_id) in blocked and blocked[int(b_id)].copy_of == bug.id)
+            to_expand -= expanded
+
     def get_bug_variants(self, id):
         if isinstance(id, BugWrapper):
             bug = id
         else:
             bug = self.get_bug(id)
+        self.prefetch([bug.id])
         expanded = set([])
         found = set([])
         stack = set([bug])
@@ -310,6 +371,12 @@ class BugWrapper(object):
             states = self._bugzilla.open_states + ["POST", "MODIFIED"]
         return self.status in states
 
+    def get_history(self):
+        if self._bug.bugzilla is None:
+            # Bugs loaded from the blocker cache are not connected
+            self._bug.bugzilla = self._bugzilla.bugzilla
+        return self._bug.get_history()
+
     @property
     def product(self):
         return self._bugzilla.product(self._bug.product)
@@ -7,7 +7,7 @@ from threading import Lock, Thread
 from paramiko import SSHException
 from progress.bar import IncrementalBar as Bar
 from py.path import local
-from scp import SCPClient, SCPException
+from scp import SCPException
 
 from artifactor.plugins import reporter
 from artifactor.plugins.post_result import test_counts
@@ -39,7 +39,7 @@ def _queue_worker(rc):
         destination_dir.ensure(dir=True)
         if not destination.check():
             if scp is None:
-                scp = SCPClient(client.get_transport())
+                scp = client.scp_client(progress=None)
             try:
                 scp.get(source, destination.strpath)
             except SCPException:
@@ -2,9 +2,10 @@ from collections import Mapping
 from contextlib import contextmanager
 from itertools import izip
 
+import sqlalchemy
 from cached_property import cached_property
 from sqlalchemy import MetaData, create_engine, event, inspect
-from sqlalchemy.exc import ArgumentError, DisconnectionError, InvalidRequestError
+from sqlalchemy.exc import ArgumentError, DisconnectionError, InvalidRequestError, SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import Pool
@@ -12,6 +13,8 @@ from sqlalchemy.pool import Pool
 from fixtures.pytest_store import store
 from utils import conf, ports, version
 from utils.log import logger
+from utils.path import log_path
+from utils.pickle_file import read_pickle, write_pickle
 
 
 @event.listens_for(Pool, "checkout")
@@ -48,6 +51,8 @@ class Db(Mapping):
         hostname: base url to be used (default is from current_appliance)
         credentials: name of credentials to use from :py:attr:`utils.conf.credentials`
             (default ``database``)
+        appliance: appliance the database belongs to, its version keys the schema cache
+            (default is current_appliance when no hostname is given)
 
     Provides convient attributes to common sqlalchemy objects related to this DB,
     as well as a Mapping interface to access and reflect database tables. Where possible,
@@ -78,13 +83,19 @@ class Db(Mapping):
         a latent connection, this can be extremely slow, which will affect methods that return
         tables, like the mapping interface or :py:meth:`values`.
 
+        The reflected tables are therefore stored in a schema cache file, shared by all the
+        processes using a database with the same schema, see :py:attr:`schema_version`. Use
+        :py:meth:`prefetch` to reflect several tables that are not cached yet at once.
+
     """
-    def __init__(self, hostname=None, credentials=None):
+    def __init__(self, hostname=None, credentials=None, appliance=None):
         self._table_cache = {}
         if hostname is None:
-            self.hostname = store.current_appliance.db_address
+            appliance = appliance or store.current_appliance
+            self.hostname = appliance.db_address
         else:
             self.hostname = hostname
+        self.appliance = appliance
 
         self.credentials = credentials or conf.credentials['database']
 
@@ -186,6 +197,68 @@ class Db(Mapping):
         """
         return declarative_base(metadata=self.metadata)
 
+    @cached_property
+    def schema_version(self):
+        """Digest of all the migrations of the database schema, ``None`` if unknown
+
+        The schema of the database only changes with the migrations, so it is what the schema
+        cache is keyed by. The newest migration alone doesn't tell apart schemas that got an older
+        migration backported, hence the number of migrations is part of the digest too.
+        """
+        try:
+            count, newest = self.engine.execute(
+                'SELECT count(*), max(version) FROM schema_migrations').first()
+        except SQLAlchemyError as e:
+            logger.warning('[DB] Unable to read the schema version, not caching it: %s', e)
+            return None
+        if newest is None:
+            return None
+        return '{}_{}'.format(newest, count)
+
+    @cached_property
+    def appliance_version(self):
+        """Version of the appliance the database belongs to, ``None`` if unknown"""
+        if self.appliance is None:
+            return None
+        try:
+            return str(self.appliance.version)
+        except Exception as e:
+            logger.warning('[DB] Unable to read the appliance version: %s', e)
+            return None
+
+    @cached_property
+    def schema_cache_path(self):
+        """File the reflected schema is cached in, ``None`` when it can't be cached"""
+        if self.schema_version is None:
+            return None
+        return log_path.join('db_schema_cache', 'vmdb_{}_{}_sqlalchemy_{}.pickle'.format(
+            self.appliance_version or 'unknown', self.schema_version,
+            sqlalchemy.__version__)).strpath
+
+    @cached_property
+    def _cached_schema(self):
+        """The schema stored in the schema cache by this or an earlier process"""
+        if self.schema_cache_path is None:
+            return {}
+        schema = read_pickle(self.schema_cache_path)
+        if schema is None:
+            return {}
+        logger.info('[DB] Using the schema cache %s', self.schema_cache_path)
+        return schema
+
+    def _save_schema(self):
+        """Stores the reflected tables and the table names in the schema cache"""
+        if self.schema_cache_path is None:
+            return
+        schema = {'metadata': self.metadata, 'table_names': self.__dict__.get(
+            'table_names', self._cached_schema.get('table_names'))}
+        try:
+            write_pickle(schema, self.schema_cache_path)
+        except Exception as e:
+            logger.warning('[DB] Could not write the schema cache %s: %s',
+                self.schema_cache_path, e)
+        self._cached_schema = schema
+
     @cached_property
     def metadata(self):
         """:py:class:`MetaData <sqlalchemy:sqlalchemy.schema.MetaData>` for this database
@@ -198,7 +271,11 @@ class Db(Mapping):
             use :py:meth:`reflect_table`.
 
         """
-        return MetaData(bind=self.engine)
+        metadata = self._cached_schema.get('metadata')
+        if metadata is None:
+            return MetaData(bind=self.engine)
+        metadata.bind = self.engine
+        return metadata
 
     @cached_property
     def db_url(self):
@@ -212,7 +289,12 @@ class Db(Mapping):
     def table_names(self):
         """A sorted list of table names available in this database."""
         # rails table names follow similar rules as pep8 identifiers; expose them as such
-        return sorted(inspect(self.engine).get_table_names())
+        table_names = self._cached_schema.get('table_names')
+        if table_names is None:
+            table_names = sorted(inspect(self.engine).get_table_names())
+            self.__dict__['table_names'] = table_names
+            self._save_schema()
+        return table_names
 
     @cached_property
     def session(self):
@@ -259,6 +341,25 @@ class Db(Mapping):
 
         """
         self.metadata.reflect(only=[table_name])
+        self._save_schema()
+
+    def prefetch(self, *table_names):
+        """Reflects the tables that are not reflected yet, all of them at once
+
+        Every reflection lists the tables of the database first, so reflecting the tables a test
+        module needs in one go saves a round-trip per table. The tables are stored in the schema
+        cache afterwards.
+
+        Args:
+            table_names: Names of the tables to reflect
+
+        Raises:
+            :py:class:`sqlalchemy.exc.InvalidRequestError` when a table is not in the database
+        """
+        missing = [name for name in table_names if name not in self.metadata.tables]
+        if missing:
+            self.metadata.reflect(only=missing)
+            self._save_schema()
 
     def _table(self, table_name):
         """Retrieves, reflects, and caches table objects
@@ -268,7 +369,8 @@ class Db(Mapping):
         try:
             return self._table_cache[table_name]
         except KeyError:
-            self.reflect_table(table_name)
+            if table_name not in self.metadata.tables:
+                self.reflect_table(table_name)
             table = self.metadata.tables[table_name]
             table_dict = {
                 '__table__': table,
@@ -20,6 +20,7 @@ def get_configuration_details(db=None, ip_address=None):
         db = Db(hostname=ip_address)
 
     SEQ_FACT = 1e12
+    db.prefetch('miq_servers', 'miq_regions')
     miq_servers = db['miq_servers']
     for region in db.session.query(db['miq_regions']):
         reg_min = region.region * SEQ_FACT
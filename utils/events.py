@@ -4,9 +4,15 @@
 
 """
 
+import select
 from cached_property import cached_property
 from contextlib import contextmanager
 from datetime import datetime
+from time import sleep
+
+from sqlalchemy import func
+
+from utils.log import logger
 
 
 class EventTool(object):
@@ -105,16 +111,34 @@ class EventTool(object):
             query = query.filter(self.event_streams.timestamp <= until)
         if from_id is not None:
             query = query.filter(self.event_streams.id > from_id)
-        results = []
-        for event in query:
-            results.append({
-                'id': event.id,
-                'timestamp': event.timestamp,
-                'message': event.message,
-                'target_type': event.target_type,
-                'target_id': event.target_id,
-                'event_type': event.event_type})
-        return results
+        return [self._event_dict(event) for event in query]
+
+    @staticmethod
+    def _event_dict(event):
+        return {
+            'id': event.id,
+            'timestamp': event.timestamp,
+            'message': event.message,
+            'target_type': event.target_type,
+            'target_id': event.target_id,
+            'event_type': event.event_type}
+
+    def last_event_id(self):
+        """Returns the id of the newest row in ``event_streams``, ``0`` if there is none.
+
+        The maximum is computed by the database, so nothing but the number is transferred.
+        """
+        return self.query(func.max(self.event_streams.id)).scalar() or 0
+
+    def new_miq_events(self, from_id):
+        """Returns the MiqEvents with an id greater than ``from_id``, ordered by their id."""
+        query = self.query(self.event_streams).filter(
+            self.event_streams.type == 'MiqEvent', self.event_streams.id > from_id)
+        return [self._event_dict(event) for event in query.order_by(self.event_streams.id)]
+
+    def watcher(self, listen=False):
+        """Returns an :py:class:`EventWatcher` of the events coming from now on."""
+        return EventWatcher(self, listen=listen)
 
     @contextmanager
     def ensure_event_happens(self, target_type, target_id, event_type):
@@ -135,3 +159,196 @@ class EventTool(object):
         if len(events) == 0:
             raise AssertionError(
                 'Event {}/{}/{} did not happen.'.format(event_type, target_type, target_id))
+
+
+class EventWatcher(object):
+    """Follows the MiqEvents of an appliance as they come.
+
+    The watcher remembers the id of the last event it has seen. Every :py:meth:`poll` fetches the
+    newer events in one query and matches them against the expectations added with
+    :py:meth:`expect`, which are indexed by ``(target_type, target_id, event_type)``. The ids of
+    events inserted by different workers don't have to commit in order, so every query also
+    reads the last ``overlap`` ids again and drops the events it has already seen.
+
+    With ``listen``, a trigger on ``event_streams`` notifies the watcher of new events through
+    Postgres ``LISTEN/NOTIFY`` and :py:meth:`wait` returns as soon as one is inserted. The
+    trigger is dropped again by :py:meth:`close`. If it can't be created, :py:meth:`wait` just
+    sleeps.
+
+    Args:
+        event_tool: :py:class:`EventTool` of the appliance
+        from_id: Id of the last event to ignore, the newest event by default
+        listen: Whether to wake up :py:meth:`wait` on new events
+    """
+    NOTIFY_CHANNEL = 'cfme_tests_event_streams'
+    NOTIFY_TRIGGER = """
+        CREATE OR REPLACE FUNCTION cfme_tests_notify_event() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{channel}', NEW.id::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS cfme_tests_notify_event ON event_streams;
+        CREATE TRIGGER cfme_tests_notify_event AFTER INSERT ON event_streams
+            FOR EACH ROW EXECUTE PROCEDURE cfme_tests_notify_event();
+        LISTEN {channel};
+    """.format(channel=NOTIFY_CHANNEL)
+    DROP_TRIGGER = """
+        DROP TRIGGER IF EXISTS cfme_tests_notify_event ON event_streams;
+        DROP FUNCTION IF EXISTS cfme_tests_notify_event();
+    """
+    # Number of ids below the cursor read again, for the events committed out of order
+    overlap = 100
+
+    def __init__(self, event_tool, from_id=None, listen=False):
+        self.event_tool = event_tool
+        self.cursor = event_tool.last_event_id() if from_id is None else from_id
+        # The events up to here are ignored, even those read again in the overlap
+        self._baseline = self.cursor
+        #: All the events received since the cursor was last reset
+        self.events = []
+        self._expectations = {}
+        self._unresolved = []
+        # Ids of the received events in the overlap, and of the matched events
+        self._seen = set()
+        self._matched = set()
+        self._connection = None
+        if listen:
+            self._listen()
+
+    def reset(self):
+        """Ignores all events up to now and forgets the expectations."""
+        self.cursor = self._baseline = self.event_tool.last_event_id()
+        self.events = []
+        self._expectations = {}
+        self._unresolved = []
+        self._seen = set()
+        self._matched = set()
+
+    def expect(self, expectation):
+        """Adds an expectation to be matched by the incoming events.
+
+        Args:
+            expectation: Any object with ``target_type``, ``target_id`` (an id or a name, see
+                :py:meth:`EventTool.process_id`), ``event_type`` and ``time``, the UTC time since
+                when the event is expected
+        """
+        self._unresolved.append(expectation)
+
+    def _resolve(self):
+        """Indexes the expectations whose target can be found in the database by now.
+
+        Returns:
+            A :py:class:`set` of the keys of the newly indexed expectations.
+        """
+        unresolved = []
+        keys = set()
+        for expectation in self._unresolved:
+            try:
+                target_id = self.event_tool.process_id(
+                    expectation.target_type, expectation.target_id)
+            except ValueError:
+                # An object name not present in the database yet, the events received in the
+                # meantime are matched once it is
+                unresolved.append(expectation)
+                continue
+            key = (expectation.target_type, target_id, expectation.event_type)
+            self._expectations.setdefault(key, []).append(expectation)
+            keys.add(key)
+        self._unresolved = unresolved
+        return keys
+
+    @staticmethod
+    def _key(event):
+        return (event['target_type'], event['target_id'], event['event_type'])
+
+    def _match(self, events):
+        matches = []
+        for event in events:
+            if event['id'] in self._matched:
+                continue
+            waiting = self._expectations.get(self._key(event))
+            if not waiting:
+                continue
+            for expectation in waiting:
+                if event['timestamp'] is None or expectation.time <= event['timestamp']:
+                    waiting.remove(expectation)
+                    self._matched.add(event['id'])
+                    matches.append((expectation, event))
+                    break
+        return matches
+
+    def poll(self):
+        """Fetches the events that came since the last poll and matches them.
+
+        Each event matches at most one expectation, the first added one of the same target and
+        type that was expected before the event came. The expectations indexed by this poll are
+        matched against the events received before, too.
+
+        Returns:
+            A :py:class:`list` of ``(expectation, event)`` pairs matched by this poll.
+        """
+        keys = self._resolve()
+        matches = []
+        if keys:
+            matches.extend(self._match(
+                event for event in self.events if self._key(event) in keys))
+        events = [
+            event for event in self.event_tool.new_miq_events(
+                max(self.cursor - self.overlap, self._baseline))
+            if event['id'] not in self._seen]
+        if not events:
+            return matches
+        self.cursor = max(self.cursor, events[-1]['id'])
+        self._seen.update(event['id'] for event in events)
+        self._seen = set(id for id in self._seen if id > self.cursor - self.overlap)
+        self.events.extend(events)
+        matches.extend(self._match(events))
+        return matches
+
+    def _listen(self):
+        connection = None
+        try:
+            connection = self.event_tool.appliance.db.engine.raw_connection()
+            # Taken out of the pool of the appliance db for good: it is switched to autocommit
+            # and keeps listening, so no session may get it back, and closing it really closes it
+            connection.detach()
+            # psycopg2 autocommit, so the notifications are delivered right away
+            connection.connection.set_isolation_level(0)
+            cursor = connection.cursor()
+            cursor.execute(self.NOTIFY_TRIGGER)
+            cursor.close()
+        except Exception as e:
+            logger.warning('Could not listen to the new events, polling them: %s', e)
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            return
+        self._connection = connection
+
+    def wait(self, timeout):
+        """Sleeps for ``timeout`` seconds, or until a new event is inserted when listening."""
+        if self._connection is None:
+            sleep(timeout)
+            return
+        dbapi_connection = self._connection.connection
+        if select.select([dbapi_connection], [], [], timeout)[0]:
+            dbapi_connection.poll()
+            del dbapi_connection.notifies[:]
+
+    def close(self):
+        """Stops listening to the new events, drops the trigger from the appliance and closes the
+        listening connection."""
+        if self._connection is not None:
+            try:
+                cursor = self._connection.cursor()
+                cursor.execute(self.DROP_TRIGGER)
+                cursor.close()
+            except Exception as e:
+                logger.warning('Could not drop the event notification trigger: %s', e)
+            try:
+                self._connection.close()
+            finally:
+                self._connection = None
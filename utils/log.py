@@ -133,11 +133,12 @@ Members
 import inspect
 import logging
 import sys
+import threading
 import warnings
+from collections import deque
 from time import time
 from traceback import extract_tb, format_tb
 
-from cached_property import cached_property
 from utils import conf, safe_string
 from utils.path import get_rel_path, log_path, project_path
 
@@ -430,23 +431,137 @@ def nth_frame_info(n):
 
 
 class ArtifactorHandler(logging.Handler):
-    """Logger handler that hands messages off to the artifactor"""
-    @cached_property
-    def artifactor(self):
-        from fixtures.artifactor_plugin import art_client
-        return art_client
+    """Logger handler that hands messages off to the artifactor
 
-    @cached_property
-    def slaveid(self):
-        from fixtures.artifactor_plugin import SLAVEID
-        return SLAVEID or ""
+    Records are reduced to compact tuples (see :py:meth:`compact`) and buffered, a background
+    thread then sends them to the artifactor ``log_message`` hook in batches of up to
+    ``batch_size``, at least every ``interval`` seconds. Nothing is buffered until :py:meth:`start`
+    is called. When ``capacity`` records are waiting to be sent, new records are dropped and
+    counted in ``dropped``, so are the batches the artifactor fails to take.
+
+    Call :py:meth:`flush` to wait until the records logged so far reached the artifactor.
+    """
+    def __init__(self, capacity=10000, batch_size=500, interval=0.5, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self.slaveid = ""
+        self._address = None
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        # Running totals of records buffered and sent, so flush knows which ones to wait for
+        self._queued = 0
+        self._sent = 0
+        self._flush_to = 0
+
+    @staticmethod
+    def compact(record):
+        """Reduce a record to the tuple the artifactor log_message hook receives"""
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return (record.name, record.levelno, record.pathname, record.lineno, record.getMessage(),
+            record.exc_text, record.created)
+
+    @staticmethod
+    def expand(entry):
+        """Rebuild a :py:class:`logging.LogRecord` from a :py:meth:`compact` tuple"""
+        name, levelno, pathname, lineno, message, exc_text, created = entry
+        return logging.makeLogRecord({
+            'name': name, 'levelno': levelno, 'levelname': logging.getLevelName(levelno),
+            'pathname': pathname, 'lineno': lineno, 'msg': message, 'args': (),
+            'exc_text': exc_text, 'created': created, 'msecs': (created - int(created)) * 1000})
+
+    def start(self, address, port, slaveid=None):
+        """Start sending records to the artifactor listening on ``address``:``port``"""
+        with self._cond:
+            self._address = address, port
+            self.slaveid = slaveid or ""
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='artifactor_log_handler')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _connect(self):
+        # riggerlib clients keep their socket per thread, this thread needs its own
+        from artifactor import ArtifactorClient
+        client = ArtifactorClient(*self._address)
+        client.ready = True
+        return client
 
     def emit(self, record):
-        self.artifactor.fire_hook('log_message', log_record=record.__dict__, slaveid=self.slaveid)
+        if self._thread is None or self._closed:
+            return
+        try:
+            entry = self.compact(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._cond:
+            if len(self._buffer) >= self.capacity:
+                self.dropped += 1
+                return
+            self._buffer.append(entry)
+            self._queued += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _next_batch(self):
+        with self._cond:
+            deadline = time() + self.interval
+            while (len(self._buffer) < self.batch_size and self._flush_to <= self._sent and
+                    not self._closed):
+                remaining = deadline - time()
+                if remaining <= 0 and self._buffer:
+                    break
+                self._cond.wait(remaining if remaining > 0 else self.interval)
+            return [self._buffer.popleft()
+                for _ in range(min(self.batch_size, len(self._buffer)))]
+
+    def _run(self):
+        client = None
+        while True:
+            batch = self._next_batch()
+            if batch:
+                try:
+                    if client is None:
+                        client = self._connect()
+                    client.fire_hook('log_message', log_records=batch, slaveid=self.slaveid)
+                except Exception:
+                    # Lose the batch rather than the thread, connect again for the next one
+                    client = None
+                    with self._cond:
+                        self.dropped += len(batch)
+            with self._cond:
+                self._sent += len(batch)
+                self._cond.notify_all()
+                if self._closed and not self._buffer:
+                    return
+
+    def flush(self):
+        """Wait until every record logged so far has been sent"""
+        with self._cond:
+            self._flush_to = target = self._queued
+            self._cond.notify_all()
+            while self._sent < target and self._thread is not None and self._thread.is_alive():
+                self._cond.wait(self.interval)
+
+    def close(self):
+        """Send the buffered records and stop the background thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        logging.Handler.close(self)
 
 
 logger = setup_logger(logging.getLogger('cfme'))
-logger.addHandler(ArtifactorHandler())
+artifactor_handler = ArtifactorHandler()
+logger.addHandler(artifactor_handler)
 
 add_prefix = PrefixAddingLoggerFilter()
 logger.addFilter(add_prefix)
@@ -1,9 +1,113 @@
 import re
+import weakref
+from urlparse import urlparse
+
 import pytest
 
+from fixtures.pytest_store import store
 from ssh import SSHTail
+from utils import ports
 from utils.log import logger
 
+# Patterns using backreferences can't be merged into one regex, their group numbers would shift
+_backreference = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class LogWatch(object):
+    """Shared tail of one remote log file
+
+    Every :py:class:`LogValidator` watching the same file on the same appliance subscribes to the
+    same :py:class:`LogWatch`, so the file is tailed over a single SFTP session no matter how many
+    validators are stacked on it. New lines are read once and handed to every subscriber.
+
+    The patterns of all subscribers are also compiled into one combined regex, matched once per
+    line; lines that match none of the patterns never reach the subscribers.
+
+    Use :py:meth:`get` rather than instantiating this class. Once all the validators of a started
+    watch are gone, the watch is closed and dropped the next time a watch is looked up or
+    subscribed to.
+    """
+    _watches = {}
+
+    def __init__(self, remote_filename, key=None, **connect_kwargs):
+        self._remote_file_tail = SSHTail(remote_filename, **connect_kwargs)
+        self._key = key
+        self._subscribers = weakref.WeakKeyDictionary()
+        self._prefilter = None
+        self._started = False
+        self.closed = False
+
+    @classmethod
+    def get(cls, remote_filename, **connect_kwargs):
+        """Return the shared watch of ``remote_filename`` on the appliance ``connect_kwargs``
+        point to, defaulting to the current appliance like :py:class:`utils.ssh.SSHClient`"""
+        cls.prune()
+        hostname = connect_kwargs.get('hostname') or urlparse(store.base_url).hostname
+        key = (hostname, connect_kwargs.get('port', ports.SSH), remote_filename)
+        if key not in cls._watches:
+            cls._watches[key] = cls(remote_filename, key=key, **connect_kwargs)
+        return cls._watches[key]
+
+    @classmethod
+    def prune(cls):
+        """Close the started watches nobody subscribes to anymore"""
+        for watch in cls._watches.values():
+            if watch._started and not watch._subscribers:
+                watch.close()
+
+    def close(self):
+        """Close the tail of the file and forget the watch"""
+        if self._watches.get(self._key) is self:
+            del self._watches[self._key]
+        self._subscribers.clear()
+        self.closed = True
+        try:
+            self._remote_file_tail.close()
+        except Exception as e:
+            logger.warning('Could not close the tail of %s: %s', self._key, e)
+
+    def subscribe(self, validator):
+        """Start handing lines written from now on to ``validator``"""
+        if self._started:
+            # lines written so far belong to the subscribers that were already there, not to
+            # a validator subscribing again
+            self._subscribers.pop(validator, None)
+            self._compile()
+            self.poll()
+        else:
+            self._remote_file_tail.set_initial_file_end()
+            self._started = True
+        self._subscribers[validator] = True
+        self._compile()
+
+    def unsubscribe(self, validator):
+        self._subscribers.pop(validator, None)
+        if not self._subscribers:
+            self.close()
+            return
+        self._compile()
+
+    def _compile(self):
+        patterns = [pattern for validator in self._subscribers.keys()
+            for pattern in validator.patterns]
+        if not patterns or any(_backreference.search(pattern) for pattern in patterns):
+            self._prefilter = None
+            return
+        try:
+            self._prefilter = re.compile('|'.join('(?:{})'.format(p) for p in patterns))
+        except re.error:
+            self._prefilter = None
+
+    def poll(self):
+        """Read the lines appended to the file since the last poll and dispatch them"""
+        subscribers = self._subscribers.keys()
+        prefilter = self._prefilter
+        for line in self._remote_file_tail:
+            if prefilter is not None and not prefilter.match(line):
+                continue
+            for validator in subscribers:
+                validator.check_line(line)
+
 
 class LogValidator(object):
     """
@@ -22,11 +126,14 @@ class LogValidator(object):
     to be possible to skip particular ERROR log,
     but fail for wider range of other ERRORs.
 
+    Validators of the same file share one :py:class:`LogWatch`, so the file is only read once.
+
     Args:
         remote_filename: path to the remote log file
         skip_patterns: array of skip regex patterns
         failure_patterns: array of failure regex patterns
         matched_patterns: array of expected regex patterns to be matched
+        **connect_kwargs: passed to :py:class:`utils.ssh.SSHTail`, current appliance by default
 
     Usage:
         .. code-block:: python
@@ -39,43 +146,64 @@ class LogValidator(object):
     """
 
     def __init__(self, remote_filename, **kwargs):
-        self._remote_file_tail = SSHTail(remote_filename)
-        self.skip_patterns = kwargs['skip_patterns'] if 'skip_patterns' in kwargs else []
-        self.failure_patterns = kwargs['failure_patterns'] if 'failure_patterns' in kwargs else []
-        self.matched_patterns = kwargs['matched_patterns'] if 'matched_patterns' in kwargs else []
+        self.skip_patterns = kwargs.pop('skip_patterns', [])
+        self.failure_patterns = kwargs.pop('failure_patterns', [])
+        self.matched_patterns = kwargs.pop('matched_patterns', [])
+        self._watch_args = remote_filename, kwargs
+        self._watch = LogWatch.get(remote_filename, **kwargs)
+        self._skip = [(pattern, re.compile(pattern)) for pattern in self.skip_patterns]
+        self._failure = [(pattern, re.compile(pattern)) for pattern in self.failure_patterns]
+        self._matched = [(pattern, re.compile(pattern)) for pattern in self.matched_patterns]
         self.matches = {}
+        self.failures = []
+
+    @property
+    def patterns(self):
+        return self.skip_patterns + self.failure_patterns + self.matched_patterns
 
     def fix_before_start(self):
-        self._remote_file_tail.set_initial_file_end()
+        LogWatch.prune()
+        if self._watch.closed:
+            remote_filename, kwargs = self._watch_args
+            self._watch = LogWatch.get(remote_filename, **kwargs)
+        self._watch.subscribe(self)
+        self.matches = {}
+        self.failures = []
 
     def validate_logs(self):
-        for line in self._remote_file_tail:
-            if self._check_skip_logs(line):
-                continue
-            self._check_fail_logs(line)
-            self._check_match_logs(line)
+        self._watch.poll()
+        if self.failures:
+            pattern, line = self.failures[0]
+            pytest.fail('Failure pattern {} was matched on line {}'.format(pattern, line))
         self._verify_match_logs()
 
+    def check_line(self, line):
+        """Check one line of the log against the patterns, called by :py:class:`LogWatch`"""
+        if self._check_skip_logs(line):
+            return
+        self._check_fail_logs(line)
+        self._check_match_logs(line)
+
     def _check_skip_logs(self, line):
-        for pattern in self.skip_patterns:
-            if re.match(pattern, line):
+        for pattern, regex in self._skip:
+            if regex.match(line):
                 logger.info('Skip pattern {} was matched on line {},\
                             so skipping this line'.format(pattern, line))
                 return True
         return False
 
     def _check_fail_logs(self, line):
-        for pattern in self.failure_patterns:
-            if re.match(pattern, line):
-                pytest.fail('Failure pattern {} was matched on line {}'.format(pattern, line))
+        for pattern, regex in self._failure:
+            if regex.match(line):
+                self.failures.append((pattern, line))
 
     def _check_match_logs(self, line):
-        for pattern in self.matched_patterns:
-            if re.match(pattern, line):
+        for pattern, regex in self._matched:
+            if regex.match(line):
                 logger.info('Expected pattern {} was matched on line {}'.format(pattern, line))
                 self.matches[pattern] = True
 
     def _verify_match_logs(self):
         for pattern in self.matched_patterns:
-            if not self.matches[pattern]:
+            if not self.matches.get(pattern):
                 pytest.fail('Expected pattern {} did not match'.format(pattern))
@@ -11,18 +11,30 @@ import dateutil.parser as du_parser
 from datetime import timedelta
 from time import time
 import csv
+import hashlib
+import json
+import multiprocessing
 import numpy
 import os
 import pygal
 import subprocess
 import re
 
+# evm.log is read in blocks of this many bytes
+EVM_BLOCK_SIZE = 8 * 1024 * 1024
+# evm.log files larger than this are split and parsed by one process per core
+EVM_PARALLEL_THRESHOLD = 256 * 1024 * 1024
+# Missing timestamp in message columns
+NAT = numpy.datetime64('NaT', 'us')
+
 # Regular Expressions to capture relevant information from each log line:
 
 # [----] I, [2014-03-04T08:11:14.320377 #3450:b15814]  INFO -- : ....
 log_stamp = re.compile(r'\[----\]\s[IWE],\s\[([0-9\-]+)T([0-9\:\.]+)\s#([0-9]+):[0-9a-z]+\]')
 # [----] .* MIQ( * )
 miqmsg = re.compile(r'\[----\].*MIQ\(([a-zA-Z0-9\._]*)\)')
+# Both of the above in one go, for lines with a regular log stamp
+miqmsg_stamp = re.compile(log_stamp.pattern + r'.*MIQ\(([a-zA-Z0-9\._]*)\)')
 # Command: [ * ]
 miqmsg_cmd = re.compile(r'Command:\s\[([a-zA-Z0-9\._\:]*)\]')
 # Message id: [ * ]
@@ -35,6 +47,10 @@ miqmsg_deq = re.compile(r'Dequeued\sin:\s\[([0-9\.]*)\]\sseconds')
 # Delivered in [ * ] seconds
 miqmsg_del = re.compile(r'Delivered\sin\s\[([0-9\.]*)\]\sseconds')
 
+# Any line the worker parsing cares about
+miqwkr_line = re.compile(r'Interrupt|MIQ\([A-Za-z]*\)\sID|"evm_worker_uptime_exceeded|'
+    r'"evm_worker_memory_exceeded|"evm_worker_stop|Worker\sexiting.')
+
 # Worker related regular expressions:
 # MIQ(PriorityWorker) ID [15], PID [6461]
 miqwkr = re.compile(r'MIQ\(([A-Za-z]*)\)\sID\s\[([0-9]*)\],\sPID\s\[([0-9]*)\]')
@@ -59,182 +75,299 @@ miq_top = re.compile(r'([0-9]+)\s+[0-9]+\s+[A-Za-z0-9]+\s+[0-9]+\s+[0-9\-]+\s+([
     r'([0-9\.mg]+)\s+([0-9\.mg]+)\s+[SRDZ]\s+([0-9\.]+)\s+([0-9\.]+)')
 
 
-def evm_to_messages(evm_file, filters):
-    test_start = ''
-    test_end = ''
+def _datetimes_to_strings(times):
+    """Format datetime64 values the way they appear in evm.log, with '' for missing ones"""
+    return ['' if ts == 'NaT' else ts.replace('T', ' ')
+        for ts in numpy.datetime_as_string(times, unit='us').tolist()]
+
+
+def _hourly_stats(cmd_ids, times, values):
+    """Group message values by command and by the hour of their timestamps
+
+    Yields ``(cmd_id, date, hour, count, sum, min, max)`` for every group. Messages without a
+    timestamp are grouped under an empty date and hour.
+
+    ``min`` is the smallest non-zero value of the group, ``0`` only when all of its values are
+    zero. The buckets filled message by message before treated a zero minimum as unset, so a zero
+    made whichever value came next the minimum, e.g. ``5`` for ``3, 0, 5``; this gives ``3``.
+    """
+    if not len(cmd_ids):
+        return
+    hours = times.astype('M8[h]')
+    order = numpy.lexsort((hours.view('i8'), cmd_ids))
+    cmd_ids, hours, values = cmd_ids[order], hours[order], values[order]
+    starts = numpy.flatnonzero(numpy.r_[True,
+        (cmd_ids[1:] != cmd_ids[:-1]) | (hours.view('i8')[1:] != hours.view('i8')[:-1])])
+    counts = numpy.diff(numpy.r_[starts, len(values)])
+    sums = numpy.add.reduceat(values, starts)
+    maxs = numpy.maximum.reduceat(values, starts)
+    mins = numpy.minimum.reduceat(numpy.where(values == 0, numpy.inf, values), starts)
+    mins[numpy.isinf(mins)] = 0.0
+    dates = _datetimes_to_strings(hours[starts])
+    for cmd_id, date, count, total, low, high in zip(cmd_ids[starts].tolist(), dates,
+            counts.tolist(), sums.tolist(), mins.tolist(), maxs.tolist()):
+        yield cmd_id, date[:10], date[11:13], count, total, low, high
+
+
+def _iter_file_lines(file_name, start=0, end=None, block_size=EVM_BLOCK_SIZE):
+    """Yield lines of ``file_name`` between byte offsets ``start`` and ``end``, without newlines
+
+    The file is read in large blocks and split into lines locally.
+    """
+    with open(file_name, 'rb') as log_file:
+        log_file.seek(start)
+        remaining = None if end is None else end - start
+        tail = ''
+        while remaining is None or remaining > 0:
+            block = log_file.read(block_size if remaining is None else min(block_size, remaining))
+            if not block:
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            lines = (tail + block).split('\n')
+            tail = lines.pop()
+            for line in lines:
+                yield line
+        if tail:
+            yield tail
+
+
+def _split_at_lines(file_name, parts):
+    """Split ``file_name`` into at most ``parts`` (start, end) byte ranges on line boundaries"""
+    size = os.path.getsize(file_name)
+    offsets = [0]
+    with open(file_name, 'rb') as log_file:
+        for part in range(1, parts):
+            log_file.seek(size * part // parts)
+            # move on to the start of the next line
+            log_file.readline()
+            offsets.append(max(log_file.tell(), offsets[-1]))
+    offsets.append(size)
+    return [(start, end) for start, end in zip(offsets[:-1], offsets[1:]) if end > start]
+
+
+def _parse_evm_lines(lines):
+    """Turn evm.log lines into message and worker events, in log order
+
+    Lines are first checked for cheap substrings so only the few relevant ones get to the regular
+    expressions. Events are plain tuples starting with the event kind and line number, so they
+    can be sent back from worker processes and replayed in order by
+    :py:func:`evm_to_messages_and_workers`.
+
+    Returns:
+        A tuple of the number of lines, the timestamp of the first message line (``None`` if
+        there was none), the number of worker related lines, and the list of events
+    """
+    events = []
+    test_start = None
     line_count = 0
-    messages = {}
+    wkr_line_count = 0
+    for line_count, evm_log_line in enumerate(lines, 1):
+        if ('MIQ(' not in evm_log_line and 'Interrupt' not in evm_log_line and
+                'evm_worker_' not in evm_log_line and 'Worker exiting' not in evm_log_line):
+            continue
+        evm_log_line = evm_log_line.strip()
+
+        # Only MiqQueue lines matter once the first timestamp is known
+        if 'MIQ(' in evm_log_line and (test_start is None or 'MiqQueue.' in evm_log_line):
+            miqmsg_result = miqmsg_stamp.search(evm_log_line)
+            if miqmsg_result:
+                msg_kind = miqmsg_result.group(4)
+                ts = '{} {}'.format(miqmsg_result.group(1), miqmsg_result.group(2))
+                pid = miqmsg_result.group(3)
+            else:
+                miqmsg_result = miqmsg.search(evm_log_line)
+                if miqmsg_result:
+                    msg_kind = miqmsg_result.group(1)
+                    ts, pid = get_msg_timestamp_pid(evm_log_line)
+            if miqmsg_result:
+                if test_start is None:
+                    test_start = ts
+                if msg_kind == 'MiqQueue.put':
+                    events.append(('put', line_count, get_msg_id(evm_log_line), ts, pid,
+                        get_msg_cmd(evm_log_line), get_msg_args(evm_log_line)))
+                elif msg_kind == 'MiqQueue.get_via_drb':
+                    events.append(('get', line_count, get_msg_id(evm_log_line), ts, pid,
+                        get_msg_deq(evm_log_line)))
+                elif msg_kind == 'MiqQueue.delivered':
+                    events.append(('delivered', line_count, get_msg_id(evm_log_line), ts,
+                        get_msg_del(evm_log_line)))
+
+        if (('ID' in evm_log_line or 'Interrupt' in evm_log_line or
+                'evm_worker_' in evm_log_line or 'Worker exiting' in evm_log_line) and
+                miqwkr_line.search(evm_log_line)):
+            wkr_line_count += 1
+            ts, pid = get_msg_timestamp_pid(evm_log_line)
+            miqwkr_result = miqwkr.search(evm_log_line)
+            termination, id_regex = None, miqwkr_id
+            if miqwkr_result:
+                events.append(('worker', line_count, ts, miqwkr_result.group(1),
+                    int(miqwkr_result.group(2)), miqwkr_result.group(3)))
+            elif 'evm_worker_uptime_exceeded' in evm_log_line:
+                termination = 'evm_worker_uptime_exceeded'
+            elif 'evm_worker_memory_exceeded' in evm_log_line:
+                termination = 'evm_worker_memory_exceeded'
+            elif 'evm_worker_stop' in evm_log_line:
+                termination = 'evm_worker_stop'
+            elif 'Interrupt' in evm_log_line:
+                events.append(('interrupt', line_count, ts))
+            elif 'Worker exiting.' in evm_log_line:
+                # For use with workers exiting, such as authentication failures
+                termination, id_regex = 'Worker Exited', miqwkr_id_2
+            if termination:
+                miqwkr_id_result = id_regex.search(evm_log_line)
+                if miqwkr_id_result:
+                    events.append(('worker_end', line_count, ts, termination,
+                        int(miqwkr_id_result.group(1))))
+    return line_count, test_start, wkr_line_count, events
+
+
+def _parse_evm_chunk(chunk):
+    evm_file, start, end = chunk
+    return _parse_evm_lines(_iter_file_lines(evm_file, start, end))
+
+
+def _messages_to_cmds(messages, filters):
+    # Filtering over messages, we can better display what is occuring under the covers, as a
+    # daily rollup is picked up off the queue different than a hourly rollup, etc
+    messages.apply_filters(filters)
     msg_cmds = {}
+    for msg_cmd in messages.cmds:
+        msg_cmds[msg_cmd] = {'total': numpy.empty(0), 'queue': numpy.empty(0),
+            'execute': numpy.empty(0)}
+    rows = messages.sorted_rows()
+    for msg_cmd, cmd_rows in messages.by_cmd(rows[messages['total_time'][rows] != 0]):
+        msg_cmds[msg_cmd]['total'] = messages['total_time'][cmd_rows]
+        msg_cmds[msg_cmd]['queue'] = messages['deq_time'][cmd_rows]
+        msg_cmds[msg_cmd]['execute'] = messages['del_time'][cmd_rows]
+    return msg_cmds
+
+
+def evm_to_messages_and_workers(evm_file, filters, processes=None):
+    """Parse backend messages and workers out of an evm.log in a single pass
+
+    Large files are split on line boundaries and parsed by ``processes`` worker processes, one
+    chunk each; events found in every chunk are then replayed in log order.
+
+    Args:
+        evm_file: Path to the evm.log
+        filters: Dict of command suffixes to compiled regexes matched against message args
+        processes: Number of processes to parse with; defaults to the number of cores for files
+            larger than ``EVM_PARALLEL_THRESHOLD`` bytes, and 1 otherwise
+
+    Returns:
+        A tuple of ``(messages, msg_cmds, test_start, test_end, line_count)`` and
+        ``(workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_line_count)``
+    """
+    if processes is None:
+        if os.path.getsize(evm_file) > EVM_PARALLEL_THRESHOLD:
+            processes = multiprocessing.cpu_count()
+        else:
+            processes = 1
 
     runningtime = time()
-    evmlogfile = open(evm_file, 'r')
-    evm_log_line = evmlogfile.readline()
-    while evm_log_line:
-        line_count += 1
-        evm_log_line = evm_log_line.strip()
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            chunks = pool.map(_parse_evm_chunk,
+                [(evm_file, start, end) for start, end in _split_at_lines(evm_file, processes)])
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        chunks = [_parse_evm_lines(_iter_file_lines(evm_file))]
+    logger.info('Scanned evm log with %s processes in %s', processes, time() - runningtime)
 
-        miqmsg_result = miqmsg.search(evm_log_line)
-        if miqmsg_result:
+    test_start = ''
+    test_end = ''
+    line_count = 0
+    messages = MiqMsgTable()
+    workers = {}
+    wkr_line_count = 0
+    wkr_terminations = dict.fromkeys(['evm_worker_memory_exceeded', 'evm_worker_uptime_exceeded',
+        'evm_worker_stop', 'Interrupted', 'Worker Exited'], 0)
 
+    for chunk_line_count, chunk_start, chunk_wkr_line_count, events in chunks:
+        if test_start == '' and chunk_start is not None:
             # Obtains the first timestamp in the log file
-            if test_start == '':
-                ts, pid = get_msg_timestamp_pid(evm_log_line)
-                test_start = ts
+            test_start = chunk_start
+        for event in events:
+            event_kind, line_number = event[0], line_count + event[1]
 
             # A message was first put on the queue, this starts its queuing time
-            if (miqmsg_result.group(1) == 'MiqQueue.put'):
-
-                msg_cmd = get_msg_cmd(evm_log_line)
-                msg_id = get_msg_id(evm_log_line)
+            if event_kind == 'put':
+                msg_id, ts, pid, msg_cmd, msg_args = event[2:]
                 if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
                     test_end = ts
-                    messages[msg_id] = MiqMsgStat()
-                    messages[msg_id].msg_id = msg_id
-                    messages[msg_id].msg_id = '\'' + msg_id + '\''
-                    messages[msg_id].msg_cmd = msg_cmd
-                    messages[msg_id].pid_put = pid
-                    messages[msg_id].puttime = ts
-                    msg_args = get_msg_args(evm_log_line)
                     if msg_args is False:
-                        logger.debug('Could not obtain message args line #: %s', line_count)
-                    else:
-                        messages[msg_id].msg_args = msg_args
+                        logger.debug('Could not obtain message args line #: %s', line_number)
+                        msg_args = ''
+                    messages.put(msg_id, ts, pid, msg_cmd, msg_args)
                 else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
+                    logger.error('Could not obtain message id, line #: %s', line_number)
 
-            elif (miqmsg_result.group(1) == 'MiqQueue.get_via_drb'):
-                msg_id = get_msg_id(evm_log_line)
+            elif event_kind == 'get':
+                msg_id, ts, pid, deq_time = event[2:]
                 if msg_id:
                     if msg_id in messages:
-                        ts, pid = get_msg_timestamp_pid(evm_log_line)
                         test_end = ts
-                        messages[msg_id].pid_get = pid
-                        messages[msg_id].gettime = ts
-                        messages[msg_id].deq_time = get_msg_deq(evm_log_line)
+                        messages.get(msg_id, ts, pid, deq_time)
                     else:
                         logger.error('Message ID not in dictionary: %s', msg_id)
                 else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
+                    logger.error('Could not obtain message id, line #: %s', line_number)
 
-            elif (miqmsg_result.group(1) == 'MiqQueue.delivered'):
-                msg_id = get_msg_id(evm_log_line)
+            elif event_kind == 'delivered':
+                msg_id, ts, del_time = event[2:]
                 if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
                     test_end = ts
                     if msg_id in messages:
-                        messages[msg_id].del_time = get_msg_del(evm_log_line)
-                        messages[msg_id].total_time = messages[msg_id].deq_time + \
-                            messages[msg_id].del_time
+                        messages.delivered(msg_id, del_time)
                     else:
                         logger.error('Message ID not in dictionary: %s', msg_id)
                 else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
-
-        if (line_count % 100000) == 0:
-            timediff = time() - runningtime
-            runningtime = time()
-            logger.info('Count {} : Parsed 100000 lines in %s', line_count, timediff)
-
-        evm_log_line = evmlogfile.readline()
+                    logger.error('Could not obtain message id, line #: %s', line_number)
+
+            elif event_kind == 'worker':
+                ts, worker_type, workerid, pid = event[2:]
+                if workerid not in workers:
+                    workers[workerid] = MiqWorker()
+                    workers[workerid].worker_type = worker_type
+                    workers[workerid].pid = pid
+                    workers[workerid].worker_id = workerid
+                    workers[workerid].start_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+
+            elif event_kind == 'worker_end':
+                ts, termination, workerid = event[2:]
+                if workerid in workers and not workers[workerid].terminated:
+                    wkr_terminations[termination] += 1
+                    workers[workerid].terminated = termination
+                    workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
 
-    # I tried to avoid two loops but this reduced the complexity of filtering on messages.
-    # By filtering over messages, we can better display what is occuring under the covers, as a
-    # daily rollup is picked up off the queue different than a hourly rollup, etc
-    for msg in sorted(messages.keys()):
-        msg_args = messages[msg].msg_args
-        # Determine if the pattern matches and append to the command if it does
-        for p_filter in filters:
-            results = filters[p_filter].search(msg_args.strip())
-            if results:
-                messages[msg].msg_cmd = '{}{}'.format(messages[msg].msg_cmd, p_filter)
-                break
-        msg_cmd = messages[msg].msg_cmd
-        if msg_cmd not in msg_cmds:
-            msg_cmds[msg_cmd] = {}
-            msg_cmds[msg_cmd]['total'] = []
-            msg_cmds[msg_cmd]['queue'] = []
-            msg_cmds[msg_cmd]['execute'] = []
-        if messages[msg].total_time != 0:
-            msg_cmds[msg_cmd]['total'].append(round(messages[msg].total_time, 2))
-            msg_cmds[msg_cmd]['queue'].append(round(messages[msg].deq_time, 2))
-            msg_cmds[msg_cmd]['execute'].append(round(messages[msg].del_time, 2))
+            elif event_kind == 'interrupt':
+                ts = event[2]
+                for workerid in workers:
+                    if not workers[workerid].end_ts:
+                        wkr_terminations['Interrupted'] += 1
+                        workers[workerid].terminated = 'Interrupted'
+                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
 
-    return messages, msg_cmds, test_start, test_end, line_count
+        line_count += chunk_line_count
+        wkr_line_count += chunk_wkr_line_count
 
+    msg_cmds = _messages_to_cmds(messages, filters)
+    return ((messages, msg_cmds, test_start, test_end, line_count),
+        (workers, wkr_terminations['evm_worker_memory_exceeded'],
+            wkr_terminations['evm_worker_uptime_exceeded'], wkr_terminations['evm_worker_stop'],
+            wkr_terminations['Interrupted'], wkr_terminations['Worker Exited'], wkr_line_count))
 
-def evm_to_workers(evm_file):
-    # Use grep to reduce # of lines to sort through
-    p = subprocess.Popen(['grep', 'Interrupt\\|MIQ([A-Za-z]*) ID\\|"evm_worker_uptime_exceeded\\|'
-            '"evm_worker_memory_exceeded\\|"evm_worker_stop\\|Worker exiting.', evm_file],
-            stdout=subprocess.PIPE)
-    greppedevmlog, err = p.communicate()
-    greppedevmlog = greppedevmlog.strip()
 
-    evmlines = greppedevmlog.split('\n')
+def evm_to_messages(evm_file, filters):
+    return evm_to_messages_and_workers(evm_file, filters)[0]
 
-    workers = {}
-    wkr_upt_exc = 0
-    wkr_mem_exc = 0
-    wkr_stp = 0
-    wkr_int = 0
-    wkr_ext = 0
-    for evm_log_line in evmlines:
-        ts, pid = get_msg_timestamp_pid(evm_log_line)
-
-        miqwkr_result = miqwkr.search(evm_log_line)
-        if miqwkr_result:
-            workerid = int(miqwkr_result.group(2))
-            if workerid not in workers:
-                workers[workerid] = MiqWorker()
-                workers[workerid].worker_type = miqwkr_result.group(1)
-                workers[workerid].pid = miqwkr_result.group(3)
-                workers[workerid].worker_id = int(workerid)
-                workers[workerid].start_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_uptime_exceeded' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_upt_exc += 1
-                        workers[workerid].terminated = 'evm_worker_uptime_exceeded'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_memory_exceeded' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_mem_exc += 1
-                        workers[workerid].terminated = 'evm_worker_memory_exceeded'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_stop' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_stp += 1
-                        workers[workerid].terminated = 'evm_worker_stop'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'Interrupt' in evm_log_line:
-            for workerid in workers:
-                if not workers[workerid].end_ts:
-                    wkr_int += 1
-                    workers[workerid].terminated = 'Interrupted'
-                    workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'Worker exiting.' in evm_log_line:
-            miqwkr_id_2_result = miqwkr_id_2.search(evm_log_line)
-            if miqwkr_id_2_result:
-                workerid = int(miqwkr_id_2_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_ext += 1
-                        workers[workerid].terminated = 'Worker Exited'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
 
-    return workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, len(evmlines)
+def evm_to_workers(evm_file):
+    return evm_to_messages_and_workers(evm_file, {})[1]
 
 
 def split_appliance_charts(top_appliance, charts_dir):
@@ -365,9 +498,9 @@ def generate_total_time_charts(msg_cmds, charts_dir):
     for cmd in sorted(msg_cmds):
         logger.info('Generating Total Time Chart for %s', cmd)
         lines = {}
-        lines['Total Time'] = msg_cmds[cmd]['total']
-        lines['Queue'] = msg_cmds[cmd]['queue']
-        lines['Execute'] = msg_cmds[cmd]['execute']
+        lines['Total Time'] = [round(t, 2) for t in msg_cmds[cmd]['total'].tolist()]
+        lines['Queue'] = [round(t, 2) for t in msg_cmds[cmd]['queue'].tolist()]
+        lines['Execute'] = [round(t, 2) for t in msg_cmds[cmd]['execute'].tolist()]
         line_chart_render(cmd + ' Total Time', 'Message #', 'Time (s)', [], lines,
             charts_dir.join('/{}-total.svg'.format(cmd)))
 
@@ -481,73 +614,44 @@ def line_chart_render(title, xtitle, ytitle, x_labels, lines, fname, stacked=Fal
 def messages_to_hourly_buckets(messages, test_start, test_end):
     hr_bkt = {}
     # Hour buckets look like: hr_bkt[msg_cmd][msg_date][msg_hour] = MiqMsgBucket()
-    for msg in messages:
-        # put on queue, deals with queuing:
-        msg_cmd = messages[msg].msg_cmd
-        putdate = messages[msg].puttime[:10]
-        puthour = messages[msg].puttime[11:13]
-        if msg_cmd not in hr_bkt:
-            hr_bkt[msg_cmd] = provision_hour_buckets(test_start, test_end)
-
-        hr_bkt[msg_cmd][putdate][puthour].total_put += 1
-        hr_bkt[msg_cmd][putdate][puthour].sum_deq += messages[msg].deq_time
-        if (hr_bkt[msg_cmd][putdate][puthour].min_deq == 0 or
-                hr_bkt[msg_cmd][putdate][puthour].min_deq > messages[msg].deq_time):
-            hr_bkt[msg_cmd][putdate][puthour].min_deq = messages[msg].deq_time
-        if (hr_bkt[msg_cmd][putdate][puthour].max_deq == 0 or
-                hr_bkt[msg_cmd][putdate][puthour].max_deq < messages[msg].deq_time):
-            hr_bkt[msg_cmd][putdate][puthour].max_deq = messages[msg].deq_time
-        hr_bkt[msg_cmd][putdate][puthour].avg_deq = \
-            hr_bkt[msg_cmd][putdate][puthour].sum_deq / hr_bkt[msg_cmd][putdate][puthour].total_put
-
-        # Get time is when the message is delivered
-        getdate = messages[msg].gettime[:10]
-        gethour = messages[msg].gettime[11:13]
-
-        hr_bkt[msg_cmd][getdate][gethour].total_get += 1
-        hr_bkt[msg_cmd][getdate][gethour].sum_del += messages[msg].del_time
-        if (hr_bkt[msg_cmd][getdate][gethour].min_del == 0 or
-                hr_bkt[msg_cmd][getdate][gethour].min_del > messages[msg].del_time):
-            hr_bkt[msg_cmd][getdate][gethour].min_del = messages[msg].del_time
-        if (hr_bkt[msg_cmd][getdate][gethour].max_del == 0 or
-                hr_bkt[msg_cmd][getdate][gethour].max_del < messages[msg].del_time):
-            hr_bkt[msg_cmd][getdate][gethour].max_del = messages[msg].del_time
-
-        hr_bkt[msg_cmd][getdate][gethour].avg_del = \
-            hr_bkt[msg_cmd][getdate][gethour].sum_del / hr_bkt[msg_cmd][getdate][gethour].total_get
+    for msg_cmd in messages.cmds:
+        hr_bkt[msg_cmd] = provision_hour_buckets(test_start, test_end)
+
+    # put on queue, deals with queuing:
+    for cmd_id, putdate, puthour, count, total, low, high in _hourly_stats(
+            messages['cmd'], messages['puttime'], messages['deq_time']):
+        bucket = hr_bkt[messages.cmds[cmd_id]][putdate][puthour]
+        bucket.total_put = count
+        bucket.sum_deq = total
+        bucket.min_deq = low
+        bucket.max_deq = high
+        bucket.avg_deq = total / count
+
+    # Get time is when the message is delivered
+    for cmd_id, getdate, gethour, count, total, low, high in _hourly_stats(
+            messages['cmd'], messages['gettime'], messages['del_time']):
+        bucket = hr_bkt[messages.cmds[cmd_id]][getdate][gethour]
+        bucket.total_get = count
+        bucket.sum_del = total
+        bucket.min_del = low
+        bucket.max_del = high
+        bucket.avg_del = total / count
     return hr_bkt
 
 
-def messages_to_statistics_csv(messages, statistics_file_name):
-    all_statistics = []
-    for msg_id in messages:
-        msg = messages[msg_id]
-
-        added = False
-        if len(all_statistics) > 0:
-            for msg_statistics in all_statistics:
-                if msg_statistics.cmd == msg.msg_cmd:
-
-                    if msg.del_time > 0:
-                        msg_statistics.delivertimes.append(float(msg.del_time))
-                        msg_statistics.gets += 1
-                    msg_statistics.dequeuetimes.append(float(msg.deq_time))
-                    msg_statistics.totaltimes.append(float(msg.total_time))
-                    msg_statistics.puts += 1
-                    added = True
-                    break
+def messages_to_raw_data_csv(messages, csv_file_name):
+    csv_rawdata_path = log_path.join('csv_output', csv_file_name)
+    output_file = csv_rawdata_path.open('w', ensure=True)
+    try:
+        csvwriter = csv.DictWriter(output_file, fieldnames=messages.headers, delimiter=',',
+            quotechar='\'', quoting=csv.QUOTE_MINIMAL)
+        csvwriter.writeheader()
+        csvwriter.writerows(messages.iter_rows())
+    finally:
+        output_file.close()
 
-        if not added:
-            msg_statistics = MiqMsgLists()
-            msg_statistics.cmd = msg.msg_cmd
-            if msg.del_time > 0:
-                msg_statistics.delivertimes.append(float(msg.del_time))
-                msg_statistics.gets = 1
-            msg_statistics.dequeuetimes.append(float(msg.deq_time))
-            msg_statistics.totaltimes.append(float(msg.total_time))
-            msg_statistics.puts = 1
-            all_statistics.append(msg_statistics)
 
+def messages_to_statistics_csv(messages, statistics_file_name):
     csvdata_path = log_path.join('csv_output', statistics_file_name)
     outputfile = csvdata_path.open('w', ensure=True)
 
@@ -563,18 +667,22 @@ def messages_to_statistics_csv(messages, statistics_file_name):
         csvfile.writerow(headers)
 
         # Contents of CSV
-        for msg_statistics in sorted(all_statistics, key=lambda x: x.cmd):
-            if msg_statistics.gets > 1:
+        for msg_cmd, rows in messages.by_cmd():
+            dequeuetimes = messages['deq_time'][rows]
+            delivertimes = messages['del_time'][rows]
+            delivertimes = delivertimes[delivertimes > 0]
+            totaltimes = messages['total_time'][rows]
+            if len(delivertimes) > 1:
                 logger.debug('Samples/Avg/90th/Std: %s: %s : %s : %s,Cmd: %s',
-                    str(len(msg_statistics.totaltimes)).rjust(7),
-                    str(round(numpy.average(msg_statistics.totaltimes), 3)).rjust(7),
-                    str(round(numpy.percentile(msg_statistics.totaltimes, 90), 3)).rjust(7),
-                    str(round(numpy.std(msg_statistics.totaltimes), 3)).rjust(7),
-                    msg_statistics.cmd)
-            stats = [msg_statistics.cmd, msg_statistics.puts, msg_statistics.gets]
-            stats.extend(generate_statistics(msg_statistics.dequeuetimes, 3))
-            stats.extend(generate_statistics(msg_statistics.delivertimes, 3))
-            stats.extend(generate_statistics(msg_statistics.totaltimes, 3))
+                    str(len(totaltimes)).rjust(7),
+                    str(round(numpy.average(totaltimes), 3)).rjust(7),
+                    str(round(numpy.percentile(totaltimes, 90), 3)).rjust(7),
+                    str(round(numpy.std(totaltimes), 3)).rjust(7),
+                    msg_cmd)
+            stats = [msg_cmd, len(rows), len(delivertimes)]
+            stats.extend(generate_statistics(dequeuetimes, 3))
+            stats.extend(generate_statistics(delivertimes, 3))
+            stats.extend(generate_statistics(totaltimes, 3))
             csvfile.writerow(stats)
     finally:
         outputfile.close()
@@ -614,185 +722,15 @@ def provision_hour_buckets(test_start, test_end, init=True):
 
 
 def top_to_appliance(top_file):
-    # Find first miqtop log line
-    miqtop_time, timezone_offset = get_first_miqtop(top_file)
-
-    runningtime = time()
-    grep_pattern = '^top\s\-\s\\|^miqtop\:\\|^Cpu(s)\:\\|^Mem\:\\|^Swap\:'
-    # Use grep to reduce # of lines to sort through
-    p = subprocess.Popen(['grep', grep_pattern, top_file], stdout=subprocess.PIPE)
-    greppedtop, err = p.communicate()
-    timediff = time() - runningtime
-    logger.info('Grepped top_output for CPU/Mem/Swap & time data in %s', timediff)
-
-    top_lines = greppedtop.strip().split('\n')
-    line_count = 0
-
-    top_keys = ['datetimes', 'cpuus', 'cpusy', 'cpuni', 'cpuid', 'cpuwa', 'cpuhi', 'cpusi', 'cpust',
-        'memtot', 'memuse', 'memfre', 'buffer', 'swatot', 'swause', 'swafre', 'cached']
-    top_app = dict((key, []) for key in top_keys)
-
-    cur_time = None
-    miqtop_ahead = True
-    runningtime = time()
-    for top_line in top_lines:
-        line_count += 1
-        if 'top - ' in top_line:
-            # top - 11:00:43
-            cur_hour = int(top_line[6:8])
-            cur_min = int(top_line[9:11])
-            cur_sec = int(top_line[12:14])
-            if miqtop_ahead:
-                # Have not found miqtop date/time yet so we must rely on miqtop date/time "ahead"
-                if cur_hour <= miqtop_time.hour:
-                    cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-                else:
-                    # miqtop_time is ahead by date
-                    logger.info('miqtop_time is ahead by one day')
-                    cur_time = miqtop_time - timedelta(days=1)
-                    cur_time = cur_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-            else:
-                cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                    - timedelta(hours=timezone_offset)
-        elif 'miqtop: ' in top_line:
-            miqtop_ahead = False
-            # miqtop: .* is-> Mon Jan 26 08:57:39 EST 2015 -0500
-            str_start = top_line.index('is->')
-            miqtop_time = du_parser.parse(top_line[str_start:], fuzzy=True, ignoretz=True)
-            # Time logged in top is the system's time which is ahead/behind by the timezone offset
-            timezone_offset = int(top_line[str_start + 34:str_start + 37])
-            miqtop_time = miqtop_time - timedelta(hours=timezone_offset)
-        elif 'Cpu(s): ' in top_line:
-            miq_cpu_result = miq_cpu.search(top_line)
-            if miq_cpu_result:
-                top_app['datetimes'].append(str(cur_time))
-                top_app['cpuus'].append(float(miq_cpu_result.group(1).strip()))
-                top_app['cpusy'].append(float(miq_cpu_result.group(2).strip()))
-                top_app['cpuni'].append(float(miq_cpu_result.group(3).strip()))
-                top_app['cpuid'].append(float(miq_cpu_result.group(4).strip()))
-                top_app['cpuwa'].append(float(miq_cpu_result.group(5).strip()))
-                top_app['cpuhi'].append(float(miq_cpu_result.group(6).strip()))
-                top_app['cpusi'].append(float(miq_cpu_result.group(7).strip()))
-                top_app['cpust'].append(float(miq_cpu_result.group(8).strip()))
-            else:
-                logger.error('Issue with miq_cpu regex: %s', top_line)
-        elif 'Mem: ' in top_line:
-            miq_mem_result = miq_mem.search(top_line)
-            if miq_mem_result:
-                top_app['memtot'].append(round(float(miq_mem_result.group(1).strip()) / 1024, 2))
-                top_app['memuse'].append(round(float(miq_mem_result.group(2).strip()) / 1024, 2))
-                top_app['memfre'].append(round(float(miq_mem_result.group(3).strip()) / 1024, 2))
-                top_app['buffer'].append(round(float(miq_mem_result.group(4).strip()) / 1024, 2))
-            else:
-                logger.error('Issue with miq_mem regex: %s', top_line)
-        elif 'Swap: ' in top_line:
-            miq_swap_result = miq_swap.search(top_line)
-            if miq_swap_result:
-                top_app['swatot'].append(round(float(miq_swap_result.group(1).strip()) / 1024, 2))
-                top_app['swause'].append(round(float(miq_swap_result.group(2).strip()) / 1024, 2))
-                top_app['swafre'].append(round(float(miq_swap_result.group(3).strip()) / 1024, 2))
-                top_app['cached'].append(round(float(miq_swap_result.group(4).strip()) / 1024, 2))
-            else:
-                logger.error('Issue with miq_swap regex: %s', top_line)
-        else:
-            logger.error('Issue with grepping of top file:%s', top_line)
-        if (line_count % 20000) == 0:
-            timediff = time() - runningtime
-            runningtime = time()
-            logger.info('Count {} : Parsed 20000 lines in %s', line_count, timediff)
-    return top_app, len(top_lines)
+    top_output = TopOutput(top_file)
+    line_count = top_output.update()
+    return top_output.appliance, line_count
 
 
 def top_to_workers(workers, top_file):
-    # Find first miqtop log line
-    miqtop_time, timezone_offset = get_first_miqtop(top_file)
-
-    runningtime = time()
-    grep_pids = ''
-    for wkr in workers:
-        grep_pids = '{}^{}\s\\|'.format(grep_pids, workers[wkr].pid)
-    grep_pattern = '{}^top\s\-\s\\|^miqtop\:'.format(grep_pids)
-    # Use grep to reduce # of lines to sort through
-    p = subprocess.Popen(['grep', grep_pattern, top_file], stdout=subprocess.PIPE)
-    greppedtop, err = p.communicate()
-    timediff = time() - runningtime
-    logger.info('Grepped top_output for pids & time data in %s', timediff)
-
-    # This is very ugly because miqtop does include the date but top does not
-    # Also pids can be duplicated, so careful attention to detail on when a pid starts and ends
-    top_lines = greppedtop.strip().split('\n')
-    line_count = 0
-    top_workers = {}
-    cur_time = None
-    miqtop_ahead = True
-    runningtime = time()
-    for top_line in top_lines:
-        line_count += 1
-        if 'top - ' in top_line:
-            # top - 11:00:43
-            cur_hour = int(top_line[6:8])
-            cur_min = int(top_line[9:11])
-            cur_sec = int(top_line[12:14])
-            if miqtop_ahead:
-                # Have not found miqtop time yet so we must rely on miqtop time "ahead"
-                if cur_hour <= miqtop_time.hour:
-                    cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-                else:
-                    # miqtop_time is ahead by date
-                    logger.info('miqtop_time is ahead by one day')
-                    cur_time = miqtop_time - timedelta(days=1)
-                    cur_time = cur_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                        - timedelta(hours=timezone_offset)
-            else:
-                cur_time = miqtop_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
-                    - timedelta(hours=timezone_offset)
-        elif 'miqtop: ' in top_line:
-            miqtop_ahead = False
-            # miqtop: .* is-> Mon Jan 26 08:57:39 EST 2015 -0500
-            str_start = top_line.index('is->')
-            miqtop_time = du_parser.parse(top_line[str_start:], fuzzy=True, ignoretz=True)
-            # Time logged in top is the system's time which is ahead/behind by the timezone offset
-            timezone_offset = int(top_line[str_start + 34:str_start + 37])
-            miqtop_time = miqtop_time - timedelta(hours=timezone_offset)
-        else:
-            top_results = miq_top.search(top_line)
-            if top_results:
-                top_pid = top_results.group(1)
-                top_virt = convert_top_mem_to_mib(top_results.group(2))
-                top_res = convert_top_mem_to_mib(top_results.group(3))
-                top_share = convert_top_mem_to_mib(top_results.group(4))
-                top_cpu_per = float(top_results.group(5))
-                top_mem_per = float(top_results.group(6))
-                for worker in workers:
-                    if workers[worker].pid == top_pid:
-                        if cur_time > workers[worker].start_ts and \
-                                (workers[worker].end_ts == '' or cur_time < workers[worker].end_ts):
-                            w_id = workers[worker].worker_id
-                            if w_id not in top_workers:
-                                top_workers[w_id] = {}
-                                top_workers[w_id]['datetimes'] = []
-                                top_workers[w_id]['virt'] = []
-                                top_workers[w_id]['res'] = []
-                                top_workers[w_id]['share'] = []
-                                top_workers[w_id]['cpu_per'] = []
-                                top_workers[w_id]['mem_per'] = []
-                            top_workers[w_id]['datetimes'].append(str(cur_time))
-                            top_workers[w_id]['virt'].append(top_virt)
-                            top_workers[w_id]['res'].append(top_res)
-                            top_workers[w_id]['share'].append(top_share)
-                            top_workers[w_id]['cpu_per'].append(top_cpu_per)
-                            top_workers[w_id]['mem_per'].append(top_mem_per)
-                            break
-            else:
-                logger.error('Issue with miq_top regex or grepping of top file:%s', top_line)
-        if (line_count % 20000) == 0:
-            timediff = time() - runningtime
-            runningtime = time()
-            logger.info('Count %s : Parsed 20000 lines in %s', line_count, timediff)
-    return top_workers, len(top_lines)
+    top_output = TopOutput(top_file)
+    line_count = top_output.update()
+    return top_output.workers(workers), line_count
 
 
 def perf_process_evm(evm_file, top_file):
@@ -808,22 +746,19 @@ def perf_process_evm(evm_file, top_file):
     starttime = time()
     initialtime = starttime
 
-    logger.info('----------- Parsing evm log file for messages -----------')
-    messages, msg_cmds, test_start, test_end, msg_lc = evm_to_messages(evm_file, msg_filters)
+    logger.info('----------- Parsing evm log file for messages and workers -----------')
+    (messages, msg_cmds, test_start, test_end, msg_lc), \
+        (workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc) = \
+        evm_to_messages_and_workers(evm_file, msg_filters)
     timediff = time() - starttime
     logger.info('----------- Completed Parsing evm log file -----------')
-    logger.info('Parsed %s lines of evm log file for messages in %s', msg_lc, timediff)
+    logger.info('Parsed %s lines of evm log file for messages and workers in %s', msg_lc,
+        timediff)
     logger.info('Total # of Messages: %d', len(messages))
     logger.info('Total # of Commands: %d', len(msg_cmds))
     logger.info('Start Time: %s', test_start)
     logger.info('End Time: %s', test_end)
-
-    logger.info('----------- Parsing evm log file for workers -----------')
-    starttime = time()
-    workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc = evm_to_workers(evm_file)
-    timediff = time() - starttime
-    logger.info('----------- Completed Parsing evm log for workers -----------')
-    logger.info('Parsed %s lines of evm log file for workers in %s', wkr_lc, timediff)
+    logger.info('Found %s lines about workers', wkr_lc)
     logger.info('Total # of Workers: %d', len(workers))
     logger.info('# Workers Memory Exceeded: %s', wkr_mem_exc)
     logger.info('# Workers Uptime Exceeded: %s', wkr_upt_exc)
@@ -831,20 +766,15 @@ def perf_process_evm(evm_file, top_file):
     logger.info('# Workers Stopped: %s', wkr_stp)
     logger.info('# Workers Interrupted: %s', wkr_int)
 
-    logger.info('----------- Parsing top_output log file for Appliance Metrics -----------')
+    logger.info('----------- Parsing top_output log file for Appliance/Worker Metrics -----------')
     starttime = time()
-    top_appliance, tp_lc = top_to_appliance(top_file)
+    top_output = TopOutput(top_file)
+    tp_lc = top_output.update()
+    top_appliance = top_output.appliance
+    top_workers = top_output.workers(workers)
     timediff = time() - starttime
     logger.info('----------- Completed Parsing top_output log -----------')
-    logger.info('Parsed %s lines of top_output file for Appliance Metrics in %s', tp_lc,
-        timediff)
-
-    logger.info('----------- Parsing top_output log file for worker CPU/Mem -----------')
-    starttime = time()
-    top_workers, tp_lc = top_to_workers(workers, top_file)
-    timediff = time() - starttime
-    logger.info('----------- Completed Parsing top_output log -----------')
-    logger.info('Parsed %s lines of top_output file for workers in %s', tp_lc, timediff)
+    logger.info('Parsed %s new lines of top_output file in %s', tp_lc, timediff)
 
     charts_dir = log_path.join('charts')
     if not os.path.exists(str(charts_dir)):
@@ -852,7 +782,7 @@ def perf_process_evm(evm_file, top_file):
 
     logger.info('----------- Generating Raw Data csv files -----------')
     starttime = time()
-    generate_raw_data_csv(messages, 'queue-rawdata.csv')
+    messages_to_raw_data_csv(messages, 'queue-rawdata.csv')
     generate_raw_data_csv(workers, 'workers-rawdata.csv')
     timediff = time() - starttime
     logger.info('Generated Raw Data csv files in: %s', timediff)
@@ -1028,41 +958,154 @@ def perf_process_evm(evm_file, top_file):
     logger.info('Total time processing evm log file and generating report: %s', timediff)
 
 
-class MiqMsgStat(object):
-
-    def __init__(self):
-        self.headers = ['msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
-            'deq_time', 'del_time', 'total_time']
-        self.msg_id = ''
-        self.msg_cmd = ''
-        self.msg_args = ''
-        self.pid_put = ''
-        self.pid_get = ''
-        self.puttime = ''
-        self.gettime = ''
-        self.deq_time = 0.0
-        self.del_time = 0.0
-        self.total_time = 0.0
-
-    def __iter__(self):
-        for header in self.headers:
-            yield header, getattr(self, header)
-
-    def __str__(self):
-        return self.msg_cmd + ' : ' + self.msg_args + ' : ' + self.pid_put + ' : ' + self.pid_get \
-            + ' : ' + self.puttime + ' : ' + self.gettime + ' : ' + str(self.deq_time) + ' : ' + \
-            str(self.del_time) + ' : ' + str(self.total_time)
-
-
-class MiqMsgLists(object):
-
-    def __init__(self):
-        self.cmd = ''
-        self.puts = 0
-        self.gets = 0
-        self.dequeuetimes = []
-        self.delivertimes = []
-        self.totaltimes = []
+class MiqMsgTable(object):
+    """Columnar store of backend queue messages
+
+    Every message is a row across typed NumPy arrays; commands and args are interned, so each
+    distinct string is kept only once no matter how many messages share it. Columns are read with
+    ``table['column']``, which returns a view of the filled rows.
+    """
+    headers = ['msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
+        'deq_time', 'del_time', 'total_time']
+    dtypes = [('msg_id', 'i8'), ('cmd', 'i4'), ('args', 'i4'), ('pid_put', 'i4'), ('pid_get', 'i4'),
+        ('puttime', 'M8[us]'), ('gettime', 'M8[us]'), ('deq_time', 'f8'), ('del_time', 'f8'),
+        ('total_time', 'f8')]
+
+    def __init__(self, capacity=4096):
+        self.cmds = []
+        self.args = []
+        self._cmd_ids = {}
+        self._arg_ids = {}
+        # msg id -> row
+        self._rows = {}
+        self._columns = {}
+        for name, dtype in self.dtypes:
+            self._columns[name] = numpy.zeros(capacity, dtype)
+        self._columns['gettime'].fill(NAT)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, msg_id):
+        return int(msg_id) in self._rows
+
+    def __getitem__(self, column):
+        return self._columns[column][:len(self)]
+
+    def _intern(self, strings, ids, value):
+        if value not in ids:
+            ids[value] = len(strings)
+            strings.append(value)
+        return ids[value]
+
+    def put(self, msg_id, ts, pid, msg_cmd, msg_args):
+        """Add a message put on the queue, replacing any earlier one with the same id"""
+        msg_id = int(msg_id)
+        row = self._rows.get(msg_id)
+        if row is None:
+            row = self._rows[msg_id] = len(self._rows)
+            if row == len(self._columns['msg_id']):
+                for name, column in self._columns.items():
+                    self._columns[name] = numpy.resize(column, 2 * len(column))
+                self._columns['gettime'][row:] = NAT
+        columns = self._columns
+        columns['msg_id'][row] = msg_id
+        columns['cmd'][row] = self._intern(self.cmds, self._cmd_ids, msg_cmd)
+        columns['args'][row] = self._intern(self.args, self._arg_ids, msg_args)
+        columns['pid_put'][row] = int(pid or 0)
+        columns['pid_get'][row] = 0
+        columns['puttime'][row] = ts or NAT
+        columns['gettime'][row] = NAT
+        columns['deq_time'][row] = 0.0
+        columns['del_time'][row] = 0.0
+        columns['total_time'][row] = 0.0
+
+    def get(self, msg_id, ts, pid, deq_time):
+        """Record a message picked up by a worker"""
+        row = self._rows[int(msg_id)]
+        self._columns['pid_get'][row] = int(pid or 0)
+        self._columns['gettime'][row] = ts or NAT
+        self._columns['deq_time'][row] = deq_time
+
+    def delivered(self, msg_id, del_time):
+        """Record a message delivered by a worker"""
+        row = self._rows[int(msg_id)]
+        self._columns['del_time'][row] = del_time
+        self._columns['total_time'][row] = self._columns['deq_time'][row] + del_time
+
+    def apply_filters(self, filters):
+        """Suffix the command of every message whose args match one of ``filters``
+
+        Filters are matched once per distinct args string rather than once per message.
+        """
+        if not len(self):
+            return
+        suffixes = ['']
+        suffix_ids = numpy.zeros(len(self.args), 'i4')
+        for arg_id, msg_args in enumerate(self.args):
+            for p_filter in filters:
+                if filters[p_filter].search(msg_args.strip()):
+                    suffix_ids[arg_id] = len(suffixes)
+                    suffixes.append(p_filter)
+                    break
+        pairs = self['cmd'].astype('i8') * len(suffixes) + suffix_ids[self['args']]
+        pairs, cmd_ids = numpy.unique(pairs, return_inverse=True)
+        self['cmd'][:] = cmd_ids
+        self.cmds = ['{}{}'.format(self.cmds[pair // len(suffixes)], suffixes[pair % len(suffixes)])
+            for pair in pairs.tolist()]
+        self._cmd_ids = dict((cmd, cmd_id) for cmd_id, cmd in enumerate(self.cmds))
+
+    def sorted_rows(self):
+        """Row indices, ordered the way message ids sort as strings"""
+        return numpy.argsort(self['msg_id'].astype('S20'), kind='mergesort')
+
+    def by_cmd(self, rows=None):
+        """Yield ``(cmd, rows)`` for every command found in ``rows``, in command order
+
+        Rows keep their relative order within each command; all rows are grouped by default.
+        """
+        if rows is None:
+            rows = numpy.arange(len(self))
+        if not len(rows):
+            return
+        rows = rows[numpy.argsort(self['cmd'][rows], kind='mergesort')]
+        cmd_ids = self['cmd'][rows]
+        starts = numpy.flatnonzero(numpy.r_[True, cmd_ids[1:] != cmd_ids[:-1]])
+        groups = dict((self.cmds[cmd_ids[start]], cmd_rows)
+            for start, cmd_rows in zip(starts, numpy.split(rows, starts[1:])))
+        for cmd in sorted(groups):
+            yield cmd, groups[cmd]
+
+    def iter_rows(self, chunk_size=65536):
+        """Yield every message as a dict keyed by :py:attr:`headers`, sorted by message id"""
+        order = self.sorted_rows()
+        for start in range(0, len(order), chunk_size):
+            rows = order[start:start + chunk_size]
+            columns = {}
+            for name, _ in self.dtypes:
+                columns[name] = self._columns[name][rows]
+            msg_ids = columns['msg_id'].tolist()
+            cmds = columns['cmd'].tolist()
+            args = columns['args'].tolist()
+            pids_put = columns['pid_put'].tolist()
+            pids_get = columns['pid_get'].tolist()
+            puttimes = _datetimes_to_strings(columns['puttime'])
+            gettimes = _datetimes_to_strings(columns['gettime'])
+            deq_times = columns['deq_time'].tolist()
+            del_times = columns['del_time'].tolist()
+            total_times = columns['total_time'].tolist()
+            for i in range(len(rows)):
+                yield {
+                    'msg_id': '\'{}\''.format(msg_ids[i]),
+                    'msg_cmd': self.cmds[cmds[i]],
+                    'msg_args': self.args[args[i]],
+                    'pid_put': str(pids_put[i]),
+                    'pid_get': str(pids_get[i]) if pids_get[i] else '',
+                    'puttime': puttimes[i],
+                    'gettime': gettimes[i],
+                    'deq_time': deq_times[i],
+                    'del_time': del_times[i],
+                    'total_time': total_times[i]}
 
 
 class MiqMsgBucket(object):
@@ -1093,6 +1136,219 @@ class MiqMsgBucket(object):
             + ' : ' + str(self.min_del) + ' : ' + str(self.max_del) + ' : ' + str(self.avg_del)
 
 
+class TopOutput(object):
+    """Incremental parser of top_output.log
+
+    Appliance CPU/memory/swap series and per-pid process samples are accumulated as the log grows.
+    :py:meth:`update` only parses what was appended since the previous update, and saves the
+    parser's state and everything parsed so far in a sidecar checkpoint next to the log, so a
+    later run against the same, longer log resumes from there. A log that shrank or whose
+    beginning changed is parsed from the start again.
+
+    Args:
+        top_file: Path to top_output.log
+        checkpoint_file: Path of the checkpoint, defaults to ``top_file`` + ``.checkpoint``
+    """
+    version = 1
+    # Bytes at the beginning of the log compared to tell whether it was replaced
+    head_size = 4096
+    appliance_keys = ['datetimes', 'cpuus', 'cpusy', 'cpuni', 'cpuid', 'cpuwa', 'cpuhi', 'cpusi',
+        'cpust', 'memtot', 'memuse', 'memfre', 'buffer', 'swatot', 'swause', 'swafre', 'cached']
+    process_keys = ['times', 'virt', 'res', 'share', 'cpu_per', 'mem_per']
+
+    def __init__(self, top_file, checkpoint_file=None):
+        self.top_file = str(top_file)
+        self.checkpoint_file = str(checkpoint_file or '{}.checkpoint'.format(self.top_file))
+        self._reset()
+        try:
+            with open(self.checkpoint_file) as f:
+                checkpoint = json.load(f)
+            if checkpoint['version'] == self.version:
+                self._load(checkpoint)
+        except (IOError, ValueError, KeyError):
+            # no checkpoint yet, or one we can't use; start from the beginning of the log
+            self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        self.head = (0, hashlib.sha1('').hexdigest())
+        self.miqtop_time = None
+        self.timezone_offset = 0
+        self.miqtop_ahead = True
+        self.cur_time = None
+        self.appliance = dict((key, []) for key in self.appliance_keys)
+        # Time of every top iteration process samples were taken in
+        self.times = []
+        # pid -> dict of process_keys to lists of samples, 'times' being indices into self.times
+        self.processes = {}
+
+    def _load(self, checkpoint):
+        self.offset = checkpoint['offset']
+        self.head = tuple(checkpoint['head'])
+        if checkpoint['miqtop_time']:
+            self.miqtop_time = du_parser.parse(checkpoint['miqtop_time'])
+        self.timezone_offset = checkpoint['timezone_offset']
+        self.miqtop_ahead = checkpoint['miqtop_ahead']
+        self.times = [du_parser.parse(cur_time) for cur_time in checkpoint['times']]
+        self.cur_time = self.times[-1] if self.times else None
+        self.appliance = checkpoint['appliance']
+        self.processes = checkpoint['processes']
+
+    def save(self):
+        """Write the checkpoint"""
+        checkpoint = {
+            'version': self.version,
+            'offset': self.offset,
+            'head': self.head,
+            'miqtop_time': str(self.miqtop_time) if self.miqtop_time else None,
+            'timezone_offset': self.timezone_offset,
+            'miqtop_ahead': self.miqtop_ahead,
+            'times': [str(cur_time) for cur_time in self.times],
+            'appliance': self.appliance,
+            'processes': self.processes,
+        }
+        tmp_path = '{}.tmp'.format(self.checkpoint_file)
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.rename(tmp_path, self.checkpoint_file)
+
+    def update(self):
+        """Parse the lines appended to the log since the last update, then save the checkpoint
+
+        A trailing line without a newline is left for the next update, since top may still be
+        writing it.
+
+        Returns:
+            The number of lines parsed
+        """
+        line_count = 0
+        runningtime = time()
+        with open(self.top_file, 'rb') as top_log:
+            head = top_log.read(self.head_size)
+            head_size, head_digest = self.head
+            if (os.path.getsize(self.top_file) < self.offset or
+                    hashlib.sha1(head[:head_size]).hexdigest() != head_digest):
+                logger.info('%s was replaced, parsing it from the start', self.top_file)
+                self._reset()
+            self.head = (len(head), hashlib.sha1(head).hexdigest())
+
+            if self.miqtop_time is None:
+                try:
+                    self.miqtop_time, self.timezone_offset = get_first_miqtop(self.top_file)
+                except ValueError:
+                    logger.info('No miqtop line in %s yet', self.top_file)
+                    return 0
+
+            top_log.seek(self.offset)
+            tail = ''
+            for block in iter(lambda: top_log.read(EVM_BLOCK_SIZE), ''):
+                self.offset += len(block)
+                lines = (tail + block).split('\n')
+                tail = lines.pop()
+                for top_line in lines:
+                    self._parse_line(top_line)
+                line_count += len(lines)
+                timediff = time() - runningtime
+                runningtime = time()
+                logger.info('Count %s : Parsed top_output lines in %s', line_count, timediff)
+            self.offset -= len(tail)
+        self.save()
+        return line_count
+
+    def _parse_line(self, top_line):
+        # This is very ugly because miqtop does include the date but top does not
+        if top_line.startswith('top - '):
+            # top - 11:00:43
+            cur_hour = int(top_line[6:8])
+            cur_min = int(top_line[9:11])
+            cur_sec = int(top_line[12:14])
+            if self.miqtop_ahead and cur_hour > self.miqtop_time.hour:
+                # Have not found miqtop date/time yet so we must rely on miqtop date/time "ahead"
+                logger.info('miqtop_time is ahead by one day')
+                cur_time = self.miqtop_time - timedelta(days=1)
+            else:
+                cur_time = self.miqtop_time
+            self.cur_time = cur_time.replace(hour=cur_hour, minute=cur_min, second=cur_sec) \
+                - timedelta(hours=self.timezone_offset)
+            self.times.append(self.cur_time)
+        elif top_line.startswith('miqtop: '):
+            self.miqtop_ahead = False
+            # miqtop: .* is-> Mon Jan 26 08:57:39 EST 2015 -0500
+            str_start = top_line.index('is->')
+            miqtop_time = du_parser.parse(top_line[str_start:], fuzzy=True, ignoretz=True)
+            # Time logged in top is the system's time which is ahead/behind by the timezone offset
+            self.timezone_offset = int(top_line[str_start + 34:str_start + 37])
+            self.miqtop_time = miqtop_time - timedelta(hours=self.timezone_offset)
+        elif top_line.startswith('Cpu(s): '):
+            miq_cpu_result = miq_cpu.search(top_line)
+            if miq_cpu_result:
+                self.appliance['datetimes'].append(str(self.cur_time))
+                for i, key in enumerate(self.appliance_keys[1:9], 1):
+                    self.appliance[key].append(float(miq_cpu_result.group(i).strip()))
+            else:
+                logger.error('Issue with miq_cpu regex: %s', top_line)
+        elif top_line.startswith('Mem: '):
+            miq_mem_result = miq_mem.search(top_line)
+            if miq_mem_result:
+                for i, key in enumerate(self.appliance_keys[9:13], 1):
+                    self.appliance[key].append(
+                        round(float(miq_mem_result.group(i).strip()) / 1024, 2))
+            else:
+                logger.error('Issue with miq_mem regex: %s', top_line)
+        elif top_line.startswith('Swap: '):
+            miq_swap_result = miq_swap.search(top_line)
+            if miq_swap_result:
+                for i, key in enumerate(self.appliance_keys[13:17], 1):
+                    self.appliance[key].append(
+                        round(float(miq_swap_result.group(i).strip()) / 1024, 2))
+            else:
+                logger.error('Issue with miq_swap regex: %s', top_line)
+        elif top_line[:1].isdigit() and self.times:
+            top_results = miq_top.match(top_line)
+            if top_results:
+                top_pid = top_results.group(1)
+                if top_pid not in self.processes:
+                    self.processes[top_pid] = dict((key, []) for key in self.process_keys)
+                process = self.processes[top_pid]
+                process['times'].append(len(self.times) - 1)
+                process['virt'].append(convert_top_mem_to_mib(top_results.group(2)))
+                process['res'].append(convert_top_mem_to_mib(top_results.group(3)))
+                process['share'].append(convert_top_mem_to_mib(top_results.group(4)))
+                process['cpu_per'].append(float(top_results.group(5)))
+                process['mem_per'].append(float(top_results.group(6)))
+
+    def workers(self, workers):
+        """Memory and CPU series of every worker, keyed by worker id
+
+        Pids can be reused, so a sample only belongs to a worker with its pid if it was taken
+        while that worker was running.
+        """
+        top_workers = {}
+        for top_pid, process in self.processes.items():
+            pid_workers = [workers[worker] for worker in workers if workers[worker].pid == top_pid]
+            if not pid_workers:
+                continue
+            for i, time_index in enumerate(process['times']):
+                cur_time = self.times[time_index]
+                for worker in pid_workers:
+                    if cur_time > worker.start_ts and \
+                            (worker.end_ts == '' or cur_time < worker.end_ts):
+                        w_id = worker.worker_id
+                        if w_id not in top_workers:
+                            top_workers[w_id] = {}
+                            top_workers[w_id]['datetimes'] = []
+                            top_workers[w_id]['virt'] = []
+                            top_workers[w_id]['res'] = []
+                            top_workers[w_id]['share'] = []
+                            top_workers[w_id]['cpu_per'] = []
+                            top_workers[w_id]['mem_per'] = []
+                        top_workers[w_id]['datetimes'].append(str(cur_time))
+                        for key in self.process_keys[1:]:
+                            top_workers[w_id][key].append(process[key][i])
+                        break
+        return top_workers
+
+
 class MiqWorker(object):
 
     def __init__(self):
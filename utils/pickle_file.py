@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Pickle files shared by several processes
+
+The caches the parallelizer slaves share are pickle files which any of the processes might be
+writing while the others read them. :py:func:`write_pickle` therefore writes the file aside and
+renames it, so a reader gets either the old or the new content, never half of it.
+"""
+import os
+from tempfile import NamedTemporaryFile
+from time import time
+
+import cPickle as pickle
+
+from utils.log import logger
+
+
+def read_pickle(path, default=None):
+    """Returns the object pickled in the file, ``default`` when the file can't be read
+
+    A missing or truncated file is expected, any other failure is logged as a warning.
+    """
+    try:
+        with open(path, 'rb') as pickle_file:
+            return pickle.load(pickle_file)
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return default
+    except Exception as e:
+        logger.warning('Unreadable pickle file %s: %s', path, e)
+        return default
+
+
+def write_pickle(obj, path):
+    """Pickles the object to the file, creating its directory if needed
+
+    Raises:
+        :py:class:`IOError`, :py:class:`OSError` when the file can't be written,
+        :py:class:`TypeError`, :py:class:`pickle.PicklingError` when the object can't be pickled
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # Created by another process in the meantime
+            if not os.path.isdir(directory):
+                raise
+    with NamedTemporaryFile(dir=directory, delete=False) as pickle_file:
+        try:
+            pickle.dump(obj, pickle_file, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            pickle_file.close()
+            os.remove(pickle_file.name)
+            raise
+    os.rename(pickle_file.name, path)
+
+
+class PickleCache(object):
+    """Values stored in a pickle file shared by the processes
+
+    The values are used while the file is younger than the TTL and has the current stamp, the
+    appliance caches use the boot id, GUID and so on of the appliance as the stamp.
+
+    Args:
+        path: File to store the values in
+        stamp: Callable returning the current stamp of the values
+        ttl: Number of seconds the stored values are used for, ``0`` to not store anything
+    """
+    def __init__(self, path, stamp, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._stamp_func = stamp
+        self._stamp = None
+        self._values = None
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    @property
+    def stamp(self):
+        if self._stamp is None:
+            self._stamp = self._stamp_func()
+        return self._stamp
+
+    def _read(self):
+        """Returns the values stored in the file if they are still valid, else ``{}``"""
+        entry = read_pickle(self.path)
+        if entry is None or time() - entry['stored'] > self.ttl or entry['stamp'] != self.stamp:
+            return {}
+        return entry['values']
+
+    def _write(self, values):
+        """Stores the values, logs a warning when they can't be stored"""
+        entry = {'stamp': self.stamp, 'stored': time(), 'values': values}
+        try:
+            write_pickle(entry, self.path)
+        except (IOError, OSError, TypeError, pickle.PicklingError) as e:
+            logger.warning('Could not write the cache %s: %s', self.path, e)
+        self._values = values
+
+    def get(self, name):
+        """Returns the stored value of the name
+
+        Raises:
+            :py:class:`KeyError` when the value is not stored or the entry is stale
+        """
+        if not self.enabled:
+            raise KeyError(name)
+        if self._values is None:
+            self._values = self._read()
+        return self._values[name]
+
+    def set(self, name, value):
+        """Stores the value of the name, along with the values other processes stored"""
+        self.update({name: value})
+
+    def update(self, values):
+        """Stores the values, along with the values other processes stored"""
+        if not self.enabled or not values:
+            return
+        stored = self._read()
+        stored.update(values)
+        self._write(stored)
+
+    def discard(self, *names):
+        """Forgets the values of the given names, or all the values"""
+        if not names:
+            self._values = {}
+            self._stamp = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            return
+        if not self.enabled:
+            return
+        values = self._read()
+        if not any(name in values for name in names):
+            self._values = values
+            return
+        for name in names:
+            values.pop(name, None)
+        self._write(values)
@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
 import fauxfactory
+import hashlib
 import iso8601
+import json
 import re
+import select
 import socket
+import subprocess
 import sys
-from collections import namedtuple
+import tempfile
+import threading
+import weakref
+from collections import deque, namedtuple
 from os import path as os_path
+from time import time
 from urlparse import urlparse
 
 import paramiko
@@ -16,7 +24,7 @@ from utils import conf, ports, version
 from utils.log import logger
 from utils.net import net_check
 from fixtures.pytest_store import store
-from utils.path import project_path
+from utils.path import data_path, project_path
 from utils.quote import quote
 from utils.timeutil import parsetime
 
@@ -75,10 +83,363 @@ class SSHResult(namedtuple("SSHResult", ["rc", "output"])):
             raise ValueError('You can only compare SSHResult with str or int')
 
 
+class CommandOutput(object):
+    """Output of a remote command, collected as it arrives
+
+    Keeps at most ``max_size`` bytes in memory. Once the output grows bigger, the whole output is
+    written to a temporary file, :py:attr:`spill_file`, and only its last ``max_size`` bytes are
+    kept.
+
+    Args:
+        max_size: Number of bytes kept in memory, ``None`` for no limit
+        callback: Called with every chunk of the output as it arrives, and ``True`` for the chunks
+            coming from stderr
+    """
+    def __init__(self, max_size=None, callback=None):
+        self.max_size = max_size
+        self.callback = callback
+        self.spill_file = None
+        self._spill = None
+        self._chunks = deque()
+        self._size = 0
+
+    def write(self, data, stderr=False):
+        if self.callback is not None:
+            self.callback(data, stderr)
+        spill = self.max_size is not None and self._size + len(data) > self.max_size
+        if spill and self._spill is None:
+            self._spill = tempfile.NamedTemporaryFile(
+                prefix='ssh_output_', suffix='.log', delete=False)
+            self.spill_file = self._spill.name
+            logger.warning('Command output is bigger than %d bytes, writing it to %s',
+                self.max_size, self.spill_file)
+            self._spill.writelines(self._chunks)
+        if self._spill is not None:
+            self._spill.write(data)
+        self._chunks.append(data)
+        self._size += len(data)
+        if self.max_size is not None:
+            while self._size - len(self._chunks[0]) >= self.max_size:
+                self._size -= len(self._chunks.popleft())
+
+    def getvalue(self):
+        value = ''.join(self._chunks)
+        if self.max_size is not None:
+            return value[-self.max_size:]
+        return value
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+
+
+class RailsDaemon(object):
+    """Rails environment kept booted on the appliance to evaluate ``rails runner`` commands
+
+    ``rails runner`` boots the whole Rails environment for every command, which takes tens of
+    seconds. The daemon script (``data/utils/rails_daemon.rb``) is started with ``rails runner``
+    once and then evaluates the commands sent to it over its stdin, answering over its stdout. A
+    command gets the output ``rails runner`` would have printed and its exit code.
+
+    Use :py:meth:`over_ssh` to start it on an appliance. :py:meth:`local` runs the same script
+    with a local ruby, without Rails, which is enough to test the protocol without an appliance.
+    The commands of several threads are evaluated one after another.
+
+    Args:
+        stdin: File the requests are written to
+        stdout: File the answers are read from
+        channel: The paramiko channel of the daemon, if it runs remotely
+        close: Callable stopping the daemon
+    """
+    script = data_path.join('utils', 'rails_daemon.rb')
+    remote_script = '/tmp/rails_daemon.rb'
+    marker = 'RAILS_DAEMON '
+    # Booting Rails takes a while
+    boot_timeout = 300.0
+
+    def __init__(self, stdin, stdout, channel=None, close=None):
+        self._stdin = stdin
+        self._stdout = stdout
+        self._channel = channel
+        self._close = close
+        self._lock = threading.Lock()
+        self.alive = True
+
+    @classmethod
+    def over_ssh(cls, ssh_client):
+        """Start the daemon on the appliance ``ssh_client`` is connected to"""
+        ssh_client.put_file(cls.script.strpath, cls.remote_script)
+        channel = ssh_client.open_session()
+        # Anything the daemon prints to stderr is only noise, and has to be read too
+        channel.set_combine_stderr(True)
+        channel.settimeout(cls.boot_timeout)
+        channel.exec_command('/var/www/miq/vmdb/bin/rails runner {}'.format(cls.remote_script))
+        daemon = cls(channel.makefile('wb'), channel.makefile('rb'), channel=channel,
+            close=channel.close)
+        try:
+            daemon._read_answer()
+        except Exception:
+            daemon.close()
+            raise
+        return daemon
+
+    @classmethod
+    def local(cls, ruby='ruby'):
+        """Start the daemon script with a local ruby"""
+        process = subprocess.Popen([ruby, cls.script.strpath], stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE)
+        daemon = cls(process.stdin, process.stdout, close=process.kill)
+        daemon._read_answer()
+        return daemon
+
+    def _read_answer(self):
+        while True:
+            line = self._stdout.readline()
+            if not line:
+                self.alive = False
+                raise EOFError('The rails daemon exited')
+            if line.startswith(self.marker):
+                return json.loads(line[len(self.marker):])
+            # Rails prints deprecation warnings and such while booting
+            logger.debug('rails daemon: %s', line.rstrip())
+
+    def run(self, command, timeout=RUNCMD_TIMEOUT):
+        """Evaluate a ``rails runner`` command
+
+        Args:
+            command: The arguments of ``rails runner``, quoted like on a shell command line
+            timeout: Timeout after which the command execution fails, ``0`` for none. The daemon
+                is stopped when a command times out.
+
+        Returns:
+            A :py:class:`SSHResult` instance.
+        """
+        try:
+            with self._lock:
+                if self._channel is not None:
+                    self._channel.settimeout(float(timeout) if timeout else None)
+                self._stdin.write(json.dumps({'command': command}) + '\n')
+                self._stdin.flush()
+                answer = self._read_answer()
+        except socket.timeout:
+            logger.error("Rails command `{command}` timed out.".format(command=command))
+            self.close()
+            raise
+        except (EOFError, IOError, socket.error) as e:
+            # The command may have been executed already, so it can't be retried
+            logger.error("The rails daemon died while running `{}`: {}".format(command, e))
+            self.close()
+            return SSHResult(1, '')
+        return SSHResult(answer['rc'], answer['output'])
+
+    def close(self):
+        self.alive = False
+        if self._close is not None:
+            with diaper:
+                self._close()
+            self._close = None
+
+
+class SSHConnectionPool(object):
+    """Authenticated SSH connections to one host, shared by every :py:class:`SSHClient` of it
+
+    Every new connection costs a TCP and a key exchange handshake, so clients don't connect on
+    their own, they open their sessions and SFTP channels over the connections of the pool.
+    Connections found dead are dropped and replaced by new ones when needed.
+
+    sshd refuses to open more than ``MaxSessions`` (10 by default) channels over one connection,
+    so a connection carries at most ``max_sessions`` open channels and the pool opens up to
+    ``max_connections`` connections. When all of them are full, opening a channel waits for
+    another channel to be closed.
+
+    The pool also keeps the :py:class:`RailsDaemon` of the host, so one daemon serves all the
+    clients and outlives each of them.
+
+    Use :py:meth:`get` rather than instantiating this class.
+    """
+    max_sessions = 8
+    max_connections = 4
+    # Seconds to wait for a free channel before giving up
+    wait_timeout = 60.0
+    # Seconds between keepalive packets, which notice dead connections
+    keepalive = 30
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self):
+        # [(paramiko.SSHClient, weakref.WeakSet of its open channels)]
+        self._connections = []
+        self._cond = threading.Condition()
+        self._rails_daemon = None
+        self._rails_daemon_failed = False
+        self._rails_daemon_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, hostname, port, username, credentials=None):
+        """Return the pool of connections to ``username``@``hostname``:``port``
+
+        Args:
+            credentials: Identifies the password or the key the connections authenticate with, so
+                clients authenticating differently don't share connections
+        """
+        key = (hostname, port, username, credentials)
+        with cls._pools_lock:
+            if key not in cls._pools:
+                cls._pools[key] = cls()
+            return cls._pools[key]
+
+    @classmethod
+    def close_all(cls):
+        """Close the connections of every pool"""
+        with cls._pools_lock:
+            pools, cls._pools = cls._pools.values(), {}
+        for pool in pools:
+            pool.close()
+
+    def _prune(self):
+        """Drop the connections that died and forget the channels that were closed"""
+        alive = []
+        for client, channels in self._connections:
+            transport = client.get_transport()
+            if transport is not None and transport.is_active() and transport.is_authenticated():
+                for channel in list(channels):
+                    if channel.closed:
+                        channels.discard(channel)
+                alive.append((client, channels))
+            else:
+                logger.debug('dropping dead ssh connection %r', transport)
+                with diaper:
+                    client.close()
+        self._connections = alive
+
+    def _add_connection(self, connect):
+        client = connect()
+        client.get_transport().set_keepalive(self.keepalive)
+        connection = client, weakref.WeakSet()
+        self._connections.append(connection)
+        return connection
+
+    def _drop(self, client):
+        self._connections = [c for c in self._connections if c[0] is not client]
+        with diaper:
+            client.close()
+
+    def transport(self, connect):
+        """Return the transport of a healthy connection
+
+        Args:
+            connect: Callable returning a new connected :py:class:`paramiko.SSHClient`, called
+                when there's no healthy connection
+        """
+        with self._cond:
+            self._prune()
+            if self._connections:
+                return self._connections[0][0].get_transport()
+            return self._add_connection(connect)[0].get_transport()
+
+    def _checkout(self, connect):
+        # Called with the lock held
+        deadline = time() + self.wait_timeout
+        while True:
+            self._prune()
+            for connection in self._connections:
+                if len(connection[1]) < self.max_sessions:
+                    return connection
+            if len(self._connections) < self.max_connections:
+                return self._add_connection(connect)
+            remaining = deadline - time()
+            if remaining <= 0:
+                raise paramiko.SSHException(
+                    'All {} ssh channels to the host are in use'.format(
+                        self.max_sessions * self.max_connections))
+            # Closing a channel doesn't notify, check again every now and then
+            self._cond.wait(min(remaining, 0.5))
+
+    def _open(self, connect, open_channel):
+        with self._cond:
+            client, channels = self._checkout(connect)
+            try:
+                result, channel = open_channel(client.get_transport())
+            except (paramiko.SSHException, EOFError, socket.error) as e:
+                # The connection may have died since it was checked, try a new one once
+                logger.warning('Opening an ssh channel failed, reconnecting: {}'.format(e))
+                self._drop(client)
+                client, channels = self._checkout(connect)
+                result, channel = open_channel(client.get_transport())
+            channels.add(channel)
+            return result
+
+    def open_session(self, connect):
+        """Open a session channel, see :py:meth:`paramiko.Transport.open_session`"""
+        def open_channel(transport):
+            channel = transport.open_session()
+            return channel, channel
+        return self._open(connect, open_channel)
+
+    def open_sftp(self, connect):
+        """Open an SFTP client, see :py:meth:`paramiko.Transport.open_sftp_client`"""
+        def open_channel(transport):
+            sftp = transport.open_sftp_client()
+            return sftp, sftp.get_channel()
+        return self._open(connect, open_channel)
+
+    def rails_daemon(self, start):
+        """Return the running :py:class:`RailsDaemon` of the host, starting it if needed
+
+        Args:
+            start: Callable returning a new started :py:class:`RailsDaemon`
+
+        Returns ``None`` when the daemon could not be started, then it is not tried again.
+        """
+        with self._rails_daemon_lock:
+            if self._rails_daemon is not None and self._rails_daemon.alive:
+                return self._rails_daemon
+            if self._rails_daemon_failed:
+                return None
+            try:
+                self._rails_daemon = start()
+            except Exception as e:
+                logger.warning('Could not start the rails daemon, using rails runner: {}'.format(e))
+                self._rails_daemon_failed = True
+                return None
+            return self._rails_daemon
+
+    def close(self):
+        with self._rails_daemon_lock:
+            if self._rails_daemon is not None:
+                self._rails_daemon.close()
+                self._rails_daemon = None
+        with self._cond:
+            for client, _ in self._connections:
+                with diaper:
+                    client.close()
+            self._connections = []
+
+
+class PooledTransport(object):
+    """Transport for code that opens its channels on its own, like :py:class:`scp.SCPClient`
+
+    The channels are opened over the connections of the pool, so they count against
+    ``max_sessions`` like any other. Everything else is done by a transport of the pool.
+
+    Args:
+        client: :py:class:`SSHClient` whose connection pool the channels are opened over
+    """
+    def __init__(self, client):
+        self._client = client
+
+    def open_session(self, *args, **kwargs):
+        return self._client.open_session()
+
+    def __getattr__(self, name):
+        return getattr(self._client.get_transport(), name)
+
+
 _ssh_key_file = project_path.join('.generated_ssh_key')
 _ssh_pubkey_file = project_path.join('.generated_ssh_key.pub')
 
-_client_session = []
+_client_session = weakref.WeakSet()
 
 
 class SSHClient(paramiko.SSHClient):
@@ -87,12 +448,22 @@ class SSHClient(paramiko.SSHClient):
     Allows copying/overriding and use as a context manager
     Constructor kwargs are handed directly to paramiko.SSHClient.connect()
 
+    Clients of the same host and user share their connections, see :py:class:`SSHConnectionPool`.
+
     If ``container`` param is specified, then it is assumed that the VM hosts a container of CFME.
     The ``container`` param then contains the name of the container.
+
+    If ``rails_daemon`` param is True, :py:meth:`run_rails_command` evaluates the commands in a
+    :py:class:`RailsDaemon` instead of starting ``rails runner`` for each of them. It defaults to
+    ``rails_daemon`` under the ``ssh`` key in ``env.yaml``. The daemon is shared by the clients of
+    the host, like the connections.
     """
-    def __init__(self, stream_output=False, **connect_kwargs):
+    def __init__(self, stream_output=False, rails_daemon=None, **connect_kwargs):
         super(SSHClient, self).__init__()
         self._streaming = stream_output
+        if rails_daemon is None:
+            rails_daemon = conf.env.get('ssh', {}).get('rails_daemon', False)
+        self._use_rails_daemon = rails_daemon
         # deprecated/useless karg, included for backward-compat
         self._keystate = connect_kwargs.pop('keystate', None)
         self._container = connect_kwargs.pop('container', None)
@@ -117,7 +488,7 @@ class SSHClient(paramiko.SSHClient):
         default_connect_kwargs.update(connect_kwargs)
         self._connect_kwargs = default_connect_kwargs
         self.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        _client_session.append(self)
+        _client_session.add(self)
 
     @property
     def is_container(self):
@@ -139,7 +510,7 @@ class SSHClient(paramiko.SSHClient):
         new_connect_kwargs.update(connect_kwargs)
         # pass the key state if the hostname is the same, under the assumption that the same
         # host will still have keys installed if they have already been
-        new_client = SSHClient(**new_connect_kwargs)
+        new_client = SSHClient(rails_daemon=self._use_rails_daemon, **new_connect_kwargs)
         return new_client
 
     def __enter__(self):
@@ -166,31 +537,60 @@ class SSHClient(paramiko.SSHClient):
 
     def close(self):
         with diaper:
-            _client_session.remove(self)
-        super(SSHClient, self).close()
+            _client_session.discard(self)
+        # The transport and the rails daemon belong to the connection pool and stay open for the
+        # other clients
+        self._transport = None
 
     @property
     def connected(self):
         return self._transport and self._transport.active
 
+    @property
+    def _credentials_id(self):
+        """Hash of the password and the keys the client authenticates with"""
+        pkey = self._connect_kwargs.get('pkey')
+        credentials = (
+            self._connect_kwargs.get('password'), self._connect_kwargs.get('key_filename'),
+            pkey.get_fingerprint() if pkey is not None else None)
+        return hashlib.sha1(repr(credentials)).hexdigest()
+
+    @property
+    def connection_pool(self):
+        return SSHConnectionPool.get(self._connect_kwargs['hostname'],
+            self._connect_kwargs.get('port', 22), self.username, self._credentials_id)
+
+    def _new_connection(self):
+        self._check_port()
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(**self._connect_kwargs)
+        return client
+
     def connect(self, hostname=None, **kwargs):
-        """See paramiko.SSHClient.connect"""
+        """Take a transport from the connection pool, see paramiko.SSHClient.connect"""
         if hostname and hostname != self._connect_kwargs['hostname']:
             self._connect_kwargs['hostname'] = hostname
             self.close()
 
         if not self.connected:
             self._connect_kwargs.update(kwargs)
-            self._check_port()
-            # Only install ssh keys if they aren't installed (or currently being installed)
-            return super(SSHClient, self).connect(**self._connect_kwargs)
+            self._transport = self.connection_pool.transport(self._new_connection)
+
+    def open_session(self):
+        """Open a session channel over a connection from the pool"""
+        return self.connection_pool.open_session(self._new_connection)
 
     def open_sftp(self, *args, **kwargs):
         if self.is_container:
             logger.warning(
                 'You are about to use sftp on a containerized appliance. It may not work.')
-        self.connect()
-        return super(SSHClient, self).open_sftp(*args, **kwargs)
+        return self.connection_pool.open_sftp(self._new_connection)
+
+    def scp_client(self, **kwargs):
+        """Return a :py:class:`scp.SCPClient` opening its channels over the connection pool"""
+        kwargs.setdefault('progress', self._progress_callback)
+        return SCPClient(PooledTransport(self), **kwargs)
 
     def get_transport(self, *args, **kwargs):
         if self.connected:
@@ -202,17 +602,22 @@ class SSHClient(paramiko.SSHClient):
 
     def run_command(
             self, command, timeout=RUNCMD_TIMEOUT, reraise=False, ensure_host=False,
-            ensure_user=False):
+            ensure_user=False, output_callback=None, max_output=None):
         """Run a command over SSH.
 
         Args:
             command: The command. Supports taking dicts as version picking.
-            timeout: Timeout after which the command execution fails.
+            timeout: Timeout after which the command execution fails, if no output arrives.
             reraise: Does not muffle the paramiko exceptions in the log.
             ensure_host: Ensure that the command is run on the machine with the IP given, not any
                 container or such that we might be using by default.
             ensure_user: Ensure that the command is run as the user we logged in, so in case we are
                 not root, setting this to True will prevent from running sudo.
+            output_callback: Called with every chunk of the output as it arrives, and ``True`` for
+                the chunks coming from stderr.
+            max_output: Maximum number of bytes of the output to keep in memory. A longer output
+                is written to a temporary file, see :py:class:`CommandOutput`, and only its end is
+                returned.
 
         Returns:
             A :py:class:`SSHResult` instance.
@@ -233,34 +638,24 @@ class SSHClient(paramiko.SSHClient):
         logger.info("Running command `{command}`".format(command=command))
         command += '\n'
 
-        output = []
+        def callback(data, stderr):
+            if self._streaming:
+                (sys.stderr if stderr else sys.stdout).write(data)
+            if output_callback is not None:
+                output_callback(data, stderr)
+        output = CommandOutput(max_size=max_output, callback=callback)
+        session = None
         try:
-            session = self.get_transport().open_session()
+            session = self.open_session()
             if uses_sudo:
                 # We need a pseudo-tty for sudo
                 session.get_pty()
             if timeout:
                 session.settimeout(float(timeout))
             session.exec_command(command)
-            stdout = session.makefile()
-            stderr = session.makefile_stderr()
-            while True:
-                if session.recv_ready:
-                    for line in stdout:
-                        output.append(line)
-                        if self._streaming:
-                            sys.stdout.write(line)
-
-                if session.recv_stderr_ready:
-                    for line in stderr:
-                        output.append(line)
-                        if self._streaming:
-                            sys.stderr.write(line)
-
-                if session.exit_status_ready():
-                    break
+            self._read_output(session, output, timeout)
             exit_status = session.recv_exit_status()
-            return SSHResult(exit_status, ''.join(output))
+            return SSHResult(exit_status, output.getvalue())
         except paramiko.SSHException as exc:
             if reraise:
                 raise
@@ -270,12 +665,72 @@ class SSHClient(paramiko.SSHClient):
             logger.error("Command `{command}` timed out.".format(command=command))
             logger.exception(e)
             logger.error("Output of the command before it failed was:\n{output}".format(
-                output=''.join(output)))
+                output=output.getvalue()))
             raise
+        finally:
+            # Gives the channel back to the connection pool
+            if session is not None:
+                session.close()
+            output.close()
 
         # Returning two things so tuple unpacking the return works even if the ssh client fails
         return SSHResult(1, None)
 
+    # Bytes read from a channel at once
+    chunk_size = 32768
+
+    def _read_output(self, session, output, timeout):
+        """Collect the output of the command running in ``session`` until it closes its output
+
+        Sleeps in :py:func:`select.select` until the channel has data, so a long running command
+        doesn't keep the CPU busy. Raises :py:class:`socket.timeout` when nothing arrives for
+        ``timeout`` seconds.
+        """
+        last_data = time()
+        while True:
+            if session.recv_ready():
+                output.write(session.recv(self.chunk_size))
+            elif session.recv_stderr_ready():
+                output.write(session.recv_stderr(self.chunk_size), stderr=True)
+            elif session.eof_received or session.closed:
+                return
+            else:
+                wait = timeout - (time() - last_data) if timeout else None
+                if wait is not None and wait <= 0:
+                    raise socket.timeout('No output for {} seconds'.format(timeout))
+                select.select([session], [], [], wait)
+                continue
+            last_data = time()
+
+    def run_commands(self, commands, timeout=RUNCMD_TIMEOUT, **kwargs):
+        """Run several commands in a single SSH session.
+
+        The commands run one after another in subshells of one remote shell, so like with separate
+        :py:meth:`run_command` calls, ``cd`` or ``exit`` in one of them doesn't affect the others.
+        The output of a command includes its stderr.
+
+        Args:
+            commands: List of commands, each of them can be a dict for version picking.
+            timeout: Timeout after which the execution of all the commands fails.
+            **kwargs: See :py:meth:`run_command`
+
+        Returns:
+            A list of :py:class:`SSHResult` instances, one per command.
+        """
+        commands = [version.pick(c) if isinstance(c, dict) else c for c in commands]
+        delimiter = 'CMD_END_{}'.format(fauxfactory.gen_alphanumeric(16))
+        # The newlines end any comment a command might end with
+        script = ''.join(
+            '(\n{}\n) 2>&1; echo "{}:$?"\n'.format(command, delimiter) for command in commands)
+        result = self.run_command(script, timeout=timeout, **kwargs)
+        if result.output is None:
+            return [result] * len(commands)
+        results = [SSHResult(int(rc), output) for output, rc in re.findall(
+            r'(.*?){}:(\d+)\r?\n'.format(delimiter), result.output, re.DOTALL)]
+        # Commands that didn't get to run, eg. because the shell was killed
+        results.extend([SSHResult(1, '')] * (len(commands) - len(results)))
+        return results
+
     def cpu_spike(self, seconds=60, cpus=2, **kwargs):
         """Creates a CPU spike of specific length and processes.
 
@@ -291,8 +746,29 @@ class SSHClient(paramiko.SSHClient):
             "for ((i=0; i<instances; i++)) do while (($(date +%s) < $endtime)); "
             "do :; done & done".format(seconds, cpus), **kwargs)
 
+    def rails_daemon(self):
+        """Return the running :py:class:`RailsDaemon`, starting it if needed
+
+        Returns ``None`` when the daemon can't be used, so ``rails runner`` has to be.
+        """
+        if not self._use_rails_daemon:
+            return None
+        if self.is_container or self.username != 'root':
+            # sudo needs a pty, which would mangle the requests
+            logger.info('The rails daemon needs a root login without a container, not using it')
+            self._use_rails_daemon = False
+            return None
+        daemon = self.connection_pool.rails_daemon(lambda: RailsDaemon.over_ssh(self))
+        if daemon is None:
+            self._use_rails_daemon = False
+        return daemon
+
     def run_rails_command(self, command, timeout=RUNCMD_TIMEOUT, **kwargs):
         logger.info("Running rails command `{command}`".format(command=command))
+        # the run_command options only apply to rails runner
+        daemon = None if kwargs else self.rails_daemon()
+        if daemon is not None:
+            return daemon.run(command, timeout=timeout)
         return self.run_command('/var/www/miq/vmdb/bin/rails runner {command}'.format(
             command=command), timeout=timeout, **kwargs)
 
@@ -307,18 +783,18 @@ class SSHClient(paramiko.SSHClient):
             local_file=local_file, remote_file=remote_file))
         if self.is_container:
             tempfilename = '/share/temp_{}'.format(fauxfactory.gen_alpha())
-            scp = SCPClient(self.get_transport(), progress=self._progress_callback).put(
+            scp = self.scp_client().put(
                 local_file, tempfilename, **kwargs)
             self.run_command('mv {} {}'.format(tempfilename, remote_file))
             return scp
         else:
             if self.username == 'root':
-                return SCPClient(self.get_transport(), progress=self._progress_callback).put(
+                return self.scp_client().put(
                     local_file, remote_file, **kwargs)
             # scp client is not sudo, may not work for non sudo
             tempfilename = '/home/{user_name}/temp_{random_alpha}'.format(
                 user_name=self.username, random_alpha=fauxfactory.gen_alpha())
-            scp = SCPClient(self.get_transport(), progress=self._progress_callback).put(
+            scp = self.scp_client().put(
                 local_file, tempfilename, **kwargs)
             self.run_command('mv {temp_file} {remote_file}'.format(temp_file=tempfilename,
                                                                    remote_file=remote_file))
@@ -330,12 +806,12 @@ class SSHClient(paramiko.SSHClient):
         if self.is_container:
             tempfilename = '/share/temp_{}'.format(fauxfactory.gen_alpha())
             self.run_command('cp {} {}'.format(remote_file, tempfilename))
-            scp = SCPClient(self.get_transport(), progress=self._progress_callback).get(
+            scp = self.scp_client().get(
                 tempfilename, local_path, **kwargs)
             self.run_command('rm {}'.format(tempfilename))
             return scp
         else:
-            return SCPClient(self.get_transport(), progress=self._progress_callback).get(
+            return self.scp_client().get(
                 remote_file, local_path, **kwargs)
 
     def patch_file(self, local_path, remote_path, md5=None):
@@ -500,12 +976,34 @@ class SSHClient(paramiko.SSHClient):
 
 
 class SSHTail(SSHClient):
-
-    def __init__(self, remote_filename, **connect_kwargs):
+    """Tail of a remote file, yielding the lines appended since the previous read
+
+    New data is fetched over SFTP in large pipelined chunks and split into lines locally. A line
+    still being written is left for the next read. A file that shrank, or whose beginning
+    changed since the previous read, is taken to have been rotated or truncated and is read
+    again from its start.
+
+    Args:
+        remote_filename: Path of the file on the remote host
+        grep: Optional extended regular expression. When given, the new part of the file is
+            filtered with ``grep -E`` on the remote host and only the matching lines are
+            transferred.
+        **connect_kwargs: See :py:class:`SSHClient`
+    """
+    # Bytes requested per read; paramiko pipelines the requests for the whole range
+    chunk_size = 1024 * 1024
+    # Bytes at the beginning of the file that are compared to detect rotation
+    head_size = 256
+    # Bytes read at a time from the end of the new data to find where its last line ends
+    backtrack_size = 4096
+
+    def __init__(self, remote_filename, grep=None, **connect_kwargs):
         super(SSHTail, self).__init__(stream_output=False, **connect_kwargs)
         self._remote_filename = remote_filename
+        self._grep = grep
         self._sftp_client = None
         self._remote_file_size = None
+        self._remote_file_head = ''
 
     def __iter__(self):
         for line in self.raw_lines():
@@ -514,14 +1012,71 @@ class SSHTail(SSHClient):
     def raw_lines(self):
         with self as sshtail:
             fstat = sshtail._sftp_client.stat(self._remote_filename)
-            if self._remote_file_size is not None:
-                if self._remote_file_size < fstat.st_size:
-                    remote_file = self._sftp_client.open(self._remote_filename, 'r')
-                    remote_file.seek(self._remote_file_size, 0)
-                    while (remote_file.tell() < fstat.st_size):
-                        line = remote_file.readline()  # Note the  missing rstrip() here!
+            remote_file = sshtail._sftp_client.open(self._remote_filename, 'r')
+            try:
+                head = remote_file.read(self.head_size)
+                if self._remote_file_size is not None:
+                    if (fstat.st_size < self._remote_file_size or
+                            head[:len(self._remote_file_head)] != self._remote_file_head):
+                        logger.info('%s was rotated or truncated, reading it from the start',
+                            self._remote_filename)
+                        self._remote_file_size = 0
+                    if self._grep:
+                        lines = self._grep_lines(remote_file, self._remote_file_size,
+                            fstat.st_size)
+                    else:
+                        lines = self._read_lines(remote_file, self._remote_file_size,
+                            fstat.st_size)
+                    for line in lines:
                         yield line
-            self._remote_file_size = fstat.st_size
+                else:
+                    self._remote_file_size = fstat.st_size
+                self._remote_file_head = head
+            finally:
+                remote_file.close()
+
+    def _read_lines(self, remote_file, start, end):
+        """Read lines between ``start`` and ``end`` in chunks, moving the tail past them"""
+        remote_file.seek(start)
+        remote_file.prefetch(end)
+        position, rest = start, ''
+        while position < end:
+            chunk = remote_file.read(min(self.chunk_size, end - position))
+            if not chunk:
+                break
+            position += len(chunk)
+            lines = (rest + chunk).split('\n')
+            rest = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        self._remote_file_size = position - len(rest)
+
+    def _line_end(self, remote_file, start, end):
+        """Offset just past the last newline between ``start`` and ``end``, or ``start``"""
+        position = end
+        while position > start:
+            size = min(self.backtrack_size, position - start)
+            remote_file.seek(position - size)
+            newline = remote_file.read(size).rfind('\n')
+            if newline >= 0:
+                return position - size + newline + 1
+            position -= size
+        return start
+
+    def _grep_lines(self, remote_file, start, end):
+        """Filter the lines between ``start`` and ``end`` on the remote host"""
+        # like _read_lines, leave a line still being written for the next read
+        end = self._line_end(remote_file, start, end)
+        if end > start:
+            result = self.run_command('tail -c +{} {} | head -c {} | grep -E -e {}'.format(
+                start + 1, quote(self._remote_filename), end - start, quote(self._grep)))
+            # grep exits with 1 if nothing matched
+            if result.rc > 1:
+                raise Exception('Filtering {} on the remote host failed: {}'.format(
+                    self._remote_filename, result.output))
+            for line in result.output.splitlines(True):
+                yield line
+        self._remote_file_size = end
 
     def raw_string(self):
         return ''.join(self)
@@ -538,6 +1093,8 @@ class SSHTail(SSHClient):
         with self as sshtail:
             fstat = sshtail._sftp_client.stat(self._remote_filename)
             self._remote_file_size = fstat.st_size  # Seed initial size of file
+            with sshtail._sftp_client.open(self._remote_filename, 'r') as remote_file:
+                self._remote_file_head = remote_file.read(self.head_size)
 
     def lines_as_list(self):
         """Return lines as list"""
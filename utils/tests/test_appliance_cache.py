@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from time import time
+
+import pytest
+
+from utils import clear_property_cache, pickle_file
+from utils.appliance.cache import PropertyCache, persistent_property
+
+
+class FakeAppliance(object):
+    def __init__(self, path, stamp='boot-1', ttl=3600):
+        self.stamp = stamp
+        self.lookups = 0
+        self.property_cache = PropertyCache(path, lambda: self.stamp, ttl)
+
+    @persistent_property
+    def version(self):
+        self.lookups += 1
+        return '5.8.0.{}'.format(self.lookups)
+
+
+@pytest.fixture
+def cache_path(tmpdir):
+    return tmpdir.join('cache', 'appliance.pickle').strpath
+
+
+def test_value_shared_between_processes(cache_path):
+    first = FakeAppliance(cache_path)
+    assert first.version == '5.8.0.1'
+    assert first.version == '5.8.0.1'
+    assert first.lookups == 1
+
+    second = FakeAppliance(cache_path)
+    assert second.version == '5.8.0.1'
+    assert second.lookups == 0
+
+
+def test_stale_entries(cache_path, monkeypatch):
+    FakeAppliance(cache_path).version
+    # rebooted or replaced appliance
+    rebooted = FakeAppliance(cache_path, stamp='boot-2')
+    rebooted.version
+    assert rebooted.lookups == 1
+    # too old
+    stored = time()
+    monkeypatch.setattr(pickle_file, 'time', lambda: stored + 7200)
+    expired = FakeAppliance(cache_path, stamp='boot-2')
+    expired.version
+    assert expired.lookups == 1
+
+
+def test_discard(cache_path):
+    appliance = FakeAppliance(cache_path)
+    appliance.version
+    appliance.property_cache.discard('version')
+    clear_property_cache(appliance, 'version')
+    assert appliance.version == '5.8.0.2'
+    assert FakeAppliance(cache_path).version == '5.8.0.2'
+
+    appliance.property_cache.discard()
+    assert FakeAppliance(cache_path).version == '5.8.0.1'
+
+
+def test_broken_stamp(cache_path):
+    appliance = FakeAppliance(cache_path)
+
+    def stamp():
+        raise IOError('SSH is unavailable')
+    appliance.property_cache = PropertyCache(cache_path, stamp, 3600)
+    assert appliance.version == '5.8.0.1'
+    # nothing was stored
+    other = FakeAppliance(cache_path)
+    other.version
+    assert other.lookups == 1
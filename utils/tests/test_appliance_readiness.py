@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+from time import time
+
+from utils.appliance.readiness import wait_for_appliances
+
+
+class FakeAppliance(object):
+    def __init__(self, name, failures):
+        self.name = name
+        # number of times every check fails before passing, None for never passing
+        self.failures = failures
+        self.calls = []
+
+    def check(self, name):
+        self.calls.append(name)
+        failures = self.failures.get(name, 0)
+        if failures is None or self.calls.count(name) <= failures:
+            if name == 'db':
+                raise IOError('database not there yet')
+            return False
+        return True
+
+    def __repr__(self):
+        return 'FakeAppliance({!r})'.format(self.name)
+
+
+CHECKS = OrderedDict(
+    (name, lambda appliance, name=name: appliance.check(name)) for name in ['ssh', 'db', 'ui'])
+
+
+def test_appliances_probed_together():
+    appliances = [FakeAppliance(str(i), {'ssh': 1, 'db': 2}) for i in range(20)]
+    start = time()
+    statuses = wait_for_appliances(appliances, checks=CHECKS, delay=0.05, max_delay=0.1)
+    # every appliance waits 0.05s + 0.05s + 0.1s, sequential probing would take twenty times that
+    assert time() - start < 1
+    assert list(statuses) == appliances
+    for appliance, status in statuses.items():
+        assert status.ready
+        assert status.failed is None
+        assert appliance.calls == ['ssh', 'ssh', 'db', 'db', 'db', 'ui']
+        assert list(status.checks) == ['ssh', 'db', 'ui']
+        assert 0 < status.checks['ssh'] <= status.checks['db'] <= status.checks['ui']
+        assert status.elapsed == status.checks['ui']
+
+
+def test_appliance_not_ready():
+    ready = FakeAppliance('ready', {})
+    broken = FakeAppliance('broken', {'db': None})
+    statuses = wait_for_appliances(
+        [ready, broken], checks=CHECKS, timeout=0.3, delay=0.05, max_delay=0.1)
+    assert statuses[ready].ready
+    assert not statuses[broken].ready
+    assert statuses[broken].failed == 'db'
+    assert statuses[broken].checks['ssh'] is not None
+    assert statuses[broken].checks['ui'] is None
+    assert 'ui' not in broken.calls
+    # the retries back off: 0.05s, 0.1s, 0.1s
+    assert 3 <= broken.calls.count('db') <= 5
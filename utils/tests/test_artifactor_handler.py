@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import pytest
+
+from utils.log import ArtifactorHandler
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.batches = []
+
+    def fire_hook(self, hook_name, log_records, slaveid):
+        assert hook_name == 'log_message'
+        self.batches.append(list(log_records))
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    client = FakeClient()
+    handler = ArtifactorHandler(capacity=5, batch_size=2, interval=0.05)
+    handler.client = client
+    monkeypatch.setattr(handler, '_connect', lambda: client)
+    log = logging.getLogger('test_artifactor_handler')
+    log.propagate = False
+    log.setLevel(logging.DEBUG)
+    log.addHandler(handler)
+    yield handler, log
+    log.removeHandler(handler)
+    handler.close()
+
+
+def test_batches(handler):
+    handler, log = handler
+    log.warning('before start')
+    handler.start('127.0.0.1', 21212, slaveid='gw0')
+    for i in range(3):
+        log.warning('message %d', i)
+    handler.flush()
+    entries = [entry for batch in handler.client.batches for entry in batch]
+    assert [entry[4] for entry in entries] == ['message 0', 'message 1', 'message 2']
+    assert all(len(batch) <= 2 for batch in handler.client.batches)
+
+    record = ArtifactorHandler.expand(entries[0])
+    assert (record.levelname, record.getMessage()) == ('WARNING', 'message 0')
+    assert record.pathname.endswith('test_artifactor_handler.py')
+
+
+def test_drops_when_full(handler, monkeypatch):
+    handler, log = handler
+    # Hold the sender back, so the buffer fills up
+    monkeypatch.setattr(handler, 'batch_size', 100)
+    monkeypatch.setattr(handler, 'interval', 10)
+    handler.start('127.0.0.1', 21212)
+    for i in range(7):
+        log.info('message %d', i)
+    assert handler.dropped == 2
+    handler.close()
+    assert sum(len(batch) for batch in handler.client.batches) == 5
+
+
+def test_survives_failed_batches(handler):
+    handler, log = handler
+    fire_hook = handler.client.fire_hook
+    failures = []
+
+    def failing_fire_hook(hook_name, log_records, slaveid):
+        if not failures:
+            failures.append(log_records)
+            raise IOError('artifactor went away')
+        fire_hook(hook_name, log_records, slaveid)
+    handler.client.fire_hook = failing_fire_hook
+    handler.start('127.0.0.1', 21212)
+    log.warning('lost')
+    handler.flush()
+    log.warning('sent')
+    handler.flush()
+    assert handler.dropped == 1
+    assert [entry[4] for batch in handler.client.batches for entry in batch] == ['sent']
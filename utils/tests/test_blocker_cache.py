@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from time import time
+
+import pytest
+
+from utils import blocker_cache
+from utils.blocker_cache import BlockerCache
+from utils.bz import Bugzilla
+
+
+class FakeBug(object):
+    def __init__(self, id, blocks=(), clone_of=None, dupe_of=None):
+        self.id = id
+        self.blocks = list(blocks)
+        self.comments = [{'text': ''}]
+        if clone_of is not None:
+            self.comments[0]['text'] = (
+                '+++ This bug was initially created as a clone of Bug #{} +++'.format(clone_of))
+        self.status, self.resolution = ('CLOSED', 'DUPLICATE') if dupe_of else ('NEW', '')
+        self.dupe_of = dupe_of
+        self.bugzilla = 'connection'
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['bugzilla']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, bugzilla=None)
+
+
+class FakeBugzillaAPI(object):
+    BUGS = {bug.id: bug for bug in [
+        FakeBug(100, blocks=[101, 500]),
+        FakeBug(101, clone_of=100),
+        FakeBug(102, dupe_of=103),
+        FakeBug(103, blocks=[104]),
+        FakeBug(104, clone_of=103),
+        FakeBug(500, blocks=[600])]}
+
+    def __init__(self):
+        self.calls = []
+
+    def getbug(self, id):
+        self.calls.append(id)
+        return self.BUGS[id]
+
+    def getbugs(self, ids):
+        self.calls.append(list(ids))
+        return [self.BUGS.get(id) for id in ids]
+
+
+def make_bugzilla(path):
+    bugzilla = Bugzilla(cache=BlockerCache(path, 3600))
+    bugzilla.bugzilla = FakeBugzillaAPI()
+    bugzilla.loose = []
+    return bugzilla
+
+
+@pytest.fixture
+def cache_path(tmpdir):
+    return tmpdir.join('blocker_cache', 'bugzilla.pickle').strpath
+
+
+def test_prefetch_in_batches(cache_path):
+    bugzilla = make_bugzilla(cache_path)
+    bugzilla.prefetch([100, 102, 999])
+    assert bugzilla.bugzilla.calls == [[100, 102, 999], [101, 500], [103], [104]]
+    assert set(bug.id for bug in bugzilla.get_bug_variants(102)) == {103, 104}
+    assert bugzilla.bugzilla.calls[4:] == []
+
+
+def test_shared_between_processes(cache_path):
+    make_bugzilla(cache_path).get_bug_variants(100)
+
+    bugzilla = make_bugzilla(cache_path)
+    assert set(bug.id for bug in bugzilla.get_bug_variants(100)) == {100, 101}
+    assert bugzilla.bugzilla.calls == []
+    # loaded bugs are connected only when they need to be
+    assert bugzilla.get_bug(100)._bug.bugzilla is None
+
+
+def test_entries_expire(cache_path, monkeypatch):
+    cache = BlockerCache(cache_path, 3600)
+    cache.update({'first': 1})
+    stored = time()
+    monkeypatch.setattr(blocker_cache, 'time', lambda: stored + 1800)
+    cache.update({'second': 2})
+    monkeypatch.setattr(blocker_cache, 'time', lambda: stored + 4000)
+    other = BlockerCache(cache_path, 3600)
+    assert other.get_many(['first', 'second']) == {'second': 2}
+    with pytest.raises(KeyError):
+        cache.get('first')
+    assert BlockerCache(cache_path, 0).get_many(['second']) == {}
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sqlalchemy import event
+
+from utils import db as db_module
+from utils.db import Db
+
+
+@pytest.fixture
+def database(tmpdir, monkeypatch):
+    monkeypatch.setattr(db_module, 'log_path', tmpdir.join('log'))
+    path = tmpdir.join('vmdb.sqlite').strpath
+    db = make_db(path)
+    for statement in [
+            'CREATE TABLE schema_migrations (version VARCHAR PRIMARY KEY)',
+            "INSERT INTO schema_migrations VALUES ('20170101000000')",
+            'CREATE TABLE zones (id INTEGER PRIMARY KEY, name VARCHAR)',
+            'CREATE TABLE hosts (id INTEGER PRIMARY KEY, name VARCHAR, '
+            'zone_id INTEGER REFERENCES zones(id))',
+            "INSERT INTO zones VALUES (1, 'default')"]:
+        db.engine.execute(statement)
+    return path
+
+
+class FakeAppliance(object):
+    version = '5.8.0.1'
+
+
+def make_db(path, appliance=None):
+    db = Db(hostname='localhost', credentials={'username': 'root', 'password': ''},
+        appliance=appliance)
+    db.db_url = 'sqlite:///{}'.format(path)
+    db.queries = []
+    event.listen(db.engine, 'before_cursor_execute',
+        lambda conn, cursor, statement, *args: db.queries.append(statement))
+    return db
+
+
+def test_schema_cached(database):
+    db = make_db(database)
+    db.prefetch('zones', 'hosts')
+    assert db.schema_cache_path.endswith(
+        'vmdb_unknown_20170101000000_1_sqlalchemy_{}.pickle'.format(
+            db_module.sqlalchemy.__version__))
+    assert 'zones' in db
+
+    # another process only asks for the schema version
+    db = make_db(database)
+    assert db.session.query(db['zones']).one().name == 'default'
+    assert db['hosts'].zone_id is not None
+    assert 'hosts' in db
+    assert [q for q in db.queries if 'zones' not in q] == [
+        'SELECT count(*), max(version) FROM schema_migrations']
+
+
+def test_schema_changed(database):
+    make_db(database).prefetch('zones')
+    db = make_db(database)
+    db.engine.execute("INSERT INTO schema_migrations VALUES ('20170202000000')")
+    db.engine.execute('ALTER TABLE zones ADD COLUMN description VARCHAR')
+    assert db['zones'].description is not None
+
+
+def test_schema_backported_migration(database):
+    make_db(database).prefetch('zones')
+    db = make_db(database)
+    # an older migration doesn't change the newest one
+    db.engine.execute("INSERT INTO schema_migrations VALUES ('20161212000000')")
+    db.engine.execute('ALTER TABLE zones ADD COLUMN description VARCHAR')
+    assert db['zones'].description is not None
+
+
+def test_schema_cache_per_appliance_version(database):
+    db = make_db(database, appliance=FakeAppliance())
+    assert db.schema_cache_path.endswith(
+        'vmdb_5.8.0.1_20170101000000_1_sqlalchemy_{}.pickle'.format(
+            db_module.sqlalchemy.__version__))
+    assert make_db(database).schema_cache_path != db.schema_cache_path
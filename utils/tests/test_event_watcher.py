@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, String, create_engine, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from utils.events import EventTool
+
+Base = declarative_base()
+
+
+class EventStream(Base):
+    __tablename__ = 'event_streams'
+    id = Column(Integer, primary_key=True)
+    type = Column(String)
+    timestamp = Column(DateTime)
+    message = Column(String)
+    target_type = Column(String)
+    target_id = Column(Integer)
+    event_type = Column(String)
+
+
+class Vm(Base):
+    __tablename__ = 'vms'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+class FakeDb(dict):
+    def __init__(self):
+        super(FakeDb, self).__init__(event_streams=EventStream, vms=Vm)
+        self.engine = create_engine('sqlite://')
+        self.queries = []
+        event.listen(self.engine, 'before_cursor_execute',
+            lambda conn, cursor, statement, *args: self.queries.append(statement))
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)(autocommit=True)
+
+    def add(self, row):
+        with self.session.begin():
+            self.session.add(row)
+
+
+Expectation = namedtuple('Expectation', ['target_type', 'target_id', 'event_type', 'time'])
+FakeAppliance = namedtuple('FakeAppliance', ['db'])
+
+
+@pytest.fixture
+def db():
+    db = FakeDb()
+    for i in range(5):
+        db.add(EventStream(
+            type='MiqEvent', timestamp=datetime.utcnow(), target_type='VmOrTemplate',
+            target_id=1, event_type='vm_start'))
+    return db
+
+
+def add_event(db, target_id, event_type, type='MiqEvent'):
+    db.add(EventStream(
+        type=type, timestamp=datetime.utcnow(), target_type='VmOrTemplate',
+        target_id=target_id, event_type=event_type, message=event_type))
+
+
+def test_watcher_ignores_old_events(db):
+    watcher = EventTool(FakeAppliance(db)).watcher()
+    assert watcher.cursor == 5
+    expectation = Expectation('VmOrTemplate', 1, 'vm_start', datetime.utcnow() - timedelta(1))
+    watcher.expect(expectation)
+    assert watcher.poll() == []
+
+    add_event(db, 1, 'vm_start')
+    add_event(db, 1, 'vm_start', type='EmsEvent')
+    del db.queries[:]
+    matches = watcher.poll()
+    assert len(db.queries) == 1
+    assert [(exp, event['id']) for exp, event in matches] == [(expectation, 6)]
+    assert watcher.cursor == 6
+    # every event matches once
+    add_event(db, 1, 'vm_start')
+    assert watcher.poll() == []
+    assert [event['id'] for event in watcher.events] == [6, 8]
+
+
+def test_watcher_matches_by_name_and_time(db):
+    watcher = EventTool(FakeAppliance(db)).watcher()
+    by_name = Expectation('VmOrTemplate', 'my-vm', 'vm_stop', datetime.utcnow() - timedelta(1))
+    too_late = Expectation('VmOrTemplate', 1, 'vm_stop', datetime.utcnow() + timedelta(1))
+    watcher.expect(by_name)
+    watcher.expect(too_late)
+    # the VM is not in the database yet
+    assert watcher.poll() == []
+    db.add(Vm(id=2, name='my-vm'))
+    add_event(db, 2, 'vm_stop')
+    add_event(db, 1, 'vm_stop')
+    assert [(exp, event['id']) for exp, event in watcher.poll()] == [(by_name, 6)]
+
+    watcher.reset()
+    assert watcher.cursor == 7
+    assert watcher.events == []
+    add_event(db, 2, 'vm_stop')
+    assert watcher.poll() == []
+
+
+def test_watcher_matches_events_before_target_resolves(db):
+    watcher = EventTool(FakeAppliance(db)).watcher()
+    late = Expectation('VmOrTemplate', 'late-vm', 'vm_stop', datetime.utcnow() - timedelta(1))
+    watcher.expect(late)
+    # the event is recorded before the VM gets into the database
+    add_event(db, 2, 'vm_stop')
+    assert watcher.poll() == []
+    db.add(Vm(id=2, name='late-vm'))
+    assert [(exp, event['id']) for exp, event in watcher.poll()] == [(late, 6)]
+    assert watcher.poll() == []
+
+
+def test_watcher_reads_events_committed_out_of_order(db):
+    watcher = EventTool(FakeAppliance(db)).watcher()
+    expectation = Expectation('VmOrTemplate', 1, 'vm_start', datetime.utcnow() - timedelta(1))
+    watcher.expect(expectation)
+    db.add(EventStream(
+        id=8, type='MiqEvent', timestamp=datetime.utcnow(), target_type='VmOrTemplate',
+        target_id=3, event_type='vm_start'))
+    assert watcher.poll() == []
+    assert watcher.cursor == 8
+    # a lower id committed later
+    add_event(db, 1, 'vm_start')
+    db.add(EventStream(
+        id=7, type='MiqEvent', timestamp=datetime.utcnow(), target_type='VmOrTemplate',
+        target_id=1, event_type='vm_start'))
+    assert [(exp, event['id']) for exp, event in watcher.poll()] == [(expectation, 7)]
+    assert sorted(event['id'] for event in watcher.events) == [7, 8, 9]
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from utils import log_validator
+from utils.log_validator import LogValidator, LogWatch
+
+
+class FakeTail(object):
+    instances = []
+
+    def __init__(self, remote_filename, **connect_kwargs):
+        self.lines = []
+        self.position = None
+        self.closed = False
+        FakeTail.instances.append(self)
+
+    def set_initial_file_end(self):
+        self.position = len(self.lines)
+
+    def __iter__(self):
+        if self.position is not None:
+            for line in self.lines[self.position:]:
+                yield line
+        self.position = len(self.lines)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_tail(monkeypatch):
+    monkeypatch.setattr(log_validator, 'SSHTail', FakeTail)
+    monkeypatch.setattr(LogWatch, '_watches', {})
+    FakeTail.instances = []
+    return FakeTail
+
+
+def test_validators_share_tail(fake_tail):
+    errors = LogValidator('evm.log', hostname='appliance', failure_patterns=['.*ERROR.*'],
+        skip_patterns=['.*ERROR.*api_error.*'])
+    infos = LogValidator('evm.log', hostname='appliance', matched_patterns=['.*INFO.*done'])
+    LogValidator('evm.log', hostname='other_appliance')
+    assert len(fake_tail.instances) == 2
+    tail = fake_tail.instances[0]
+
+    tail.lines.append('ERROR before the test')
+    errors.fix_before_start()
+    tail.lines.append('ERROR in api_error')
+    infos.fix_before_start()
+    tail.lines.append('INFO -- : all done')
+
+    errors.validate_logs()
+    infos.validate_logs()
+    assert infos.matches == {'.*INFO.*done': True}
+
+    tail.lines.append('ERROR for real')
+    with pytest.raises(pytest.fail.Exception):
+        errors.validate_logs()
+    # already read through the shared tail
+    assert errors.failures == [('.*ERROR.*', 'ERROR for real')]
+
+
+def test_missing_match(fake_tail):
+    validator = LogValidator('evm.log', hostname='appliance', matched_patterns=['.*INFO.*'])
+    validator.fix_before_start()
+    fake_tail.instances[0].lines.append('DEBUG only')
+    with pytest.raises(pytest.fail.Exception):
+        validator.validate_logs()
+
+
+def test_backreferences_disable_prefilter(fake_tail):
+    validator = LogValidator('evm.log', hostname='appliance', matched_patterns=[r'(a)\1'])
+    other = LogValidator('evm.log', hostname='appliance', matched_patterns=['(b)'])
+    validator.fix_before_start()
+    other.fix_before_start()
+    assert validator._watch._prefilter is None
+    fake_tail.instances[0].lines.append('aa')
+    validator.validate_logs()
+
+
+def test_unused_watches_closed(fake_tail):
+    validator = LogValidator('evm.log', hostname='appliance')
+    validator.fix_before_start()
+    kept = LogValidator('evm.log', hostname='appliance')
+    del validator
+    # the watch of the validator that went away is closed, the new validator gets a new one
+    other = LogValidator('evm.log', hostname='other_appliance')
+    other.fix_before_start()
+    assert fake_tail.instances[0].closed
+    assert LogWatch._watches.keys() == [('other_appliance', 22, 'evm.log')]
+    kept.fix_before_start()
+    assert len(fake_tail.instances) == 3
+    assert not fake_tail.instances[2].closed
+
+
+def test_fix_again_forgets_earlier_lines(fake_tail):
+    validator = LogValidator('evm.log', hostname='appliance', failure_patterns=['.*ERROR.*'])
+    other = LogValidator('evm.log', hostname='appliance', failure_patterns=['.*ERROR.*'])
+    validator.fix_before_start()
+    other.fix_before_start()
+    tail = fake_tail.instances[0]
+    tail.lines.append('ERROR in the first test')
+    with pytest.raises(pytest.fail.Exception):
+        validator.validate_logs()
+
+    tail.lines.append('ERROR between the tests')
+    validator.fix_before_start()
+    validator.validate_logs()
+    # the other validator still got the line written before the new start
+    assert other.failures == [
+        ('.*ERROR.*', 'ERROR in the first test'), ('.*ERROR.*', 'ERROR between the tests')]
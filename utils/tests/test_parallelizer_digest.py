@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from fixtures.parallelizer.remote import CollectionDigest, mismatched_chunks
+
+
+collection = ['test_module{}.py::test_{}'.format(i // 50, i) for i in range(1000)]
+
+
+def test_equal_collections():
+    digest = CollectionDigest(collection)
+    assert digest.root == CollectionDigest(reversed(collection)).root
+    assert digest.node_ids(range(len(digest.chunks))) == sorted(collection)
+
+
+def test_mismatched_chunks():
+    master = CollectionDigest(collection)
+    slave_collection = list(collection)
+    slave_collection.remove('test_module3.py::test_160')
+    slave_collection.append('test_module3.py::test_160x')
+    slave = CollectionDigest(slave_collection)
+    assert master.root != slave.root
+
+    master_ids = master.node_ids(mismatched_chunks(master.chunk_digests, slave.chunk_digests))
+    slave_ids = slave.node_ids(mismatched_chunks(slave.chunk_digests, master.chunk_digests))
+    # only the chunks around the change differ, not the whole collection
+    assert 'test_module3.py::test_160' in master_ids
+    assert 'test_module3.py::test_160x' in slave_ids
+    assert len(master_ids) < len(collection) / 4
+    assert set(master_ids) ^ set(slave_ids) == {
+        'test_module3.py::test_160', 'test_module3.py::test_160x'}
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from fixtures.parallelizer.durations import DurationStore, lpt_groups, lpt_makespan
+
+
+@pytest.fixture
+def durations(tmpdir):
+    durations_file = tmpdir.join('durations.json')
+    durations_file.write(json.dumps({
+        'test_a.py::test_long': 100.,
+        'test_a.py::test_short': 10.,
+        'test_b.py::test_1': 20.,
+        'test_b.py::test_2': 30.,
+    }))
+    return DurationStore(durations_file)
+
+
+def test_predict(durations):
+    assert durations.predict('test_a.py::test_long') == 100.
+    # unknown tests get the median
+    assert durations.predict('test_c.py::test_new') == 30.
+    assert durations.predict_group(['test_b.py::test_1', 'test_b.py::test_2']) == 50.
+
+
+def test_save(durations, tmpdir):
+    durations.record('test_c.py::test_new', 1.)
+    durations.record('test_c.py::test_new', 2.)
+    durations.save()
+    saved = DurationStore(durations.path)
+    assert saved.predict('test_c.py::test_new') == 3.
+    assert saved.predict('test_a.py::test_long') == 100.
+
+
+def test_no_history(tmpdir):
+    durations = DurationStore(tmpdir.join('missing.json'))
+    groups = [['a'], ['b', 'c']]
+    assert [group for _, group in lpt_groups(groups, durations, 2)] == groups
+
+
+def test_lpt(durations):
+    groups = [
+        ['test_b.py::test_1', 'test_b.py::test_2'],
+        ['test_a.py::test_short', 'test_a.py::test_long'],
+    ]
+    weighted = lpt_groups(groups, durations, 2)
+    # test_a is longer than half the run, so it is split, then everything is sorted longest first
+    assert weighted == [
+        (100., ['test_a.py::test_long']),
+        (50., ['test_b.py::test_1', 'test_b.py::test_2']),
+        (10., ['test_a.py::test_short']),
+    ]
+    assert lpt_makespan([duration for duration, _ in weighted], 2) == 100.
+
+
+def test_lpt_keeps_unsplittable_groups(durations):
+    groups = [
+        ['test_b.py::test_1', 'test_b.py::test_2'],
+        ['test_a.py::test_short', 'test_a.py::test_long'],
+    ]
+    weighted = lpt_groups(groups, durations, 2,
+        splittable=lambda group: not group[0].startswith('test_a.py'))
+    # test_a shares module fixtures, so it stays whole
+    assert weighted == [
+        (110., ['test_a.py::test_short', 'test_a.py::test_long']),
+        (50., ['test_b.py::test_1', 'test_b.py::test_2']),
+    ]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from functools import partial
+
+import pytest
+
+from fixtures.parallelizer.scheduler import ProviderScheduler, provider_switch_cost
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = ProviderScheduler(['vsphere5', 'vsphere55', 'rhevm'])
+    for group in (
+            ['test_a.py::test_plain'],
+            ['test_b.py::test_prov[vsphere55]', 'test_b.py::test_other[vsphere55]'],
+            ['test_b.py::test_prov[rhevm]'],
+            ['test_c.py::test_prov[vsphere55]'],
+            ['test_c.py::test_param[1]']):
+        scheduler.add(group)
+    return scheduler
+
+
+def test_provider_for(scheduler):
+    assert scheduler.provider_for(['test_a.py::test_plain']) is None
+    assert scheduler.provider_for(['test_a.py::test_x[foo]']) is None
+    # longest matching key wins
+    assert scheduler.provider_for(['test_a.py::test_x[vsphere55]']) == 'vsphere55'
+    assert scheduler.provider_for(['test_a.py::test_x[vsphere5]']) == 'vsphere5'
+
+
+def test_affinity(scheduler):
+    assert len(scheduler) == 5
+    assert scheduler.pop('slave00') == (['test_a.py::test_plain'], None, 0)
+    group, provider, cost = scheduler.pop('slave00')
+    assert (provider, cost) == ('vsphere55', 0)
+    # slave01 has no providers, so it takes the next group in order
+    assert scheduler.pop('slave01')[1:] == ('rhevm', 0)
+    # slave00 keeps its provider and skips over nothing it can't run
+    assert scheduler.pop('slave00')[1:] == ('vsphere55', 0)
+    assert scheduler.pop('slave00')[1:] == (None, 0)
+    assert scheduler.allocation == {'slave00': ['vsphere55'], 'slave01': ['rhevm']}
+    with pytest.raises(IndexError):
+        scheduler.pop('slave00')
+
+
+def test_switch(scheduler):
+    scheduler.pop('slave00')
+    scheduler.pop('slave00')
+    scheduler.pop('slave00')
+    scheduler.pop('slave00')
+    assert scheduler.allocation['slave00'] == ['vsphere55']
+    # only a rhevm group is left; slave00 has to be cleansed to run it
+    assert scheduler.pop('slave00') == (['test_b.py::test_prov[rhevm]'], 'rhevm', 1)
+    assert scheduler.allocation['slave00'] == ['rhevm']
+
+
+def test_custom_switch_cost():
+    scheduler = ProviderScheduler(['rhevm', 'vsphere55'],
+        switch_cost=partial(provider_switch_cost, limit=2))
+    scheduler.add(['test_a.py::test_prov[rhevm]'])
+    scheduler.add(['test_a.py::test_prov[vsphere55]'])
+    assert scheduler.pop('slave00')[1:] == ('rhevm', 0)
+    assert scheduler.pop('slave00')[1:] == ('vsphere55', 0)
+    assert scheduler.allocation['slave00'] == ['rhevm', 'vsphere55']
+
+
+def test_accepts(scheduler):
+    scheduler.allocate('slave00', 'rhevm')
+    assert scheduler.accepts('slave00', 'rhevm')
+    assert scheduler.accepts('slave00', None)
+    assert not scheduler.accepts('slave00', 'vsphere55')
+    # slaves without providers take anything
+    assert scheduler.accepts('slave01', 'vsphere55')
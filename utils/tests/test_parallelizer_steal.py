@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import OrderedDict, defaultdict, deque
+
+import pytest
+
+from fixtures.parallelizer import ParallelSession, remote
+from fixtures.parallelizer.scheduler import ProviderScheduler
+
+
+class FakeSlave(object):
+    returncode = None
+
+    def poll(self):
+        return self.returncode
+
+
+class FakeDurations(object):
+    def __init__(self, durations):
+        self.durations = durations
+
+    def predict_group(self, test_group):
+        return sum(self.durations.get(nodeid, 1.) for nodeid in test_group)
+
+
+@pytest.fixture
+def session():
+    session = ParallelSession.__new__(ParallelSession)
+    session.slaves = {slaveid: FakeSlave() for slaveid in ('slave00', 'slave01', 'slave02')}
+    session.slave_urls = dict.fromkeys(session.slaves, 'https://appliance')
+    session.slave_tests = defaultdict(set)
+    session.slave_unstarted = defaultdict(OrderedDict)
+    session.steals = {}
+    session.scheduler = ProviderScheduler(['rhevm', 'vsphere55'])
+    session.durations = FakeDurations({})
+    session.failed_slave_test_groups = deque()
+    session.collection = dict.fromkeys(range(100))
+    session.sent_tests = 0
+    session.runtest_start = None
+    session.log = logging.getLogger('test_parallelizer_steal')
+    session.sent = []
+    session.send = lambda slaveid, data: session.sent.append((slaveid, data))
+    session.print_message = lambda *args, **kwargs: None
+    session._start_slave = lambda slaveid: None
+
+    def get(slaveid):
+        # all the groups have been handed out
+        raise StopIteration
+    session.get = get
+    return session
+
+
+def give(session, slaveid, tests):
+    session.slave_tests[slaveid] |= set(tests)
+    session.slave_unstarted[slaveid].update((test, None) for test in tests)
+
+
+def start(session, slaveid, test):
+    # what the runtest_logstart event does
+    session.slave_unstarted[slaveid].pop(test, None)
+
+
+def test_victim_by_backlog(session):
+    give(session, 'slave00', ['a.py::t1', 'a.py::t2', 'a.py::t3', 'a.py::t4'])
+    give(session, 'slave01', ['b.py::t1', 'b.py::t2', 'b.py::t3', 'b.py::t4'])
+    session.durations = FakeDurations({'b.py::t1': 100.})
+    assert session.steal_tests('slave02', 7)
+    # the most backlogged slave gives up the tail half of its unstarted tests
+    assert session.sent == [('slave01', {'revoke': ['b.py::t3', 'b.py::t4']})]
+    assert session.steals == {'slave01': ('slave02', 7)}
+    # a slave already involved in a steal is left alone
+    session.sent = []
+    assert session.steal_tests('slave00', 8) is False
+    assert session.sent == []
+
+
+def test_tail_keeps_one_provider(session):
+    give(session, 'slave00', ['a.py::t1', 'a.py::t2', 'a.py::t3', 'a.py::t[rhevm]',
+        'a.py::t1[vsphere55]', 'a.py::t2[vsphere55]'])
+    assert session.steal_tests('slave01', 1)
+    assert session.sent == [
+        ('slave00', {'revoke': ['a.py::t1[vsphere55]', 'a.py::t2[vsphere55]']})]
+
+
+def test_incompatible_thief(session):
+    give(session, 'slave00', ['a.py::t1', 'a.py::t2', 'a.py::t1[vsphere55]',
+        'a.py::t2[vsphere55]'])
+    session.scheduler.allocate('slave01', 'rhevm')
+    assert session.steal_tests('slave01', 1) is False
+    # nothing to steal, so the thief is told there are no more tests
+    assert session.send_tests('slave01', 1) == []
+    assert session.sent == [('slave01', {'seq': 1, 'reply': []})]
+
+
+def test_started_tests_not_resent(session):
+    give(session, 'slave00', ['a.py::t1', 'a.py::t2', 'a.py::t3', 'a.py::t4'])
+    assert session.send_tests('slave02', 3) == []
+    assert session.sent.pop() == ('slave00', {'revoke': ['a.py::t3', 'a.py::t4']})
+    # the victim started t3 before it got the revoke
+    start(session, 'slave00', 'a.py::t1')
+    start(session, 'slave00', 'a.py::t2')
+    start(session, 'slave00', 'a.py::t3')
+    session.finish_steal('slave00', ['a.py::t4'])
+    assert session.sent == [('slave02', {'seq': 3, 'reply': ['a.py::t4']})]
+    assert session.slave_tests['slave00'] == {'a.py::t1', 'a.py::t2', 'a.py::t3'}
+    assert session.slave_tests['slave02'] == {'a.py::t4'}
+    assert list(session.slave_unstarted['slave02']) == ['a.py::t4']
+    assert not session.steals
+
+
+def test_empty_revoke_retries(session):
+    give(session, 'slave00', ['a.py::t1', 'a.py::t2'])
+    give(session, 'slave01', ['b.py::t1', 'b.py::t2', 'b.py::t3'])
+    assert session.send_tests('slave02', 5) == []
+    assert session.sent.pop() == ('slave01', {'revoke': ['b.py::t2', 'b.py::t3']})
+    # slave01 started everything in the meantime
+    for test in ['b.py::t1', 'b.py::t2', 'b.py::t3']:
+        start(session, 'slave01', test)
+    session.finish_steal('slave01', [])
+    # the thief's request is retried against the next victim
+    assert session.sent == [('slave00', {'revoke': ['a.py::t2']})]
+    assert session.steals == {'slave00': ('slave02', 5)}
+    session.sent = []
+    session.finish_steal('slave00', ['a.py::t2'])
+    assert session.sent == [('slave02', {'seq': 5, 'reply': ['a.py::t2']})]
+
+
+def test_victim_dies_during_steal(session):
+    give(session, 'slave00', ['a.py::t1', 'a.py::t2', 'a.py::t3', 'a.py::t4'])
+    assert session.send_tests('slave01', 2) == []
+    session.sent = []
+    session.slaves['slave00'].returncode = 1
+    session._slave_audit()
+    # the waiting slave gets all the tests of the dead one
+    assert len(session.sent) == 1
+    slaveid, reply = session.sent[0]
+    assert (slaveid, reply['seq']) == ('slave01', 2)
+    assert sorted(reply['reply']) == ['a.py::t1', 'a.py::t2', 'a.py::t3', 'a.py::t4']
+    assert not session.steals
+    # a late answer of the dead victim doesn't hand anything out twice
+    session.finish_steal('slave00', ['a.py::t3', 'a.py::t4'])
+    assert len(session.sent) == 1
+
+
+def test_revoke_only_pending():
+    slave_manager = remote.SlaveManager.__new__(remote.SlaveManager)
+    slave_manager.log = logging.getLogger('test_parallelizer_steal')
+    slave_manager._pending_nodes = deque(['a.py::t2', 'a.py::t3', 'a.py::t4'])
+    posted = []
+    slave_manager.post_event = lambda name, flush=False, **kwargs: posted.append((name, kwargs))
+    # t1 is already running, t5 was never sent to this slave
+    slave_manager._revoke(['a.py::t1', 'a.py::t3', 'a.py::t5', 'a.py::t4'])
+    assert list(slave_manager._pending_nodes) == ['a.py::t2']
+    assert posted == [('tests_revoked', {'node_ids': ['a.py::t3', 'a.py::t4']})]
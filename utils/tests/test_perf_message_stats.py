@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import re
+from datetime import datetime
+
+import numpy
+import pytest
+
+from utils.perf_message_stats import (MiqMsgTable, MiqWorker, TopOutput, _hourly_stats,
+    _messages_to_cmds, messages_to_hourly_buckets)
+
+
+@pytest.fixture
+def messages():
+    messages = MiqMsgTable(capacity=2)
+    messages.put('10', '2016-10-18 08:59:00.000001', '100', 'Storage.perf_capture',
+        '[["EmsVmware", 1]]')
+    messages.put('9', '2016-10-18 09:10:00.000002', '101', 'Storage.perf_capture', '')
+    messages.put('11', '2016-10-18 09:20:00.000003', '102', 'EmsRefresh.refresh', '')
+    messages.get('10', '2016-10-18 09:00:01.000000', '200', 1.5)
+    messages.delivered('10', 2.0)
+    messages.get('9', '2016-10-18 09:11:00.000000', '201', 0.5)
+    messages.delivered('9', 0.25)
+    return messages
+
+
+def test_table_rows(messages):
+    assert len(messages) == 3
+    assert '11' in messages
+    assert '12' not in messages
+    assert messages.cmds == ['Storage.perf_capture', 'EmsRefresh.refresh']
+    rows = list(messages.iter_rows())
+    # message ids sort as strings, like the raw data csv always has
+    assert [row['msg_id'] for row in rows] == ["'10'", "'11'", "'9'"]
+    assert rows[0]['gettime'] == '2016-10-18 09:00:01.000000'
+    assert rows[0]['total_time'] == 3.5
+    assert rows[1]['pid_get'] == ''
+    assert rows[1]['gettime'] == ''
+
+
+def test_put_replaces(messages):
+    messages.put('10', '2016-10-18 10:00:00.000000', '100', 'EmsRefresh.refresh', '')
+    assert len(messages) == 3
+    row = list(messages.iter_rows())[0]
+    assert (row['msg_cmd'], row['gettime'], row['total_time']) == ('EmsRefresh.refresh', '', 0)
+
+
+def test_filters_and_cmds(messages):
+    msg_cmds = _messages_to_cmds(messages, {'-EmsVmware': re.compile(r'EmsVmware')})
+    assert sorted(msg_cmds) == [
+        'EmsRefresh.refresh', 'Storage.perf_capture', 'Storage.perf_capture-EmsVmware']
+    assert msg_cmds['Storage.perf_capture-EmsVmware']['total'].tolist() == [3.5]
+    assert msg_cmds['Storage.perf_capture']['queue'].tolist() == [0.5]
+    # never delivered
+    assert msg_cmds['EmsRefresh.refresh']['total'].tolist() == []
+
+
+def test_hourly_buckets(messages):
+    hr_bkt = messages_to_hourly_buckets(
+        messages, '2016-10-18 08:59:00.000001', '2016-10-18 09:20:00.000003')
+    perf_capture = hr_bkt['Storage.perf_capture']
+    assert perf_capture['2016-10-18']['08'].total_put == 1
+    assert perf_capture['2016-10-18']['09'].total_put == 1
+    assert perf_capture['2016-10-18']['09'].total_get == 2
+    assert perf_capture['2016-10-18']['09'].sum_del == 2.25
+    assert perf_capture['2016-10-18']['09'].min_del == 0.25
+    assert perf_capture['2016-10-18']['09'].max_del == 2.0
+    # messages never picked up are counted in the empty bucket
+    assert hr_bkt['EmsRefresh.refresh'][''][''].total_get == 1
+    assert hr_bkt['EmsRefresh.refresh'][''][''].min_del == 0
+
+
+def test_hourly_min_skips_zeros():
+    times = numpy.array(['2016-10-18T09:00:01', '2016-10-18T09:10:00', '2016-10-18T09:20:00',
+        '2016-10-18T10:00:00'], dtype='M8[us]')
+    stats = list(_hourly_stats(numpy.array([0, 0, 0, 0]), times, numpy.array([3., 0., 5., 0.])))
+    assert stats == [
+        (0, '2016-10-18', '09', 3, 8.0, 3.0, 5.0), (0, '2016-10-18', '10', 1, 0.0, 0.0, 0.0)]
+
+
+top_iteration = '''miqtop: timesync-date: is-> Mon Jan 26 08:57:{sec:02d} EST 2015 -0500
+top - 13:57:{sec:02d} up 1 day,  2:03,  1 user,  load average: 0.10, 0.20, 0.30
+Cpu(s): 13.7%us,  1.2%sy,  2.1%ni, 80.0%id,  1.7%wa,  0.0%hi,  0.1%si,  1.3%st
+Mem:   5990952k total,  4864016k used,  1126936k free,   441444k buffers
+Swap:  9957368k total,        0k used,  9957368k free,  1153156k cached
+
+  PID  PPID USER      PR  NI  VIRT  RES  SHR S %CPU %MEM    TIME+  COMMAND
+17526 2320 root      30  10  324m 9.8m 2444 S  {sec}.0  0.2   0:09.38 ruby
+'''
+
+
+def test_top_output_resumes(tmpdir):
+    top_file = tmpdir.join('top_output.log')
+    top_file.write(top_iteration.format(sec=1) + 'top - 13:5')
+    top_output = TopOutput(top_file)
+    assert top_output.update() == 8
+    assert top_output.appliance['datetimes'] == ['2015-01-26 18:57:01']
+    assert top_output.processes['17526']['cpu_per'] == [1.0]
+
+    top_file.write('7:02 up\n' + top_iteration.format(sec=3), mode='a')
+    # a new parser picks up from the checkpoint, parsing only the appended lines
+    top_output = TopOutput(top_file)
+    assert top_output.update() == 9
+    assert top_output.appliance['cpuus'] == [13.7, 13.7]
+    assert top_output.processes['17526']['cpu_per'] == [1.0, 3.0]
+
+    worker = MiqWorker()
+    worker.worker_id, worker.pid = 15, '17526'
+    worker.start_ts = datetime(2015, 1, 26, 18, 57, 2)
+    top_workers = top_output.workers({15: worker})
+    assert top_workers[15]['datetimes'] == ['2015-01-26 18:57:03']
+
+
+def test_top_output_replaced(tmpdir):
+    top_file = tmpdir.join('top_output.log')
+    top_file.write(top_iteration.format(sec=1) * 2)
+    TopOutput(top_file).update()
+    top_file.write(top_iteration.format(sec=5))
+    top_output = TopOutput(top_file)
+    assert top_output.update() == 8
+    assert top_output.processes['17526']['cpu_per'] == [5.0]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from distutils.spawn import find_executable
+
+import pytest
+
+from utils import ssh
+from utils.ssh import RailsDaemon, SSHClient, SSHConnectionPool, SSHResult
+
+
+@pytest.yield_fixture(autouse=True)
+def pools():
+    yield
+    SSHConnectionPool.close_all()
+
+
+@pytest.yield_fixture
+def local_daemon():
+    if not find_executable('ruby'):
+        pytest.skip('ruby is needed to run the rails daemon locally')
+    daemon = RailsDaemon.local()
+    yield daemon
+    daemon.close()
+
+
+def test_local_daemon_commands(local_daemon, tmpdir):
+    result = local_daemon.run('"puts 1 + 1; system(%q{echo spawned}); warn %q{warned}"')
+    assert result == 0
+    assert result.output == '2\nspawned\nwarned\n'
+
+    assert local_daemon.run('"exit 3"') == 3
+    failed = local_daemon.run("'raise %q{boom}'")
+    assert failed == 1
+    assert 'boom (RuntimeError)' in failed
+
+    script = tmpdir.join('script.rb')
+    script.write('puts ARGV.join(",")')
+    assert local_daemon.run('{} a "b c"'.format(script.strpath)).output == 'a,b c\n'
+
+
+def test_local_daemon_isolates_commands(local_daemon):
+    local_daemon.run('"x = 1"')
+    assert local_daemon.run('"p defined?(x)"').output == 'nil\n'
+
+
+def test_local_daemon_died(local_daemon):
+    result = local_daemon.run('"exit!"')
+    assert result == SSHResult(1, '')
+    assert not local_daemon.alive
+
+
+def test_run_rails_command_falls_back(monkeypatch):
+    def broken_daemon(cls, ssh_client):
+        raise EOFError('The rails daemon exited')
+    monkeypatch.setattr(RailsDaemon, 'over_ssh', classmethod(broken_daemon))
+    monkeypatch.setattr(ssh.SSHClient, 'run_command',
+        lambda self, command, **kwargs: SSHResult(0, command))
+    client = SSHClient(rails_daemon=True, hostname='appliance', username='root', password='x')
+    result = client.run_rails_command('"puts 1"')
+    assert result.output == '/var/www/miq/vmdb/bin/rails runner "puts 1"'
+    assert client.rails_daemon() is None
+
+
+def test_clients_share_daemon(monkeypatch):
+    started = []
+
+    class FakeDaemon(object):
+        alive = True
+
+        def run(self, command, timeout=None):
+            return SSHResult(0, command)
+
+        def close(self):
+            self.alive = False
+
+    def start(cls, ssh_client):
+        started.append(FakeDaemon())
+        return started[-1]
+    monkeypatch.setattr(RailsDaemon, 'over_ssh', classmethod(start))
+
+    def client():
+        return SSHClient(rails_daemon=True, hostname='appliance', username='root', password='x')
+    # like IPAppliance.ssh_client, which creates a new client every time
+    assert client().run_rails_command('"puts 1"').output == '"puts 1"'
+    assert client().run_rails_command('"puts 2"').output == '"puts 2"'
+    assert len(started) == 1
+    assert started[0].alive
+    # started again once it died
+    started[0].alive = False
+    client().run_rails_command('"puts 3"')
+    assert len(started) == 2
+    SSHConnectionPool.close_all()
+    assert not started[1].alive
@@ -2,6 +2,8 @@
 import fauxfactory
 import pytest
 
+from utils.ssh import CommandOutput, SSHTail
+
 pytestmark = [
     pytest.mark.nondestructive,
     pytest.mark.skip_selenium,
@@ -15,6 +17,28 @@ def test_ssh_client_run_command(ssh_client):
     assert 'Testing!' in output
 
 
+def test_ssh_client_run_commands(ssh_client):
+    # Every command gets its own exit status and output, and doesn't affect the next one
+    results = ssh_client.run_commands(['printf Testing!', 'cd /tmp; exit 3', 'pwd'])
+    assert [result.rc for result in results] == [0, 3, 0]
+    assert results[0].output == 'Testing!'
+    assert results[2].output.strip() != '/tmp'
+
+
+def test_command_output_spills():
+    chunks = []
+    output = CommandOutput(max_size=8, callback=lambda data, stderr: chunks.append(data))
+    output.write('12345')
+    assert output.spill_file is None
+    output.write('67890', stderr=True)
+    output.write('abc')
+    output.close()
+    assert chunks == ['12345', '67890', 'abc']
+    assert output.getvalue() == '67890abc'
+    with open(output.spill_file) as spill_file:
+        assert spill_file.read() == '1234567890abc'
+
+
 def test_ssh_client_copies(ssh_client):
     ssh_client_kwargs = {
         'username': fauxfactory.gen_alphanumeric(8),
@@ -50,3 +74,35 @@ def test_scp_client_can_put_a_file(ssh_client, tmpdir):
     assert "content" in tmpfile.read()
     # Clean up the server
     ssh_client.run_command("rm -f /tmp/{}".format(tmpfile.basename))
+
+
+def test_ssh_tail(ssh_client):
+    remote_file = '/tmp/{}.log'.format(fauxfactory.gen_alphanumeric(8))
+    ssh_client.run_command('echo before > {}'.format(remote_file))
+    tail = SSHTail(remote_file)
+    tail.set_initial_file_end()
+    ssh_client.run_command('printf "first\\nsecond\\npart" >> {}'.format(remote_file))
+    assert tail.lines_as_list() == ['first', 'second']
+    # the line being written is only read once it's complete
+    ssh_client.run_command('echo ial >> {}'.format(remote_file))
+    assert tail.lines_as_list() == ['partial']
+    # truncated or rotated files are read from the start
+    ssh_client.run_command('echo rotated > {}'.format(remote_file))
+    assert tail.lines_as_list() == ['rotated']
+    ssh_client.run_command('rm -f {}'.format(remote_file))
+
+
+def test_ssh_tail_grep(ssh_client):
+    remote_file = '/tmp/{}.log'.format(fauxfactory.gen_alphanumeric(8))
+    ssh_client.run_command('echo before > {}'.format(remote_file))
+    tail = SSHTail(remote_file, grep='ERROR|WARN')
+    tail.set_initial_file_end()
+    ssh_client.run_command('printf "INFO a\\nERROR b\\nWARN c\\n" >> {}'.format(remote_file))
+    assert tail.lines_as_list() == ['ERROR b', 'WARN c']
+    assert tail.lines_as_list() == []
+    # a line still being written is read once it is complete
+    ssh_client.run_command('printf "INFO d\\nERROR e" >> {}'.format(remote_file))
+    assert tail.lines_as_list() == []
+    ssh_client.run_command('printf " done\\n" >> {}'.format(remote_file))
+    assert tail.lines_as_list() == ['ERROR e done']
+    ssh_client.run_command('rm -f {}'.format(remote_file))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import socket
+
+import paramiko
+import pytest
+
+from utils.ssh import SSHClient, SSHConnectionPool
+
+
+class FakeChannel(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def is_authenticated(self):
+        return True
+
+    def set_keepalive(self, interval):
+        pass
+
+    def getpeername(self):
+        return ('appliance', 22)
+
+    def open_session(self):
+        if not self.active:
+            raise paramiko.SSHException('SSH session not active')
+        return FakeChannel()
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.transport = FakeTransport()
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.transport.active = False
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(SSHConnectionPool, 'max_sessions', 2)
+    monkeypatch.setattr(SSHConnectionPool, 'max_connections', 2)
+    monkeypatch.setattr(SSHConnectionPool, 'wait_timeout', 0)
+    return SSHConnectionPool()
+
+
+def test_sessions_share_connections(pool):
+    clients = []
+
+    def connect():
+        clients.append(FakeClient())
+        return clients[-1]
+
+    sessions = [pool.open_session(connect) for _ in range(4)]
+    assert len(clients) == 2
+    assert pool.transport(connect) is clients[0].transport
+    with pytest.raises(paramiko.SSHException):
+        pool.open_session(connect)
+
+    # a closed channel makes room for a new one
+    sessions[0].closed = True
+    pool.open_session(connect)
+    assert len(clients) == 2
+
+
+def test_reconnects(pool):
+    clients = []
+
+    def connect():
+        clients.append(FakeClient())
+        return clients[-1]
+
+    pool.open_session(connect)
+    clients[0].transport.active = False
+    pool.open_session(connect)
+    assert len(clients) == 2
+    assert pool.transport(connect) is clients[1].transport
+
+
+def test_pools_per_credentials():
+    def client(**kwargs):
+        return SSHClient(hostname='appliance', username='root', **kwargs)
+    try:
+        assert client(password='a').connection_pool is client(password='a').connection_pool
+        assert client(password='a').connection_pool is not client(password='b').connection_pool
+        assert (client(key_filename='/root/.ssh/id_rsa').connection_pool is not
+            client(password='a').connection_pool)
+    finally:
+        SSHConnectionPool.close_all()
+
+
+def test_scp_channels_counted(monkeypatch):
+    monkeypatch.setattr(SSHConnectionPool, 'max_sessions', 1)
+    monkeypatch.setattr(SSHConnectionPool, 'max_connections', 1)
+    monkeypatch.setattr(SSHConnectionPool, 'wait_timeout', 0)
+    clients = []
+
+    def new_connection(self):
+        clients.append(FakeClient())
+        return clients[-1]
+    monkeypatch.setattr(SSHClient, '_new_connection', new_connection)
+    client = SSHClient(hostname='appliance', username='root', password='a')
+    try:
+        # what SCPClient does to transfer a file
+        channel = client.scp_client().transport.open_session()
+        with pytest.raises(paramiko.SSHException):
+            client.open_session()
+        channel.close()
+        client.open_session()
+        assert len(clients) == 1
+    finally:
+        SSHConnectionPool.close_all()
+
+
+def test_run_command_closes_channel(monkeypatch):
+    channels = []
+
+    class TimingOutChannel(FakeChannel):
+        def settimeout(self, timeout):
+            pass
+
+        def exec_command(self, command):
+            raise socket.timeout()
+
+    def open_session(self):
+        channels.append(TimingOutChannel())
+        return channels[-1]
+    monkeypatch.setattr(SSHClient, 'open_session', open_session)
+    client = SSHClient(hostname='appliance', username='root', password='a')
+    with pytest.raises(socket.timeout):
+        client.run_command('true')
+    assert channels[0].closed
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import re
+
+import pytest
+
+from cfme.web_ui import SplitTable, Table
+
+
+@pytest.fixture(scope='module')
+def test_page(browser, datafile):
+    test_page_html = datafile('tables.html').read()
+    pytest.sel.get('data:text/html;base64,{}'.format(test_page_html.encode('base64')))
+
+
+pytestmark = pytest.mark.usefixtures('test_page')
+
+tables = {
+    'plain': lambda: Table('//table[@id="plain"]', body_offset=1),
+    'split': lambda: SplitTable(
+        header_data=('//table[@id="split_header"]/tbody', 0),
+        body_data=('//table[@id="split_body"]/tbody', 1)),
+}
+
+
+def row_ids(rows):
+    return sorted(pytest.sel.get_attribute(row.row_element, 'id') for row in rows)
+
+
+def find_rows(table_name, bulk_read, cells, partial_check):
+    table = tables[table_name]()
+    table.bulk_read = bulk_read
+    return row_ids(table.find_rows_by_cells(cells, partial_check=partial_check))
+
+
+@pytest.mark.parametrize('table_name', sorted(tables))
+@pytest.mark.parametrize(('cells', 'partial_check', 'expected'), [
+    # the hidden row has the same cells
+    ({'Name': 'John', 'Animal': 'Monkey'}, False, ['john']),
+    # without the text of the hidden span
+    ({'Name': 'Johnny'}, False, ['johnny']),
+    ({'Size': 'Large cat'}, False, ['mike']),
+    ({'Size': 'Lar', 'Animal': 'Tiger'}, True, ['mike']),
+    ({'Name': re.compile(r'M\w+e$'), 'Animal': 'Tiger'}, False, ['mike', 'moe']),
+    ({'Animal': 'Padding'}, False, []),
+], ids=['hidden_row', 'hidden_span', 'hidden_cell', 'partial', 'regex', 'padding_row'])
+def test_bulk_read_matches_xpath(table_name, cells, partial_check, expected):
+    bulk = find_rows(table_name, True, cells, partial_check)
+    assert bulk == find_rows(table_name, False, cells, partial_check)
+    assert bulk == ['{}_{}'.format(table_name, row_id) for row_id in expected]
+
+
+@pytest.mark.parametrize('table_name', sorted(tables))
+def test_read_skips_padding_and_hidden_texts(table_name):
+    rows = tables[table_name]().read()
+    assert [[' '.join(text.split()) for text in row.texts] for row in rows] == [
+        ['John', 'Monkey', 'Small'], ['Mike', 'Tiger', 'Large cat'], ['', '', ''],
+        ['Johnny', 'Monkey', 'Tiny'], ['Moe', 'Tiger', '']]
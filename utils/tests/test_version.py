@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
+import cPickle as pickle
+
 import pytest
 
-from utils.version import Version
+from utils.version import LATEST, Version, VersionPicker
 
 GT = '>'
 LT = '<'
@@ -29,3 +31,27 @@ def test_version(v1, op, v2):
         assert v1 < v2
     elif op == EQ:
         assert v1 == v2
+
+
+def test_version_interned():
+    assert Version('5.8.0.1') is Version(u'5.8.0.1')
+    assert Version('5.8.0.1') is pickle.loads(
+        pickle.dumps(Version('5.8.0.1'), pickle.HIGHEST_PROTOCOL))
+    assert Version([5, 8, 0, 1]) == Version('5.8.0.1')
+    assert len({Version([5, 8, 0, 1]), Version('5.8.0.1'), Version('5.8.0.1-beta1')}) == 2
+
+
+@pytest.mark.parametrize(('version', 'picked'), [
+    ('5.5.3', None),
+    ('5.6', 'old'),
+    ('5.7.2.1', 'old'),
+    ('5.8.0.1-beta1', 'old'),
+    ('5.8.0.1', 'new'),
+    ('master', 'upstream'),
+])
+def test_version_picker(version, picked):
+    picker = VersionPicker({'5.6': 'old', '5.8.0.1': 'new', LATEST: 'upstream'})
+    assert picker.pick(version) == picked
+    # remembered
+    assert picker._picked == {Version(version): picked}
+    assert picker.pick(Version(version)) == picked
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import re
+from bisect import bisect_right
 from cached_property import cached_property
 from collections import namedtuple
 from datetime import date, datetime
@@ -147,13 +148,56 @@ def pick(v_dict):
     """
     Collapses an ambiguous series of objects bound to specific versions
     by interrogating the CFME Version and returning the correct item.
+
+    ``v_dict`` can also be a :py:class:`VersionPicker`, which is faster when picking from the same
+    dictionary repeatedly.
     """
-    # convert keys to Versions
-    v_dict = {get_version(k): v for (k, v) in v_dict.items()}
-    versions = v_dict.keys()
-    sorted_matching_versions = sorted(filter(lambda v: v <= current_version(), versions),
-                                      reverse=True)
-    return v_dict.get(sorted_matching_versions[0]) if sorted_matching_versions else None
+    if not isinstance(v_dict, VersionPicker):
+        v_dict = VersionPicker(v_dict)
+    return v_dict.pick()
+
+
+class VersionPicker(object):
+    """A version-picking dictionary prepared for picking from it many times.
+
+    The keys are converted to :py:class:`Version` and sorted once, a pick is then a bisection of
+    them and its result is remembered for the version it was picked for.
+
+    Usage:
+
+    .. code-block:: python
+
+        locator = VersionPicker({
+            version.LOWEST: '//div[@id="old"]',
+            '5.8': '//div[@id="new"]',
+        })
+        locator.pick()  # for the current appliance
+        locator.pick('5.7.2.1')
+    """
+    def __init__(self, v_dict):
+        items = sorted(
+            ((get_version(k), v) for (k, v) in v_dict.items()), key=lambda item: item[0])
+        self.versions = [k for (k, v) in items]
+        self.values = [v for (k, v) in items]
+        self._picked = {}
+
+    def pick(self, version=None):
+        """Returns the value of the highest version not higher than ``version``, else ``None``.
+
+        Args:
+            version: Version to pick for, the version of the current appliance by default
+        """
+        version = current_version() if version is None else get_version(version)
+        try:
+            return self._picked[version]
+        except KeyError:
+            i = bisect_right(self.versions, version)
+            value = self.values[i - 1] if i else None
+            self._picked[version] = value
+            return value
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, dict(zip(self.versions, self.values)))
 
 
 class Version(object):
@@ -162,9 +206,29 @@ class Version(object):
     SUFFIXES_STR = "|".join(r'-{}(?:\d+(?:\.\d+)?)?'.format(suff) for suff in SUFFIXES)
     component_re = re.compile(r'(?:\s*(\d+|[a-z]+|\.|(?:{})+$))'.format(SUFFIXES_STR))
     suffix_item_re = re.compile(r'^([^0-9]+)(\d+(?:\.\d+)?)?$')
+    # Instances created from strings, every string is parsed only once
+    _interned = {}
+
+    def __new__(cls, vstring):
+        if isinstance(vstring, basestring):
+            key = (cls, vstring)
+            try:
+                return cls._interned[key]
+            except KeyError:
+                pass
+        version = super(Version, cls).__new__(cls)
+        version.parse(vstring)
+        if isinstance(vstring, basestring):
+            cls._interned[key] = version
+        return version
 
     def __init__(self, vstring):
-        self.parse(vstring)
+        # Parsed in __new__ already
+        pass
+
+    def __getnewargs__(self):
+        # Unpickled versions are interned as well
+        return (self.vstring, )
 
     def parse(self, vstring):
         if vstring is None:
@@ -250,31 +314,22 @@ class Version(object):
         except:
             raise ValueError('Cannot compare Version to {}'.format(type(other).__name__))
 
-        if self == other:
-            return 0
-        elif self == self.latest() or other == self.lowest():
-            return 1
-        elif self == self.lowest() or other == self.latest():
-            return -1
-        else:
-            result = cmp(self.version, other.version)
-            if result != 0:
-                return result
-            # Use suffixes to decide
-            if self.suffix is None and other.suffix is None:
-                # No suffix, the same
-                return 0
-            elif self.suffix is None:
-                # This does not have suffix but the other does so this is "newer"
-                return 1
-            elif other.suffix is None:
-                # This one does have suffix and the other does not so this one is older
-                return -1
-            else:
-                # Both have suffixes, so do some math
-                return cmp(self.normalized_suffix, other.normalized_suffix)
+        return cmp(self._cmp_key, other._cmp_key)
+
+    @cached_property
+    def _cmp_key(self):
+        """Tuple which compares the same way as the versions do."""
+        if self == self.latest():
+            return (1, )
+        elif self == self.lowest():
+            return (-1, )
+        # A version without suffix is newer than the one with any suffix, otherwise the suffixes
+        # decide
+        return (0, self.version, self.suffix is None, self.normalized_suffix)
 
     def __eq__(self, other):
+        if self is other:
+            return True
         try:
             if not isinstance(other, type(self)):
                 other = Version(other)
@@ -283,6 +338,9 @@ class Version(object):
         except:
             return False
 
+    def __hash__(self):
+        return hash((tuple(self.version), tuple(self.normalized_suffix)))
+
     def __contains__(self, ver):
         """Enables to use ``in`` expression for :py:meth:`Version.is_in_series`.
 